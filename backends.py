@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+
+# Environment variables forcing a backend, e.g. NOTEPAD_PRINT_BACKEND=file for tests
+PRINT_BACKEND_VARIABLE = 'NOTEPAD_PRINT_BACKEND'
+CLIPBOARD_BACKEND_VARIABLE = 'NOTEPAD_CLIPBOARD_BACKEND'
+PRINT_DIRECTORY_VARIABLE = 'NOTEPAD_PRINT_DIR'  # Where the file backend puts printed files, discarded if unset
+
+# Created on first use, and the modules they need imported only then, keeping them off the startup path
+_print_backend = None
+_clipboard = None
+
+
+class Win32Printing:
+    """Prints through the Windows shell, the way Notepad does."""
+
+    keeps_file = True  # The shell opens the file after print_file returned, it can't be removed right away
+
+    def __init__(self):
+        try:
+            import win32api
+            import win32print
+        except ImportError as e:
+            raise OSError(f'Windows printing needs pywin32: {e}') from e
+        self.win32api = win32api
+        self.win32print = win32print
+
+    def printers(self):
+        """Returns the names of the installed printers."""
+        return [printer[2] for printer in self.win32print.EnumPrinters(2)]
+
+    def default_printer(self):
+        """Returns the name of the default printer."""
+        return self.win32print.GetDefaultPrinter()
+
+    def print_file(self, path, printer):
+        """Sends a text file to a printer."""
+        self.win32print.SetDefaultPrinter(printer)
+        self.win32api.ShellExecute(0, 'printto', path, f'"{printer}"', '.', 0)
+
+
+class CupsPrinting:
+    """Prints through the CUPS command line tools, lp or the BSD style lpr."""
+
+    def __init__(self):
+        import shutil
+        import subprocess
+
+        self.subprocess = subprocess
+        self.lp = shutil.which('lp')
+        self.lpr = shutil.which('lpr')
+        if self.lp is None and self.lpr is None:
+            raise OSError('Printing needs CUPS, neither lp nor lpr was found')
+
+    def _lpstat(self, *args):
+        """Returns the output lines of lpstat, none if it is missing or fails."""
+        try:
+            result = self.subprocess.run(['lpstat', *args], capture_output=True, text=True, timeout=10)
+        except (OSError, self.subprocess.TimeoutExpired):
+            return []
+        return result.stdout.splitlines() if result.returncode == 0 else []
+
+    def printers(self):
+        """Returns the names of the print queues accepting jobs."""
+        return [line.split()[0] for line in self._lpstat('-a') if line.strip()]
+
+    def default_printer(self):
+        """Returns the name of the default print queue, None if there is none."""
+        for line in self._lpstat('-d'):
+            if ':' in line:
+                name = line.split(':', 1)[1].strip()
+                if name:
+                    return name
+        return None
+
+    def print_file(self, path, printer):
+        """Sends a text file to a print queue."""
+        if self.lp is not None:
+            command = [self.lp, '-s'] + (['-d', printer] if printer else []) + [path]
+        else:
+            command = [self.lpr] + (['-P', printer] if printer else []) + [path]
+        result = self.subprocess.run(command, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            raise OSError(result.stderr.strip() or f'{os.path.basename(command[0])} failed')
+
+
+class FilePrinting:
+    """Stands in for a printer: printed files are copied to a directory, or dropped if there is none."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.printed = []  # Paths of the copies, in print order
+
+    def printers(self):
+        """Returns the one pseudo printer."""
+        return ['File']
+
+    def default_printer(self):
+        """Returns the name of the pseudo printer."""
+        return 'File'
+
+    def print_file(self, path, printer):
+        """Copies a text file to the directory."""
+        import shutil
+
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        target = os.path.join(self.directory, f'{time.time_ns()}-{os.path.basename(path)}')
+        shutil.copyfile(path, target)
+        self.printed.append(target)
+
+
+class PyperclipClipboard:
+    """System clipboard through pyperclip."""
+
+    def __init__(self):
+        try:
+            import pyperclip
+        except ImportError as e:
+            raise OSError(f'pyperclip is not installed: {e}') from e
+        self.pyperclip = pyperclip
+
+    def copy(self, text):
+        """Puts text on the clipboard."""
+        try:
+            self.pyperclip.copy(text)
+        except self.pyperclip.PyperclipException as e:
+            raise OSError(str(e)) from e
+
+    def paste(self):
+        """Returns the text on the clipboard."""
+        try:
+            return self.pyperclip.paste()
+        except self.pyperclip.PyperclipException as e:
+            raise OSError(str(e)) from e
+
+    def keep(self):
+        """Nothing to do, pyperclip's clipboard outlives the program."""
+
+
+class TkClipboard:
+    """System clipboard through Tk's own clipboard, falling back to pyperclip only when needed.
+
+    Copying and pasting are calls into Tk, no process is started. pyperclip, when installed, is
+    asked for the text only when Tk can't read any, e.g. from owners offering types Tk doesn't
+    know. On X11 the clipboard is served by the program that copied, so keep() hands it over to
+    pyperclip before exiting, for the text to outlive the editor.
+    """
+
+    def __init__(self, root, fallback=True):
+        self.root = root
+        self.fallback = fallback  # Use pyperclip when needed, replaced by it once created, False if unavailable
+
+    def _fallback(self):
+        """Returns the pyperclip backend, None if it is not installed."""
+        if self.fallback is True:
+            try:
+                self.fallback = PyperclipClipboard()
+            except OSError:
+                self.fallback = False
+        return self.fallback or None
+
+    def copy(self, text):
+        """Puts text on the clipboard."""
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+
+    def paste(self):
+        """Returns the text on the clipboard, '' if it holds no text."""
+        import tkinter
+
+        try:
+            return self.root.clipboard_get()
+        except tkinter.TclError:
+            fallback = self._fallback()
+            if fallback is None:
+                return ''
+            try:
+                return fallback.paste()
+            except OSError:
+                return ''  # Neither can read it, as good as an empty clipboard
+
+    def keep(self):
+        """Hands the text the editor copied to pyperclip on X11, where it would go away with the editor."""
+        import tkinter
+
+        if self.root.tk.call('tk', 'windowingsystem') != 'x11':
+            return
+        try:
+            if not self.root.selection_own_get(selection='CLIPBOARD'):
+                return
+            text = self.root.clipboard_get()
+        except (tkinter.TclError, KeyError):  # KeyError: owned by a widget tkinter doesn't know
+            return
+        fallback = self._fallback()
+        if fallback is not None:
+            try:
+                fallback.copy(text)
+            except OSError:
+                pass
+
+
+class MemoryClipboard:
+    """Clipboard private to the process, for tests."""
+
+    def __init__(self):
+        self.text = ''
+
+    def copy(self, text):
+        """Keeps text."""
+        self.text = text
+
+    def paste(self):
+        """Returns the text kept last."""
+        return self.text
+
+    def keep(self):
+        """Nothing to do, the text is gone with the process anyway."""
+
+
+def print_backend():
+    """Returns the printing backend, created on first use. Raises OSError if printing is unavailable."""
+    global _print_backend
+
+    if _print_backend is None:
+        name = os.environ.get(PRINT_BACKEND_VARIABLE) or ('win32' if sys.platform == 'win32' else 'cups')
+        if name == 'win32':
+            _print_backend = Win32Printing()
+        elif name == 'cups':
+            _print_backend = CupsPrinting()
+        elif name in ('file', 'null'):
+            _print_backend = FilePrinting(os.environ.get(PRINT_DIRECTORY_VARIABLE))
+        else:
+            raise OSError(f'Unknown print backend {name!r}')
+    return _print_backend
+
+
+def clipboard(root):
+    """Returns the clipboard backend, created on first use: Tk's clipboard, with pyperclip as a fallback."""
+    global _clipboard
+
+    if _clipboard is None:
+        name = os.environ.get(CLIPBOARD_BACKEND_VARIABLE)
+        if name == 'memory':
+            _clipboard = MemoryClipboard()
+        elif name == 'tk':
+            _clipboard = TkClipboard(root, fallback=False)
+        elif name == 'pyperclip':
+            _clipboard = PyperclipClipboard()
+        else:
+            _clipboard = TkClipboard(root)
+    return _clipboard
@@ -0,0 +1,183 @@
+"""Headless find and replace over files, sharing the editor's search engine without starting Tk.
+
+Usage: python notepad.py --count PATTERN FILE... [--regex] [--ignore-case] [--whole-word] [--jobs N]
+       python notepad.py --replace PATTERN REPLACEMENT FILE... [same options]
+
+Files are streamed chunk by chunk, so their size doesn't matter, and spread over processes when
+there are several. Like grep, the exit status is 0 if a match was found, 1 if none and 2 on errors.
+"""
+import argparse
+import codecs
+import os
+import re
+import sys
+
+from findinfiles import is_binary
+from saving import atomic_write
+from search import compile_pattern
+from textcodec import DETECT_BYTES, detect_format
+
+CHUNK_BYTES = 1024 * 1024  # Bytes read and decoded at a time
+OVERLAP_CHARS = 64 * 1024  # Longest match found across a chunk boundary
+CONTEXT_CHARS = 256  # Text kept before the scan position for lookbehinds and whole words
+BATCH_OPTIONS = ('--count', '--replace')
+
+
+def requested(args):
+    """Returns True if the command line asks for batch mode instead of the editor."""
+    return any(arg in BATCH_OPTIONS for arg in args)
+
+
+def read_chunks(path, text_format):
+    """Yields the decoded text of a file chunk by chunk, line endings left as they are and without the BOM."""
+    decoder = codecs.getincrementaldecoder(text_format.encoding)()
+    first = True
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(CHUNK_BYTES)
+            text = decoder.decode(data, final=not data)
+            if first and text_format.bom and text.startswith('\ufeff'):
+                text = text[1:]
+            first = first and not text
+            if text:
+                yield text
+            if not data:
+                return
+
+
+def scan(chunks, pattern):
+    """Yields a text in order as plain strings and the match objects of a compiled pattern in it.
+
+    Chunks are joined a boundary at a time: matches ending within OVERLAP_CHARS of the end of the
+    text read so far wait for the next chunk, so a match spanning two chunks is found whole. Empty
+    matches are skipped, like the editor does.
+    """
+    buffer = ''
+    start = 0  # Where scanning resumes in buffer, the text before it was already yielded
+    chunks = iter(chunks)
+    while True:
+        chunk = next(chunks, None)
+        final = chunk is None
+        if not final:
+            buffer += chunk
+            if len(buffer) - start < 2 * OVERLAP_CHARS:
+                continue  # Read on, rather than scanning the same overlap over and over
+
+        limit = len(buffer) if final else len(buffer) - OVERLAP_CHARS
+        position = start
+        pending = limit  # Start of a match that may grow with the next chunk
+        for match in pattern.finditer(buffer, start):
+            if match.end() > limit:
+                pending = min(limit, match.start())
+                break
+            if match.end() == match.start():
+                continue
+            yield buffer[position:match.start()]
+            yield match
+            position = match.end()
+
+        if final:
+            yield buffer[position:]
+            return
+        cut = max(position, pending)
+        yield buffer[position:cut]
+        keep = max(0, cut - CONTEXT_CHARS)
+        buffer = buffer[keep:]
+        start = cut - keep
+
+
+def count_matches(path, text_format, pattern):
+    """Returns the number of matches in a file."""
+    return sum(1 for part in scan(read_chunks(path, text_format), pattern) if not isinstance(part, str))
+
+
+def replaced_chunks(path, text_format, pattern, replacement, regex):
+    """Yields the text of a file with every match replaced, group references expanded for a regex."""
+    for part in scan(read_chunks(path, text_format), pattern):
+        if isinstance(part, str):
+            yield part
+        else:
+            yield part.expand(replacement) if regex else replacement
+
+
+def process_file(path, search, replacement=None):
+    """Counts, or replaces when replacement is given, the matches of a file; returns (path, count, error).
+
+    Files are only rewritten when they have matches, atomically, in their own encoding, BOM and line
+    endings. Binary files are skipped.
+    """
+    try:
+        with open(path, 'rb') as f:
+            text_format = detect_format(f.read(DETECT_BYTES))
+            f.seek(0)
+            if is_binary(f.read(DETECT_BYTES), text_format.encoding):
+                return path, 0, None
+        pattern = compile_pattern(*search)
+        count = count_matches(path, text_format, pattern)
+        if count and replacement is not None:
+            atomic_write(path, replaced_chunks(path, text_format, pattern, replacement, search[1]),
+                         text_format.encoding, newline='', bom=text_format.bom)
+        return path, count, None
+    except UnicodeDecodeError:
+        return path, 0, 'not valid text in its encoding'
+    except OSError as e:
+        return path, 0, e.strerror or str(e)
+    except (ValueError, re.error) as e:  # re.error for a bad group reference in the replacement
+        return path, 0, str(e)
+
+
+def process_files(paths, search, replacement=None, jobs=None):
+    """Yields the outcome of process_file for each path in order, on several processes if there are many."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) == 1:
+        for path in paths:
+            yield process_file(path, search, replacement)
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Nothing but this runs in a batch process, so forking is safe and spares re-importing the modules
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(min(jobs, len(paths)), mp_context=multiprocessing.get_context(method)) as pool:
+        yield from pool.map(process_file, paths, [search] * len(paths), [replacement] * len(paths), chunksize=4)
+
+
+def parse_args(args):
+    """Parses the batch mode command line."""
+    parser = argparse.ArgumentParser(prog='notepad.py', description='Find or replace in files without the editor.')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--count', metavar='PATTERN', help='print the number of matches in each file')
+    action.add_argument('--replace', nargs=2, metavar=('PATTERN', 'REPLACEMENT'),
+                        help='replace every match, \\1 or \\g<name> refer to regex groups')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('--regex', action='store_true', help='PATTERN is a regular expression')
+    parser.add_argument('--ignore-case', '-i', action='store_true')
+    parser.add_argument('--whole-word', '-w', action='store_true')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='processes to use, one per CPU by default')
+    return parser.parse_args(args)
+
+
+def main(args):
+    """Runs batch mode, returns the exit status."""
+    options = parse_args(args)
+    pattern, replacement = (options.count, None) if options.replace is None else options.replace
+    search = (pattern, options.regex, options.ignore_case, options.whole_word)
+    try:
+        compile_pattern(*search)
+    except re.error as e:
+        print(f'notepad.py: invalid pattern: {e}', file=sys.stderr)
+        return 2
+
+    total = 0
+    failed = False
+    for path, count, error in process_files(options.files, search, replacement, options.jobs):
+        if error is not None:
+            print(f'notepad.py: {path}: {error}', file=sys.stderr)
+            failed = True
+        elif replacement is None:
+            print(f'{path}:{count}')
+        elif count:
+            print(f'{path}: {count} replaced')
+        total += count
+    return 2 if failed else 0 if total else 1
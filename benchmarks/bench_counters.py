@@ -0,0 +1,108 @@
+"""Measures the cost of one keystroke on the status bar counters for growing document sizes.
+
+The incremental counters only look at the edited line, so their cost should stay flat,
+while the old full-buffer scan grows linearly with the document. The counters are first timed on
+their own, then through the real Notepad window like benchmarks/run.py bench_typing does: each key
+goes through the text field hook, which updates the document and the counters, and the status bar
+is refreshed after it. That part runs under Xvfb when there is no display. The exit status is 1 if
+the counters after typing differ from a recount of the document.
+
+Usage: python benchmarks/bench_counters.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import ROOT, bench_typing, open_document, pump, start_display  # noqa: E402
+
+sys.path.insert(0, ROOT)
+
+from counters import TextCounts  # noqa: E402
+
+LINE = 'The quick brown fox jumps over the lazy dog, again and again.\n'
+SIZES_MB = [1, 5, 10, 50]
+KEYSTROKES = 1000
+
+
+def full_scan(text):
+    """The previous per-key handler: two full copies of the buffer plus len() and count()."""
+    count_char = len(text + '\n')
+    lines = (text + '\n').count('\n')
+    return count_char, lines
+
+
+def incremental(counts, line):
+    """One keystroke in the middle of a line, as reported by the text widget edit hook."""
+    middle = len(line) // 2
+    counts.replace(line, line[:middle] + 'x' + line[middle:])
+
+
+def bench_model():
+    """Times the counters on their own, without the text field."""
+    print(f'{"size":>8} {"full scan/key":>16} {"incremental/key":>18}')
+    for size_mb in SIZES_MB:
+        text = LINE * (size_mb * 1024 * 1024 // len(LINE))
+        counts = TextCounts(text)
+
+        scans = max(1, KEYSTROKES // (size_mb * 10))
+        full = timeit.timeit(lambda: full_scan(text), number=scans) / scans
+        fast = timeit.timeit(lambda: incremental(counts, LINE), number=KEYSTROKES) / KEYSTROKES
+
+        print(f'{size_mb:>6}MB {full * 1e6:>14.1f}us {fast * 1e6:>16.2f}us')
+
+
+def bench_editor(notepad, scratch):
+    """Types into the editor through the text field hook, returns False if the counters went wrong."""
+    app = notepad.Notepad()
+    pump(app, lambda: app.profiler.first_paint is not None)
+    ok = True
+    print(f'{"size":>8} {"keystroke p50":>15} {"keystroke p95":>15}')
+    try:
+        for size_mb in SIZES_MB:
+            path = os.path.join(scratch, f'doc-{size_mb}mb.txt')
+            with open(path, 'w') as f:
+                f.write(LINE * (size_mb * 1024 * 1024 // len(LINE)))
+            open_document(app, path)
+
+            result = bench_typing(app)
+            print(f'{size_mb:>6}MB {result["keystroke_p50"] * 1e3:>13.2f}ms {result["keystroke_p95"] * 1e3:>13.2f}ms')
+
+            expected = TextCounts(app.document.text())
+            counted = (app.counts.characters, app.counts.lines, app.counts.words)
+            if counted != (expected.characters, expected.lines, expected.words):
+                print(f'FAIL: counters {counted} after typing, the document has '
+                      f'{(expected.characters, expected.lines, expected.words)}')
+                ok = False
+    finally:
+        app.quit_program()
+        app.root.destroy()
+    return ok
+
+
+def main():
+    bench_model()
+    print()
+
+    display = start_display()
+    scratch = tempfile.mkdtemp(prefix='notepad-bench-')
+    os.environ['HOME'] = scratch  # Keeps the journals out of the real home directory
+    import notepad
+
+    try:
+        ok = bench_editor(notepad, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if display is not None:
+            display.terminate()
+
+    if ok:
+        print('OK')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Measures the piece table document core without a display.
+
+For growing document sizes it times a burst of typing, random edits, offset <-> line/column
+lookups, taking a snapshot and reading the whole text back out.
+
+Usage: python benchmarks/bench_document.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document import PieceTable  # noqa: E402
+
+LINE = 'The quick brown fox jumps over the lazy dog, again and again.\n'
+SIZES_MB = [1, 10, 50]
+OPERATIONS = 1000
+
+
+def main():
+    random.seed(0)
+    print(f'{"size":>6} {"load":>10} {"type/key":>10} {"edit":>10} {"lookup":>10} {"snapshot":>10} {"read all":>10}')
+    for size_mb in SIZES_MB:
+        text = LINE * (size_mb * 1024 * 1024 // len(LINE))
+        load = timeit.timeit(lambda: PieceTable(text), number=1)
+        document = PieceTable(text)
+
+        position = len(document) // 2
+
+        def type_key():
+            nonlocal position
+            document.insert(position, 'x')
+            document.line_bounds(position)
+            position += 1
+
+        def random_edit():
+            offset = random.randrange(len(document))
+            if random.random() < 0.5:
+                document.insert(offset, 'edit')
+            else:
+                document.delete(offset, 4)
+
+        def lookup():
+            line, column = document.offset_to_index(random.randrange(len(document)))
+            document.index_to_offset(line, column)
+
+        typing = timeit.timeit(type_key, number=OPERATIONS) / OPERATIONS
+        edit = timeit.timeit(random_edit, number=OPERATIONS) / OPERATIONS
+        find = timeit.timeit(lookup, number=OPERATIONS) / OPERATIONS
+        snapshot = timeit.timeit(document.snapshot, number=100) / 100
+        read = timeit.timeit(document.text, number=1)
+
+        print(f'{size_mb:>4}MB {load * 1e3:>8.1f}ms {typing * 1e6:>8.1f}us {edit * 1e6:>8.1f}us '
+              f'{find * 1e6:>8.1f}us {snapshot * 1e6:>8.1f}us {read * 1e3:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Times how long a launch in single-instance mode takes to hand its file to the running editor.
+
+The running editor is the real Notepad window, driven like benchmarks/run.py does, under Xvfb when
+there is no display; the launches are `python notepad.py --single-instance FILE` processes, timed
+from start to exit and compared with a bare interpreter start. A crashed editor is simulated by a
+socket file nothing listens on: a launch must then not hang but start an editor of its own, which
+replaces the socket. The exit status is 1 if a file is not opened or the stale socket is not handled.
+
+Usage: python benchmarks/bench_handoff.py [--launches 20]
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import ROOT, percentile, pump, start_display  # noqa: E402
+
+sys.path.insert(0, ROOT)
+
+import instance  # noqa: E402
+
+
+def launch_times(command, launches, app=None):
+    """Runs a command launches times, returns the durations; app's event loop runs meanwhile if given."""
+    durations = []
+    for _ in range(launches):
+        start = time.perf_counter()
+        process = subprocess.Popen(command)
+        if app is not None:
+            pump(app, lambda: process.poll() is not None)
+        process.wait()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def check_stale(scratch):
+    """Returns True if a stale socket is refused quickly and replaced by a new editor's."""
+    path = os.path.join(scratch, 'stale.sock')
+    crashed = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    crashed.bind(path)
+    crashed.listen(1)
+    crashed.close()  # The socket file stays, like after a crash
+
+    start = time.perf_counter()
+    handed = instance.hand_off('/tmp/file.txt', path)
+    print(f'stale socket: hand-off refused in {(time.perf_counter() - start) * 1000:.2f} ms')
+    if handed:
+        print('FAIL: a stale socket took the file')
+        return False
+    try:
+        server = instance.InstanceServer(path)
+    except OSError as e:
+        print(f'FAIL: the stale socket was not replaced: {e}')
+        return False
+    server.close()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-instance hand-off benchmark')
+    parser.add_argument('--launches', type=int, default=20)
+    args = parser.parse_args()
+
+    display = start_display()
+    scratch = tempfile.mkdtemp(prefix='notepad-bench-')
+    os.environ['HOME'] = scratch  # Keeps the journals out of the real home directory
+    os.environ[instance.SOCKET_VARIABLE] = os.path.join(scratch, 'notepad.sock')
+    import notepad
+
+    failed = not check_stale(scratch)
+    try:
+        app = notepad.Notepad()
+        app.serve_instance(instance.InstanceServer())
+        pump(app, lambda: app.profiler.first_paint is not None)
+        print(f'editor start: {app.profiler.first_paint * 1000:.0f} ms to first paint')
+
+        path = os.path.join(scratch, 'handed.txt')
+        with open(path, 'w') as f:
+            f.write('handed off\n')
+        command = [sys.executable, os.path.join(ROOT, 'notepad.py'), '--single-instance', path]
+        durations = launch_times(command, args.launches, app)
+        print(f'hand-off launch: p50 {percentile(durations, 0.5) * 1000:.0f} ms, '
+              f'p95 {percentile(durations, 0.95) * 1000:.0f} ms')
+        durations = launch_times([sys.executable, '-c', 'pass'], args.launches)
+        print(f'bare interpreter: p50 {percentile(durations, 0.5) * 1000:.0f} ms')
+
+        pump(app, lambda: app.loader is None)
+        if app.filepath != path or app.document.text() != 'handed off\n':
+            print('FAIL: the handed off file was not opened')
+            failed = True
+
+        app.quit_program()
+        app.root.destroy()
+        if os.path.exists(os.environ[instance.SOCKET_VARIABLE]):
+            print('FAIL: the socket was not removed on exit')
+            failed = True
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if display is not None:
+            display.terminate()
+
+    if not failed:
+        print('OK')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
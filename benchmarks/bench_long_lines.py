@@ -0,0 +1,130 @@
+"""Times cursor movement and typing on a file that is a single 20 MB line.
+
+The real Notepad window is driven like benchmarks/run.py does, under Xvfb when there is no display.
+The file opens in long-line mode; --no-long-lines turns the mode off to compare, which can take
+minutes. The document is saved before and after typing and the exit status is 1 if the saved
+bytes are not exactly the original ones, plus the typed text.
+
+Usage: python benchmarks/bench_long_lines.py [--size-mb 20] [--no-long-lines]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import WORDS, percentile, pump, start_display  # noqa: E402
+
+MOVES = 200  # Cursor moves timed per kind of move
+KEYSTROKES = 200  # Characters typed
+
+
+def write_line(path, size_mb):
+    """Writes a file made of one line of size_mb megabytes of words, returns its bytes."""
+    rng = random.Random(1234)
+    words = ' '.join(rng.choices(WORDS, k=200000))
+    data = (words * (size_mb * 1024 * 1024 // len(words) + 1))[:size_mb * 1024 * 1024].encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def saved(app, path):
+    """Saves the document to path and returns the file's bytes."""
+    if os.path.exists(path):
+        os.remove(path)
+    app.start_save(path)
+    pump(app, lambda: app.save_job is None)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def timed_moves(app, target):
+    """Moves the cursor MOVES times to target(i) and shows it, returns the p50 and p95 latencies."""
+    latencies = []
+    for i in range(MOVES):
+        start = time.perf_counter()
+        app.text_field.mark_set('insert', target(i))
+        app.text_field.see('insert')
+        app.root.update_idletasks()
+        latencies.append(time.perf_counter() - start)
+    return percentile(latencies, 0.5), percentile(latencies, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long line editing benchmark')
+    parser.add_argument('--size-mb', type=int, default=20)
+    parser.add_argument('--no-long-lines', action='store_true', help='load the file without long-line mode')
+    args = parser.parse_args()
+
+    display = start_display()
+    scratch = tempfile.mkdtemp(prefix='notepad-bench-')
+    os.environ['HOME'] = scratch  # Keeps the journals out of the real home directory
+    import notepad
+    if args.no_long_lines:
+        notepad.LONG_LINE_CHARS = float('inf')
+
+    failed = False
+    try:
+        path = os.path.join(scratch, 'line.txt')
+        original = write_line(path, args.size_mb)
+        app = notepad.Notepad()
+        pump(app, lambda: app.profiler.first_paint is not None)
+
+        start = time.perf_counter()
+        app.load_file(path)
+        pump(app, lambda: app.loader is None)
+        app.root.update()
+        print(f'open: {time.perf_counter() - start:.2f} s, long-line mode {"on" if app.long_lines else "off"}')
+
+        if saved(app, os.path.join(scratch, 'saved.txt')) != original:
+            print('FAIL: the saved file differs from the original')
+            failed = True
+
+        rng = random.Random(42)
+        size = len(app.document)
+        jumps = [rng.randrange(size) for _ in range(MOVES)]
+        p50, p95 = timed_moves(app, lambda i: app.offset_to_index(jumps[i]))
+        print(f'cursor jump: p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms')
+        app.text_field.mark_set('insert', app.offset_to_index(size // 2))
+        p50, p95 = timed_moves(app, lambda i: 'insert+1c')
+        print(f'cursor right: p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms')
+        p50, p95 = timed_moves(app, lambda i: 'insert+1l')
+        print(f'cursor down: p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms')
+
+        offset = size // 2
+        app.text_field.mark_set('insert', app.offset_to_index(offset))
+        typed = ''.join('x' if i % 10 else ' ' for i in range(KEYSTROKES))
+        latencies = []
+        for char in typed:
+            start = time.perf_counter()
+            app.text_field.insert('insert', char)
+            app.refresh_status_bar()  # Normally debounced, forced here to include its cost in every key
+            app.root.update_idletasks()
+            latencies.append(time.perf_counter() - start)
+        print(f'keystroke: p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+              f'p95 {percentile(latencies, 0.95) * 1000:.1f} ms')
+
+        expected = original[:offset] + typed.encode('ascii') + original[offset:]
+        if saved(app, os.path.join(scratch, 'typed.txt')) != expected:
+            print('FAIL: the saved file differs from the original plus the typed text')
+            failed = True
+
+        app.quit_program()
+        app.root.destroy()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if display is not None:
+            display.terminate()
+
+    if not failed:
+        print('OK')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Compares the old whole-document Replace All with the range by range one on documents with many matches.
+
+The document model and counters part always runs; the range by range side takes the editor's path,
+which rebuilds the model from the new text when the matches are dense. When a display is available
+the text widget part is timed too: deleting and reinserting everything versus replacing each match
+back to front.
+
+Usage: python benchmarks/bench_replace_all.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from counters import TextCounts  # noqa: E402
+from document import PieceTable, dense_replacements, replaced_text  # noqa: E402
+from search import SearchEngine  # noqa: E402
+
+LINE = 'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu\n'
+SIZES_MB = [1, 5, 20]
+SEARCH, REPLACE = 'gamma', 'GAMMA!'
+
+
+def timed(function):
+    """Returns the seconds a call takes."""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def bench_model(text):
+    """Times both approaches on the document model and counters only."""
+    def whole():
+        document, counts = PieceTable(text), TextCounts(text)
+        new_text = document.text().replace(SEARCH, REPLACE)
+        document.reset(new_text)
+        counts.reset(new_text)
+
+    def ranges():
+        document, counts, engine = PieceTable(text), TextCounts(text), SearchEngine()
+        matches = engine.find_all(document, SEARCH)
+        replacements = [(start, end, REPLACE) for start, end in zip(matches.starts, matches.ends)]
+        searched = engine.text(document)
+        if dense_replacements(replacements, len(searched)):
+            new_text = replaced_text(searched, replacements)
+            counts.reset(new_text)
+            document.reset(new_text)
+        else:
+            counts.replace_ranges(searched, replacements)
+            document.replace_many(replacements)
+
+    # Building the document is common to both, take it out
+    setup = timed(lambda: (PieceTable(text), TextCounts(text), SearchEngine()))
+    return timed(whole) - setup, timed(ranges) - setup
+
+
+def bench_widget(root, text):
+    """Times both approaches on a Tk text widget with undo enabled."""
+    import tkinter as tk
+
+    widget = tk.Text(root, undo=True, wrap='word')
+    widget.pack()
+
+    def reset():
+        widget.delete('1.0', 'end')
+        widget.insert('1.0', text)
+        widget.edit_reset()
+        root.update()
+
+    reset()
+    engine = SearchEngine()
+    document = PieceTable(text)
+    matches = engine.find_all(document, SEARCH)
+
+    def whole():
+        content = widget.get('1.0', 'end-1c')
+        widget.delete('1.0', 'end-1c')
+        widget.insert('end-1c', content.replace(SEARCH, REPLACE))
+        root.update()
+
+    def ranges():
+        widget.configure(autoseparators=False)
+        for start, end in zip(reversed(matches.starts), reversed(matches.ends)):
+            widget.replace(engine.index(start), engine.index(end), REPLACE)
+        widget.configure(autoseparators=True)
+        root.update()
+
+    whole_time = timed(whole)
+    reset()
+    ranges_time = timed(ranges)
+    widget.destroy()
+    return whole_time, ranges_time
+
+
+def main():
+    root = None
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:  # No display, or no Tk at all
+        print(f'Text widget benchmark skipped: {e}')
+
+    print(f'{"size":>6} {"matches":>9} {"model whole":>12} {"model ranges":>13} {"widget whole":>13} {"widget ranges":>14}')
+    for size_mb in SIZES_MB:
+        text = LINE * (size_mb * 1024 * 1024 // len(LINE))
+        model_whole, model_ranges = bench_model(text)
+        widget_whole = widget_ranges = float('nan')
+        if root is not None:
+            widget_whole, widget_ranges = bench_widget(root, text)
+        print(f'{size_mb:>4}MB {text.count(SEARCH):>9} {model_whole:>11.3f}s {model_ranges:>12.3f}s '
+              f'{widget_whole:>12.3f}s {widget_ranges:>13.3f}s')
+
+    if root is not None:
+        root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Checks that the undo history stays within its memory budget over long scripted editing sessions.
+
+A day of editing is played against the document model and the undo manager, the way the editor's
+edit hook feeds them: typing, backspacing, big pastes, deleting large blocks and Replace All. The
+history size is checked against the budget after every edit, and tracemalloc measures the memory
+the history really holds. A short session is also undone and redone completely to check the text
+comes back. The exit status is 1 if the budget was exceeded or the text did not come back.
+
+Usage: python benchmarks/bench_undo.py [--budget-mb 16] [--edits 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document import PieceTable  # noqa: E402
+from undo import UndoManager, as_replacements, format_size  # noqa: E402
+
+WORDS = ('alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron pi rho sigma '
+         'tau upsilon phi chi psi omega').split()
+PASTE_CHARS = 2 * 1024 * 1024  # Size of the big pastes
+REPLACE_RANGES = 5000  # Matches rewritten by a Replace All
+
+
+def random_text(rng, size):
+    """Returns word lines of about size characters."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def paste_text(rng, corpus):
+    """Returns PASTE_CHARS characters from a random place of the corpus."""
+    start = rng.randint(0, len(corpus) - PASTE_CHARS)
+    return corpus[start:start + PASTE_CHARS]
+
+
+class Session:
+    """A document edited through the undo manager, like the editor's edit hook does."""
+
+    def __init__(self, text, budget):
+        self.document = PieceTable(text)
+        self.history = UndoManager(budget)
+        self.peak = 0  # Largest history size seen after an edit
+        self.largest_step = 0  # Largest single step, which is kept even over budget
+
+    def edit(self, offset, removed, inserted):
+        """Replaces removed characters at offset with inserted."""
+        self.history.record(offset, self.document.get(offset, offset + removed), inserted)
+        self.document.replace(offset, removed, inserted)
+        self.check()
+
+    def replace_all(self, replacements):
+        """Applies sorted (start, end, text) replacements as one step."""
+        self.history.begin_group()
+        for start, end, new in reversed(replacements):
+            self.history.record(start, self.document.get(start, end), new)
+        self.history.end_group()
+        self.document.replace_many(replacements)
+        self.check()
+
+    def apply(self, edits):
+        """Applies edits returned by undo() or redo()."""
+        replacements = as_replacements(edits)
+        if replacements is not None and len(replacements) > 1:
+            self.document.replace_many(replacements)
+        else:
+            for offset, length, text in edits:
+                self.document.replace(offset, length, text)
+
+    def check(self):
+        """Tracks the history size."""
+        self.peak = max(self.peak, self.history.size)
+        if self.history.undo_steps:
+            self.largest_step = max(self.largest_step, self.history.undo_steps[-1].size)
+
+
+def play(session, rng, corpus, edits):
+    """Plays a scripted editing session of about edits edits, pasting from the corpus."""
+    done = 0
+    while done < edits:
+        kind = rng.random()
+        length = len(session.document)
+        if kind < 0.7:
+            # Type a few words somewhere
+            offset = rng.randint(0, length)
+            for char in random_text(rng, rng.randint(5, 60)) + ' ':
+                session.edit(offset, 0, char)
+                offset += 1
+                done += 1
+        elif kind < 0.9 and length:
+            # Backspace a few characters
+            offset = rng.randint(1, length)
+            for _ in range(min(offset, rng.randint(1, 20))):
+                offset -= 1
+                session.edit(offset, 1, '')
+                done += 1
+        elif kind < 0.94:
+            session.edit(rng.randint(0, length), 0, paste_text(rng, corpus))
+            done += 1
+        elif kind < 0.98 and length > PASTE_CHARS:
+            # Select a block and delete it, which keeps the document from growing forever
+            start = rng.randint(0, length - PASTE_CHARS)
+            session.edit(start, PASTE_CHARS, '')
+            done += 1
+        elif length > REPLACE_RANGES * 4:
+            starts = sorted(rng.sample(range(0, length - 2, 2), REPLACE_RANGES))
+            session.replace_all([(start, start + 1, 'XY') for start in starts])
+            done += 1
+
+
+def check_round_trip(rng):
+    """Undoes then redoes a whole session, returns True if the text comes back both times."""
+    corpus = random_text(rng, PASTE_CHARS * 2)
+    session = Session(random_text(rng, 100000), budget=float('inf'))
+    original = session.document.text()
+    play(session, rng, corpus, 2000)
+    final = session.document.text()
+    while session.history.can_undo():
+        session.apply(session.history.undo())
+    undone = session.document.text() == original
+    while session.history.can_redo():
+        session.apply(session.history.redo())
+    return undone and session.document.text() == final
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Undo history memory soak test')
+    parser.add_argument('--budget-mb', type=float, default=16)
+    parser.add_argument('--edits', type=int, default=100000)
+    args = parser.parse_args()
+    budget = int(args.budget_mb * 1024 * 1024)
+    rng = random.Random(42)
+
+    corpus = random_text(rng, PASTE_CHARS * 4)
+    session = Session(corpus, budget)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    play(session, rng, corpus, args.edits)
+    elapsed = time.perf_counter() - start
+    document_size = sys.getsizeof(session.document.text())
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    allowed = max(budget, session.largest_step)
+    print(f'{args.edits:,} edits in {elapsed:.1f} s, {len(session.history.undo_steps):,} undo steps kept')
+    print(f'history {format_size(session.history.size)}, peak {format_size(session.peak)}, '
+          f'budget {format_size(budget)}, largest step {format_size(session.largest_step)}')
+    print(f'memory held by the document and history: {format_size(held)} (text alone {format_size(document_size)})')
+
+    failed = False
+    if session.peak > allowed:
+        print('FAIL: the history went over its budget')
+        failed = True
+    if not check_round_trip(rng):
+        print('FAIL: undoing and redoing a session did not give the text back')
+        failed = True
+    if not failed:
+        print('OK')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
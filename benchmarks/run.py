@@ -0,0 +1,305 @@
+"""Times the editor's hot paths on generated documents and flags regressions against a baseline.
+
+The real Notepad window is driven, under a virtual X display (Xvfb) when no display is available.
+Every scenario runs --repeat times per document size and the medians, in seconds, are written to a
+JSON file. If a baseline file exists, results slower than it by more than --tolerance are reported
+and the exit status is 1. --update-baseline stores the results as the new baseline.
+
+Scenarios: startup to first paint, open_file, typing with the status bar counters, Find Next, Replace All, save and a font
+change. Documents of LARGE_FILE_BYTES and up open in the read-only large file viewer, where only
+opening, indexing and Find Next are timed, unless --no-viewer loads them into the text field.
+
+Usage: python benchmarks/run.py [--sizes 1,10,100,500] [--repeat 3] [--output FILE] [--baseline FILE]
+                                [--tolerance 0.2] [--update-baseline] [--no-viewer] [--data-dir DIR]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES_MB = [1, 10, 100, 500]
+WORDS = ('alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron pi rho sigma '
+         'tau upsilon phi chi psi omega').split()
+SEARCH, REPLACE = 'needle', 'pin'  # SEARCH is written once every NEEDLE_LINES lines
+NEEDLE_LINES = 50
+KEYSTROKES = 200  # Characters typed per typing run
+FIND_NEXT_CALLS = 20  # Find Next calls timed after the first one, which scans the document
+FONTS = ['Courier New', 'Arial']  # Alternated by the font change scenario
+TIMEOUT = 600  # Seconds an asynchronous operation may take before the run is aborted
+MIN_REGRESSION = 0.005  # Slowdowns smaller than this many seconds are noise, never regressions
+
+
+def start_display():
+    """Starts Xvfb and points DISPLAY at it when there is no display, returns the process or None."""
+    if os.environ.get('DISPLAY') or sys.platform != 'linux':
+        return None
+    xvfb = shutil.which('Xvfb')
+    if xvfb is None:
+        sys.exit('No display and Xvfb is not installed')
+
+    # Xvfb picks a free display number and writes it to the pipe
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen([xvfb, '-displayfd', str(write_fd), '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                               pass_fds=(write_fd,), stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        display = f.readline().strip()
+    if not display:
+        process.kill()
+        sys.exit('Xvfb did not start')
+    os.environ['DISPLAY'] = f':{display}'
+    return process
+
+
+def generate_block():
+    """Returns 1 MB of reproducible text made of word lines, with SEARCH every NEEDLE_LINES lines."""
+    rng = random.Random(1234)
+    lines = []
+    size = 0
+    while size < 1024 * 1024:
+        words = rng.choices(WORDS, k=rng.randint(4, 16))
+        if len(lines) % NEEDLE_LINES == 0:
+            words[rng.randrange(len(words))] = SEARCH
+        line = ' '.join(words) + '\n'
+        lines.append(line)
+        size += len(line)
+    return ''.join(lines)
+
+
+def document_path(data_dir, size_mb, block):
+    """Returns the path of a generated document of size_mb megabytes, writing it if needed."""
+    path = os.path.join(data_dir, f'doc-{size_mb}mb.txt')
+    data = block.encode('ascii')
+    if not os.path.exists(path) or os.path.getsize(path) != len(data) * size_mb:
+        with open(path, 'wb') as f:
+            for _ in range(size_mb):
+                f.write(data)
+    return path
+
+
+def pump(app, done):
+    """Runs the event loop until done() is true."""
+    deadline = time.perf_counter() + TIMEOUT
+    while not done():
+        app.root.update()
+        if time.perf_counter() > deadline:
+            raise TimeoutError('operation did not finish')
+        time.sleep(0.001)  # Leave the GIL to the worker threads
+
+
+def timed(function):
+    """Returns the seconds a call takes."""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    """Returns the value below which fraction of the values fall."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def open_document(app, path):
+    """Opens a file as the user would and waits until it is fully shown, returns the timings."""
+    app.close_journal(remove=True)  # Otherwise reopening the file would offer to recover the last run's edits
+
+    start = time.perf_counter()
+    app.load_file(path)
+    if app.viewer is not None:
+        app.root.update_idletasks()
+        shown = time.perf_counter() - start
+        pump(app, lambda: app.viewer.indexed)
+        return {'viewer_open': shown, 'viewer_index': time.perf_counter() - start}
+
+    pump(app, lambda: app.loader is None)
+    return {'open_file': time.perf_counter() - start}
+
+
+def bench_typing(app):
+    """Types in the middle of the document, refreshing the status bar after every key."""
+    app.text_field.mark_set('insert', f'{app.counts.lines // 2}.0')
+    app.text_field.see('insert')
+    app.root.update()
+
+    latencies = []
+    for i in range(KEYSTROKES):
+        start = time.perf_counter()
+        app.text_field.insert('insert', 'x' if i % 10 else ' ')
+        app.refresh_status_bar()  # Normally debounced, forced here to include its cost in every key
+        app.root.update_idletasks()
+        latencies.append(time.perf_counter() - start)
+    return {'keystroke_p50': percentile(latencies, 0.5), 'keystroke_p95': percentile(latencies, 0.95)}
+
+
+def bench_find_next(app):
+    """Times Find Next after an edit, which scans the document, then the following calls."""
+    if app.viewer is not None:
+        app.viewer_find_offset = -1
+        return {'find_next': timed(lambda: app.viewer_find_next(SEARCH))}
+
+    def find_next(index):
+        matches = app.search_engine.find_all(app.document, SEARCH)
+        app.show_match(matches, index % len(matches))
+        app.root.update_idletasks()
+
+    first = timed(lambda: find_next(0))
+    times = [timed(lambda: find_next(i)) for i in range(1, FIND_NEXT_CALLS + 1)]
+    return {'find_next_first': first, 'find_next': statistics.median(times)}
+
+
+def bench_replace_all(app):
+    """Times Replace All, then puts the original text back."""
+    def replace_all(search, replace):
+        app.replace_all_matches(search, replace)
+        app.root.update_idletasks()
+
+    result = {'replace_all': timed(lambda: replace_all(SEARCH, REPLACE))}
+    replace_all(REPLACE, SEARCH)
+    return result
+
+
+def bench_save(app, path):
+    """Times saving the document to a new file until the background save is done."""
+    if os.path.exists(path):
+        os.remove(path)
+    start = time.perf_counter()
+    app.start_save(path)
+    pump(app, lambda: app.save_job is None)
+    return {'save': time.perf_counter() - start}
+
+
+def bench_font_change(app):
+    """Times changing the font of the text field through the option bar until it is redrawn."""
+    def change(font):
+        app.font_combobox.set(font)
+        app.root.update_idletasks()
+
+    return {'font_change': statistics.median(timed(lambda: change(font)) for font in FONTS * 2)}
+
+
+def bench_size(notepad, path, repeat, scratch):
+    """Runs every scenario repeat times on one document, returns the median of each result."""
+    app = notepad.Notepad()
+    pump(app, lambda: app.profiler.first_paint is not None)
+    runs = {'startup': [app.profiler.first_paint]}
+    try:
+        for _ in range(repeat):
+            result = open_document(app, path)
+            if app.viewer is None:
+                result.update(bench_typing(app))
+            result.update(bench_find_next(app))
+            if app.viewer is None:
+                result.update(bench_replace_all(app))
+                result.update(bench_save(app, os.path.join(scratch, 'saved.txt')))
+            result.update(bench_font_change(app))
+            for name, seconds in result.items():
+                runs.setdefault(name, []).append(seconds)
+    finally:
+        app.quit_program()
+        app.root.destroy()
+    return {name: statistics.median(values) for name, values in runs.items()}
+
+
+def git_commit():
+    """Returns the commit the tree is at, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Prints the results next to the baseline and returns the regressions as (size, name, old, new)."""
+    regressions = []
+    print(f'{"size":>6} {"scenario":<16} {"seconds":>10} {"baseline":>10} {"change":>8}')
+    for size, metrics in results.items():
+        for name, seconds in metrics.items():
+            old = baseline.get(size, {}).get(name)
+            change = ''
+            if old:
+                change = f'{(seconds - old) / old * 100:+.0f}%'
+                if seconds > old * (1 + tolerance) and seconds - old > MIN_REGRESSION:
+                    regressions.append((size, name, old, seconds))
+                    change += ' !'
+            old_text = f'{old:.4f}' if old is not None else '-'
+            print(f'{size:>6} {name:<16} {seconds:>10.4f} {old_text:>10} {change:>8}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Notepad performance benchmarks')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES_MB)), help='document sizes in MB')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size, the median is kept')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'))
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'benchmarks', 'baseline.json'))
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--no-viewer', action='store_true', help='load every size into the text field')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'notepad-bench'))
+    args = parser.parse_args()
+
+    display = start_display()
+    scratch = tempfile.mkdtemp(prefix='notepad-bench-')
+    # Keep the untitled document journal out of the real home directory
+    os.environ['HOME'] = scratch
+    import notepad
+    if args.no_viewer:
+        notepad.LARGE_FILE_BYTES = float('inf')
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    block = generate_block()
+    results = {}
+    try:
+        for size_mb in (int(size) for size in args.sizes.split(',')):
+            path = document_path(args.data_dir, size_mb, block)
+            print(f'Running {size_mb} MB...', file=sys.stderr)
+            results[f'{size_mb}MB'] = bench_size(notepad, path, args.repeat, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if display is not None:
+            display.terminate()
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'tk': notepad.tk.TkVersion,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.tolerance:.0%}:')
+        for size, name, old, new in regressions:
+            print(f'  {name} on {size}: {old:.4f}s -> {new:.4f}s')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
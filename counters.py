@@ -0,0 +1,53 @@
+def count_words(text):
+    """Returns the number of whitespace separated words in text."""
+    return len(text.split())
+
+
+class TextCounts:
+    """Keeps character, line and word totals of a document up to date from edit deltas.
+
+    Every edit is described by the text of the affected lines before and after the change,
+    so the cost of an update depends on the length of those lines, not on the document size.
+    """
+
+    def __init__(self, text=''):
+        self.reset(text)
+
+    def reset(self, text=''):
+        """Recounts everything from scratch, used when the whole document is replaced."""
+        self.characters = len(text)
+        self.lines = text.count('\n') + 1
+        self.words = count_words(text)
+
+    def replace(self, old_context, new_context):
+        """Applies an edit that turned old_context (whole lines) into new_context."""
+        self.characters += len(new_context) - len(old_context)
+        self.lines += new_context.count('\n') - old_context.count('\n')
+        self.words += count_words(new_context) - count_words(old_context)
+
+    def replace_ranges(self, text, replacements):
+        """Applies sorted, non-overlapping (start, end, new) replacements of text.
+
+        Each replacement is counted together with the words it touches, widened to the surrounding
+        whitespace, so the cost depends on the size of the matches and not of the lines they are on.
+        """
+        i = 0
+        while i < len(replacements):
+            left = replacements[i][0]
+            while left > 0 and not text[left - 1].isspace():
+                left -= 1
+
+            parts = []
+            position = left
+            right = replacements[i][0]
+            # Replacements touching the same run of non-whitespace are counted together
+            while i < len(replacements) and replacements[i][0] <= right:
+                start, end, new = replacements[i]
+                parts += (text[position:start], new)
+                position = right = end
+                while right < len(text) and not text[right].isspace():
+                    right += 1
+                i += 1
+            parts.append(text[position:right])
+
+            self.replace(text[left:right], ''.join(parts))
@@ -0,0 +1,367 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+ADD_BUFFER_CHARS = 64 * 1024  # Typed text is appended to add buffers of at most this size
+MAX_PIECES = 2048  # Runs of small pieces get merged once the table grows past this
+SMALL_PIECE_CHARS = 4096  # Pieces shorter than this are merged when compacting
+GARBAGE_CHARS = 16 * 1024 * 1024  # Slack of unreferenced buffer text tolerated before compacting
+REBUILD_SPACING_CHARS = 256  # Replacements closer together than this on average rebuild the whole text instead
+
+
+def newline_positions(text):
+    """Returns the positions of all newlines in text."""
+    positions = array('q')
+    find = text.find
+    position = find('\n')
+    while position >= 0:
+        positions.append(position)
+        position = find('\n', position + 1)
+    return positions
+
+
+def dense_replacements(replacements, length):
+    """Returns True if replacements are so close together that rebuilding a text of length is cheaper than editing each."""
+    return len(replacements) * REBUILD_SPACING_CHARS > length
+
+
+def replaced_text(text, replacements):
+    """Returns text with sorted, non-overlapping (start, end, new) replacements applied."""
+    parts = []
+    position = 0
+    for start, end, new in replacements:
+        parts += (text[position:start], new)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+class PieceView:
+    """Read access shared by documents and their snapshots.
+
+    Text lives in append-only buffers, each with the positions of its newlines. The document is a
+    list of pieces (buffer, start, length, newlines) and cumulative piece lengths and newline counts
+    are kept alongside, so offset <-> line/column lookups are two binary searches. After an edit
+    they are only brought up to date from the first piece it changed.
+    Lines are numbered from 1 and columns from 0, like Tk text indices.
+    """
+
+    def _set_pieces(self, texts, newlines, pieces, length):
+        self._texts = texts
+        self._newlines = newlines
+        self._pieces = pieces
+        self._length = length
+        self._offsets = None
+        self._lines = None
+        self._stale = None  # First piece whose cumulative sums are out of date, None when they all are current
+
+    def __len__(self):
+        return self._length
+
+    def _index(self):
+        """Returns the cumulative offsets and newline counts of the pieces, updating them after edits."""
+        if self._offsets is None:
+            self._offsets = [0, *accumulate(piece[2] for piece in self._pieces)]
+            self._lines = [0, *accumulate(piece[3] for piece in self._pieces)]
+        elif self._stale is not None:
+            # The sums before the first changed piece still hold
+            first = self._stale
+            pieces = self._pieces[first:]
+            self._offsets[first:] = accumulate((piece[2] for piece in pieces), initial=self._offsets[first])
+            self._lines[first:] = accumulate((piece[3] for piece in pieces), initial=self._lines[first])
+        self._stale = None
+        return self._offsets, self._lines
+
+    def _locate(self, offset):
+        """Returns (piece number, offset inside that piece) for an offset, the piece count at the end."""
+        offsets, _ = self._index()
+        if offset >= self._length:
+            return len(self._pieces), 0
+        i = bisect_right(offsets, offset) - 1
+        return i, offset - offsets[i]
+
+    def _count_newlines(self, buffer, start, end):
+        """Returns the number of newlines in buffer[start:end]."""
+        newlines = self._newlines[buffer]
+        return bisect_left(newlines, end) - bisect_left(newlines, start)
+
+    @property
+    def line_count(self):
+        """Number of lines, an empty document has one."""
+        _, lines = self._index()
+        return lines[-1] + 1
+
+    def line_start(self, line):
+        """Returns the offset where a line starts."""
+        if line <= 1:
+            return 0
+        wanted = line - 1  # Number of newlines before the line
+        offsets, lines = self._index()
+        if wanted > lines[-1]:
+            return self._length
+
+        i = bisect_left(lines, wanted) - 1
+        buffer, start, _, _ = self._pieces[i]
+        newlines = self._newlines[buffer]
+        position = newlines[bisect_left(newlines, start) + wanted - lines[i] - 1]
+        return offsets[i] + position - start + 1
+
+    def line_end(self, line):
+        """Returns the offset of the end of a line, before its newline."""
+        if line >= self.line_count:
+            return self._length
+        return self.line_start(line + 1) - 1
+
+    def offset_to_index(self, offset):
+        """Returns the (line, column) of an offset."""
+        offset = max(0, min(offset, self._length))
+        i, inner = self._locate(offset)
+        _, lines = self._index()
+        if i == len(self._pieces):
+            line = lines[-1] + 1
+        else:
+            buffer, start, _, _ = self._pieces[i]
+            line = lines[i] + self._count_newlines(buffer, start, start + inner) + 1
+        return line, offset - self.line_start(line)
+
+    def index_to_offset(self, line, column):
+        """Returns the offset of a (line, column), clamping the column to the line like Tk does."""
+        start = self.line_start(line)
+        return min(start + column, self.line_end(line))
+
+    def line_bounds(self, offset):
+        """Returns the start and end offsets of the line containing an offset."""
+        line, _ = self.offset_to_index(offset)
+        return self.line_start(line), self.line_end(line)
+
+    def chunks(self, start=0, end=None):
+        """Yields the text between two offsets piece by piece, without joining it."""
+        end = self._length if end is None else min(end, self._length)
+        if start >= end:
+            return
+        offsets, _ = self._index()
+        i = bisect_right(offsets, start) - 1
+        while i < len(self._pieces) and offsets[i] < end:
+            buffer, piece_start, _, _ = self._pieces[i]
+            low = max(start, offsets[i]) - offsets[i]
+            high = min(end, offsets[i + 1]) - offsets[i]
+            yield self._texts[buffer][piece_start + low:piece_start + high]
+            i += 1
+
+    def get(self, start=0, end=None):
+        """Returns the text between two offsets."""
+        return ''.join(self.chunks(start, end))
+
+    def text(self):
+        """Returns the whole text."""
+        return self.get()
+
+
+class Snapshot(PieceView):
+    """Immutable copy of a document at one point in time.
+
+    Taking one only copies the piece list, the text buffers are shared with the document, so it is
+    cheap and can be read from a worker thread while editing continues.
+    """
+
+    def __init__(self, document):
+        self.version = document.version
+        self._set_pieces(list(document._texts), list(document._newlines), list(document._pieces), len(document))
+
+
+class PieceTable(PieceView):
+    """Editable document stored as a piece table, independent of Tk."""
+
+    def __init__(self, text=''):
+        self.version = 0
+        self.reset(text)
+
+    def reset(self, text=''):
+        """Replaces the whole document."""
+        self._set_pieces([], [], [], 0)
+        self._add_buffer = None
+        self._buffered = 0
+        if text:
+            self._pieces.append(self._new_buffer(text))
+            self._length = len(text)
+        self._changed()
+
+    def snapshot(self):
+        """Returns a Snapshot of the current text."""
+        return Snapshot(self)
+
+    def _new_buffer(self, text):
+        """Stores text in a new buffer and returns the piece covering it."""
+        self._texts.append(text)
+        self._newlines.append(newline_positions(text))
+        self._buffered += len(text)
+        return len(self._texts) - 1, 0, len(text), len(self._newlines[-1])
+
+    def _append(self, text):
+        """Stores short text at the end of the current add buffer and returns the piece covering it."""
+        if self._add_buffer is None or len(self._texts[self._add_buffer]) + len(text) > ADD_BUFFER_CHARS:
+            self._new_buffer('')
+            self._add_buffer = len(self._texts) - 1
+
+        buffer = self._add_buffer
+        start = len(self._texts[buffer])
+        added = newline_positions(text)
+        # Strings are immutable: swapping in a longer one keeps the prefix that snapshots rely on
+        self._texts[buffer] += text
+        self._newlines[buffer].extend(start + position for position in added)
+        self._buffered += len(text)
+        return buffer, start, len(text), len(added)
+
+    def _split(self, piece, inner):
+        """Splits a piece in two at an offset inside it."""
+        buffer, start, length, newlines = piece
+        left_newlines = self._count_newlines(buffer, start, start + inner)
+        return (buffer, start, inner, left_newlines), (buffer, start + inner, length - inner, newlines - left_newlines)
+
+    def insert(self, offset, text):
+        """Inserts text at an offset."""
+        if not text:
+            return
+        offset = max(0, min(offset, self._length))
+        i, inner = self._locate(offset)
+        pieces = self._pieces
+
+        previous = pieces[i - 1] if inner == 0 and i > 0 else None
+        if (previous is not None and len(text) < ADD_BUFFER_CHARS and previous[0] == self._add_buffer
+                and previous[1] + previous[2] == len(self._texts[self._add_buffer])
+                and len(self._texts[self._add_buffer]) + len(text) <= ADD_BUFFER_CHARS):
+            # Typing right after the previous insertion just grows that piece
+            buffer, start, length, newlines = previous
+            _, _, added, added_newlines = self._append(text)
+            pieces[i - 1] = (buffer, start, length + added, newlines + added_newlines)
+            i -= 1
+        else:
+            piece = self._append(text) if len(text) < ADD_BUFFER_CHARS else self._new_buffer(text)
+            if inner == 0:
+                pieces.insert(i, piece)
+            else:
+                left, right = self._split(pieces[i], inner)
+                pieces[i:i + 1] = [left, piece, right]
+
+        self._length += len(text)
+        self._changed(i)
+
+    def delete(self, offset, length):
+        """Deletes length characters starting at an offset."""
+        offset = max(0, offset)
+        end = min(offset + length, self._length)
+        if offset >= end:
+            return
+
+        i, inner = self._locate(offset)
+        j, inner_end = self._locate(end)
+        replacement = []
+        if inner:
+            replacement.append(self._split(self._pieces[i], inner)[0])
+        if inner_end:
+            replacement.append(self._split(self._pieces[j], inner_end)[1])
+            j += 1
+        self._pieces[i:j] = replacement
+
+        self._length -= end - offset
+        self._changed(i)
+
+    def replace(self, offset, length, text):
+        """Replaces length characters at an offset with text."""
+        self.delete(offset, length)
+        self.insert(offset, text)
+
+    def _slice(self, start, end):
+        """Returns the pieces covering the text between two offsets."""
+        offsets, _ = self._index()
+        pieces = []
+        i = bisect_right(offsets, start) - 1
+        while i < len(self._pieces) and offsets[i] < end:
+            buffer, piece_start, length, newlines = self._pieces[i]
+            low = max(start, offsets[i]) - offsets[i]
+            high = min(end, offsets[i + 1]) - offsets[i]
+            if low or high < length:
+                newlines = self._count_newlines(buffer, piece_start + low, piece_start + high)
+            pieces.append((buffer, piece_start + low, high - low, newlines))
+            i += 1
+        return pieces
+
+    def replace_many(self, replacements):
+        """Applies sorted, non-overlapping (start, end, text) replacements in a single pass over the pieces."""
+        if len(replacements) > MAX_PIECES or dense_replacements(replacements, self._length):
+            # So many pieces would be compacted right away, rebuilding the text is cheaper
+            parts = []
+            position = 0
+            for start, end, text in replacements:
+                parts += self.chunks(position, start)
+                parts.append(text)
+                position = end
+            parts += self.chunks(position)
+            self.reset(''.join(parts))
+            return
+
+        # All the new text goes into one buffer, each replacement gets a piece of it
+        added = self._new_buffer(''.join(text for _, _, text in replacements))[0]
+        added_start = 0
+
+        pieces = []
+        position = 0
+        length = self._length
+        for start, end, text in replacements:
+            if start > position:
+                pieces += self._slice(position, start)
+            if text:
+                added_end = added_start + len(text)
+                pieces.append((added, added_start, len(text), self._count_newlines(added, added_start, added_end)))
+                added_start = added_end
+            length += len(text) - (end - start)
+            position = end
+        pieces += self._slice(position, self._length)
+
+        self._pieces = pieces
+        self._length = length
+        self._changed()
+
+    def _changed(self, first=0):
+        """Marks the lookup index out of date from the first changed piece and compacts the table when it gets fragmented."""
+        self.version += 1
+        if self._stale is None or first < self._stale:
+            self._stale = first
+        if len(self._pieces) > MAX_PIECES or self._buffered > 2 * self._length + GARBAGE_CHARS:
+            self._compact()
+
+    def _compact(self):
+        """Merges runs of small pieces and drops buffer text that no piece refers to anymore."""
+        texts, newlines, pieces = self._texts, self._newlines, self._pieces
+        referenced = [0] * len(texts)
+        for buffer, _, length, _ in pieces:
+            referenced[buffer] += length
+
+        def piece_text(piece):
+            return texts[piece[0]][piece[1]:piece[1] + piece[2]]
+
+        self._set_pieces([], [], [], self._length)
+        self._add_buffer = None
+        self._buffered = 0
+        kept = {}
+        run = []
+
+        def flush():
+            if run:
+                self._pieces.append(self._new_buffer(''.join(piece_text(piece) for piece in run)))
+                run.clear()
+
+        for piece in pieces:
+            buffer = piece[0]
+            if piece[2] < SMALL_PIECE_CHARS or referenced[buffer] * 2 < len(texts[buffer]):
+                # Small pieces, and pieces of mostly deleted buffers, get copied out
+                run.append(piece)
+                continue
+            flush()
+            if buffer not in kept:
+                kept[buffer] = len(self._texts)
+                self._texts.append(texts[buffer])
+                self._newlines.append(newlines[buffer])
+                self._buffered += len(texts[buffer])
+            self._pieces.append((kept[buffer], *piece[1:]))
+        flush()
@@ -0,0 +1,273 @@
+import codecs
+import fnmatch
+import mmap
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+
+from saving import atomic_write
+from search import compile_pattern
+from textcodec import DETECT_BYTES, detect_format, is_ascii_compatible
+
+MMAP_BYTES = 1024 * 1024  # Files from this size on are mapped instead of read
+BATCH_FILES = 32  # Files handed to a worker process at a time
+MAX_FILE_MATCHES = 1000  # Matches reported per file, the count of a replace is not limited
+PREVIEW_CHARS = 200  # Characters of the matching line kept for the result list
+
+# A file searched: mtime_ns and size tell whether it changed before a replace, matches are
+# (line, column, length, preview) with 1-based lines and 0-based columns, error is a message or None
+FileResult = namedtuple('FileResult', 'path mtime_ns size matches error')
+
+
+def parse_globs(text):
+    """Splits a list of glob patterns separated by semicolons, commas or spaces."""
+    return [glob for glob in re.split(r'[;,\s]+', text) if glob]
+
+
+def matches_glob(name, path, globs):
+    """Returns True if a file name or its relative path matches one of the globs."""
+    return any(fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(path, glob) for glob in globs)
+
+
+def walk_files(directory, include=(), exclude=()):
+    """Yields the files under a directory matching an include glob, if any, and no exclude glob.
+
+    Excluded directories are not walked into.
+    """
+    for root, dirs, files in os.walk(directory):
+        relative = os.path.relpath(root, directory)
+        relative = '' if relative == '.' else relative
+        dirs[:] = sorted(name for name in dirs if not matches_glob(name, os.path.join(relative, name), exclude))
+        for name in sorted(files):
+            path = os.path.join(relative, name)
+            if include and not matches_glob(name, path, include):
+                continue
+            if matches_glob(name, path, exclude):
+                continue
+            yield os.path.join(root, name)
+
+
+def batched(items, size):
+    """Yields lists of up to size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def is_binary(sample, encoding):
+    """Returns True if a file looks like binary data rather than text."""
+    return is_ascii_compatible(encoding) and b'\0' in sample
+
+
+def decode(data, text_format, errors='replace'):
+    """Decodes the bytes of a file, line endings left as they are and without the byte order mark."""
+    text = codecs.decode(data, text_format.encoding, errors)
+    return text[1:] if text_format.bom and text.startswith('\ufeff') else text
+
+
+def preview(line_text):
+    """Returns the text of a matching line as shown in the result list."""
+    return line_text.rstrip('\r').expandtabs(4)[:PREVIEW_CHARS]
+
+
+def find_in_bytes(data, needle, encoding, limit):
+    """Returns the matches of an encoded literal in the bytes of a file, which are only decoded around them."""
+    found = []
+    line = 1
+    counted = 0  # Newlines are counted up to here
+    position = data.find(needle)
+    while position >= 0 and len(found) < limit:
+        line += data[counted:position].count(b'\n')
+        counted = position
+        line_start = data.rfind(b'\n', 0, position) + 1
+        line_end = data.find(b'\n', position)
+        line_end = len(data) if line_end < 0 else line_end
+        column = len(codecs.decode(data[line_start:position], encoding, 'replace'))
+        found.append((line, column, len(needle.decode(encoding)),
+                      preview(codecs.decode(data[line_start:line_end], encoding, 'replace'))))
+        position = data.find(needle, position + len(needle))
+    return found
+
+
+def find_in_text(text, pattern, limit):
+    """Returns the matches of a compiled pattern in the text of a file."""
+    found = []
+    line = 1
+    counted = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if end == start:
+            continue
+        line += text.count('\n', counted, start)
+        counted = start
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', start)
+        line_end = len(text) if line_end < 0 else line_end
+        found.append((line, start - line_start, end - start, preview(text[line_start:line_end])))
+        if len(found) >= limit:
+            break
+    return found
+
+
+def search_file(path, search, limit=MAX_FILE_MATCHES):
+    """Returns the FileResult of searching a file, search being compile_pattern() arguments.
+
+    Large files are mapped. A case-sensitive literal is looked for in the raw bytes first, so files
+    without it are never decoded, and without the whole word option the matches are found in the
+    bytes as well. Binary files are skipped.
+    """
+    pattern, regex, ignore_case, whole_word = search
+    try:
+        stat = os.stat(path)
+        matches = []
+        with open(path, 'rb') as f:
+            if stat.st_size == 0:
+                data = b''
+            elif stat.st_size >= MMAP_BYTES:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+            try:
+                sample = data[:DETECT_BYTES]
+                text_format = detect_format(sample)
+                if data and not is_binary(sample, text_format.encoding):
+                    needle = None
+                    if not regex and not ignore_case and is_ascii_compatible(text_format.encoding):
+                        try:
+                            needle = pattern.encode(text_format.encoding)
+                        except UnicodeEncodeError:
+                            needle = b'\0'  # The file's encoding can't hold the text, so it can't contain it
+                    if needle is None or data.find(needle) >= 0:
+                        if needle is not None and not whole_word:
+                            matches = find_in_bytes(data, needle, text_format.encoding, limit)
+                        else:
+                            matches = find_in_text(decode(data, text_format), compile_pattern(*search), limit)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        return FileResult(path, stat.st_mtime_ns, stat.st_size, matches, None)
+    except (OSError, ValueError) as e:
+        return FileResult(path, None, None, [], str(e))
+
+
+def search_files(paths, search):
+    """Worker process body: searches a batch of files, returns the results with matches or errors."""
+    results = (search_file(path, search) for path in paths)
+    return [result for result in results if result.matches or result.error]
+
+
+def replace_file(path, mtime_ns, size, search, replacement):
+    """Replaces every match in a file through an atomic write, returns (path, count, error).
+
+    The file is left alone if it changed since it was searched, or can't be decoded without loss.
+    """
+    try:
+        stat = os.stat(path)
+        if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+            return path, 0, 'changed since the search'
+        with open(path, 'rb') as f:
+            data = f.read()
+        text_format = detect_format(data[:DETECT_BYTES])
+        text = decode(data, text_format, errors='strict')
+
+        pattern = compile_pattern(*search)
+        regex = search[1]
+        text, count = pattern.subn(replacement if regex else lambda match: replacement, text)
+        if count:
+            atomic_write(path, [text], text_format.encoding, newline='', bom=text_format.bom)
+        return path, count, None
+    except UnicodeDecodeError:
+        return path, 0, 'not valid text in its encoding'
+    except (OSError, ValueError, re.error) as e:
+        return path, 0, str(e)
+
+
+def replace_files(items, search, replacement):
+    """Worker process body: replaces in a batch of (path, mtime_ns, size) files, returns their outcomes."""
+    return [replace_file(path, mtime_ns, size, search, replacement) for path, mtime_ns, size in items]
+
+
+class FilesJob:
+    """Runs a function over batches of files in a process pool, driven from a coordinating thread.
+
+    function(batch, *args) must be a module-level function of this module, so the worker processes
+    can import it. batches is an iterable of lists, consumed lazily so a directory walk streams into
+    the pool while it goes on; only a few batches per worker are in flight at a time. The list each
+    call returns is put on the queue as ('results', list, files done); the job ends with ('done',
+    None, files done) or ('error', exception, files done).
+    """
+
+    def __init__(self, function, batches, args=(), workers=None):
+        self.function = function
+        self.batches = batches
+        self.args = args
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = queue.Queue()
+        self.files_done = 0
+        self.started = None
+        self.duration = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='files-job', daemon=True)
+
+    def start(self):
+        """Starts the job in the background."""
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def cancel(self):
+        """Stops handing out batches, the ones running finish but their results are dropped."""
+        self.cancelled.set()
+
+    def finished(self):
+        """Returns True once the job is complete, cancelled or failed."""
+        return self.done.is_set()
+
+    def _collect(self, futures, return_when):
+        """Waits for running batches and queues their results, returns the ones still running."""
+        from concurrent.futures import wait
+
+        finished, running = wait(futures, return_when=return_when)
+        for future in finished:
+            batch_size, results = future.batch_size, future.result()
+            self.files_done += batch_size
+            if not self.cancelled.is_set():
+                self.queue.put(('results', results, self.files_done))
+        return running
+
+    def _run(self):
+        """Coordinating thread body."""
+        # Imported here, the pool is only needed once a job runs
+        import multiprocessing
+        from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor
+
+        outcome = ('done', None)
+        # Spawned, not forked: the editor process runs Tk and other threads
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            running = set()
+            for batch in self.batches:
+                if self.cancelled.is_set():
+                    break
+                future = pool.submit(self.function, batch, *self.args)
+                future.batch_size = len(batch)
+                running.add(future)
+                if len(running) >= self.workers * 2:
+                    running = self._collect(running, FIRST_COMPLETED)
+            if not self.cancelled.is_set():
+                self._collect(running, ALL_COMPLETED)
+        except (OSError, RuntimeError) as e:  # A worker process died, reported to the UI
+            outcome = ('error', e)
+        finally:
+            pool.shutdown(wait=not self.cancelled.is_set(), cancel_futures=True)
+            self.duration = time.perf_counter() - self.started
+            self.queue.put((*outcome, self.files_done))
+            self.done.set()
@@ -0,0 +1,186 @@
+"""Single-instance mode: later launches hand their file to the running editor over a Unix socket.
+
+The first editor started with --single-instance (or NOTEPAD_SINGLE_INSTANCE=1) listens on a
+per-user socket. A later launch connects, sends the path of its file and exits as soon as the
+running editor acknowledged it, before Tk or the rest of the editor is imported. A socket left by
+an editor that crashed refuses connections: the launch then starts an editor of its own, which
+replaces the stale socket.
+
+Only the standard library modules needed for that are imported here, this runs before anything else.
+"""
+import os
+import socket
+import sys
+
+INSTANCE_OPTION = '--single-instance'
+INSTANCE_VARIABLE = 'NOTEPAD_SINGLE_INSTANCE'  # Set to 1 to make single-instance mode the default
+SOCKET_VARIABLE = 'NOTEPAD_INSTANCE_SOCKET'  # Socket path to use instead of the per-user one, for tests
+HANDOFF_TIMEOUT = 2.0  # Seconds a launch waits for the running editor before starting its own
+MAX_MESSAGE_BYTES = 64 * 1024  # Longest path accepted
+ACK = b'ok'
+
+
+def supported():
+    """Returns True if the platform has Unix domain sockets."""
+    return hasattr(socket, 'AF_UNIX') and sys.platform != 'win32'
+
+
+def requested(args):
+    """Returns True if the command line or the environment asks for single-instance mode."""
+    return INSTANCE_OPTION in args or os.environ.get(INSTANCE_VARIABLE, '') not in ('', '0')
+
+
+def socket_path():
+    """Returns the path of the socket of the current user's editor."""
+    if os.environ.get(SOCKET_VARIABLE):
+        return os.environ[SOCKET_VARIABLE]
+    # The runtime directory is private to the user, the temporary directory is shared so the name has the uid
+    directory = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(directory, f'notepad-{os.getuid()}.sock')
+
+
+def handed_off(args):
+    """Hands the file of a command line to the running editor if single-instance mode is asked for,
+    returns True if it took it."""
+    if not requested(args) or not supported() or any(arg in ('--count', '--replace', '-h', '--help') for arg in args):
+        return False  # Batch mode and the help run on their own
+    return hand_off(file_argument(args))
+
+
+def file_argument(args):
+    """Returns the absolute path of the file on a command line, '' if there is none."""
+    for arg in args:
+        if not arg.startswith('-'):
+            return os.path.abspath(arg)
+    return ''
+
+
+def hand_off(path, socket_file=None, timeout=HANDOFF_TIMEOUT):
+    """Sends a file path ('' for none) to the running editor, returns True once it took it.
+
+    False means there is no editor to hand it to: no socket, a stale one, one owned by another
+    user, or an editor that did not answer within timeout seconds.
+    """
+    socket_file = socket_file or socket_path()
+    try:
+        if os.lstat(socket_file).st_uid != os.getuid():
+            return False
+    except OSError:
+        return False
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_file)
+        client.sendall(os.fsencode(path))
+        client.shutdown(socket.SHUT_WR)
+        return client.recv(len(ACK)) == ACK
+    except OSError:  # ConnectionRefusedError for a stale socket, TimeoutError for a hung editor
+        return False
+    finally:
+        client.close()
+
+
+def is_stale(socket_file):
+    """Returns True if nothing listens on an existing socket file any more."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_file)
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return False
+
+
+class Request:
+    """A launch handing off its file to the running editor, read without blocking as its bytes arrive.
+
+    Wait for fileno() to be readable and call read() until it returns the path.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.connection.setblocking(False)
+        self.data = b''
+
+    def fileno(self):
+        """Returns the connection's descriptor."""
+        return self.connection.fileno()
+
+    def read(self):
+        """Reads what arrived, returns the path handed off ('' for none) once the launch sent all of it,
+        None until then. Raises OSError if the launch went away or sent too much."""
+        while True:
+            try:
+                chunk = self.connection.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                return None
+            if not chunk:
+                break
+            self.data += chunk
+            if len(self.data) > MAX_MESSAGE_BYTES:
+                raise OSError('hand-off message too long')
+        self.connection.send(ACK)  # Fits in the empty send buffer, never blocks
+        return os.fsdecode(self.data)
+
+    def close(self):
+        """Closes the connection, the launch starts an editor of its own unless it got the acknowledgement."""
+        self.connection.close()
+
+
+class InstanceServer:
+    """The running editor's end of the socket, which launches hand their files to.
+
+    The listening socket is non-blocking: wait for fileno() to be readable, then accept() returns
+    the Request of the launch that connected. Raises OSError if another editor already listens.
+    """
+
+    def __init__(self, socket_file=None):
+        self.path = socket_file or socket_path()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._bind()
+            self.socket.listen(8)
+            self.socket.setblocking(False)
+        except OSError:
+            self.socket.close()
+            raise
+        self.inode = os.stat(self.path).st_ino  # Only our own socket file is removed when closing
+
+    def _bind(self):
+        """Binds the socket, readable by the user only, replacing a stale socket file."""
+        umask = os.umask(0o177)
+        try:
+            try:
+                self.socket.bind(self.path)
+            except OSError:
+                if not os.path.exists(self.path) or not is_stale(self.path):
+                    raise
+                os.unlink(self.path)  # Left by an editor that crashed
+                self.socket.bind(self.path)
+        finally:
+            os.umask(umask)
+
+    def fileno(self):
+        """Returns the listening socket's descriptor."""
+        return self.socket.fileno()
+
+    def accept(self):
+        """Returns the Request of a launch that connected, None if no launch was waiting."""
+        try:
+            connection, _ = self.socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return None
+        return Request(connection)
+
+    def close(self):
+        """Stops listening and removes the socket file, unless another editor replaced it meanwhile."""
+        self.socket.close()
+        try:
+            if os.stat(self.path).st_ino == self.inode:
+                os.unlink(self.path)
+        except OSError:
+            pass
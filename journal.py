@@ -0,0 +1,239 @@
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows, where journals are not locked
+    fcntl = None
+
+from document import PieceTable
+
+MAGIC = b'NPJ1'
+HEADER = struct.Struct('<4sqq')  # Magic, size and mtime_ns of the file the edits apply to (-1 if none)
+RECORD = struct.Struct('<cqq')  # Kind, offset, length, followed by the payload and its CRC32
+CRC = struct.Struct('<I')
+
+INSERT = b'I'  # Text inserted at offset, length is the size of the UTF-8 payload
+DELETE = b'D'  # length characters deleted at offset, no payload
+SNAPSHOT = b'S'  # Whole document text, replaces everything before it
+
+UNTITLED_PREFIX = '.notepad-untitled'  # Untitled documents are journaled in the home directory, one journal per editor
+
+
+def journal_path(path):
+    """Returns where the journal of a document lives: next to the file, or in the home directory if untitled."""
+    if not path:
+        return os.path.join(os.path.expanduser('~'), f'{UNTITLED_PREFIX}-{os.getpid()}.journal')
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f'.{name}.journal')
+
+
+def untitled_journals():
+    """Returns the journals of untitled documents in the home directory, of running editors or left by crashes."""
+    home = os.path.expanduser('~')
+    try:
+        names = os.listdir(home)
+    except OSError:
+        return []
+    return sorted(os.path.join(home, name) for name in names
+                  if name.startswith(UNTITLED_PREFIX) and name.endswith('.journal'))
+
+
+def lock_journal(f):
+    """Locks an open journal for this editor until it is closed, raises BlockingIOError if another editor has it."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def journal_in_use(path):
+    """Returns True if a running editor is writing a journal, whose edits are then not to recover."""
+    if fcntl is None:
+        return False
+    try:
+        with open(path, 'rb') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def file_signature(path):
+    """Returns (size, mtime_ns) of a file, (-1, -1) if there is no such file."""
+    try:
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return -1, -1
+    return stat.st_size, stat.st_mtime_ns
+
+
+def encode_record(kind, offset, length, payload=b''):
+    """Packs one journal record."""
+    head = RECORD.pack(kind, offset, length)
+    return head + payload + CRC.pack(zlib.crc32(payload, zlib.crc32(head)))
+
+
+def read_journal(path):
+    """Reads a journal, returns (base signature, records, size of the valid part).
+
+    Records are (kind, offset, length, text) tuples. Reading stops at the first truncated or
+    corrupt record, which is where a crash interrupted the last append.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError('not a journal')
+    magic, base_size, base_mtime = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('not a journal')
+
+    records = []
+    position = HEADER.size
+    while position + RECORD.size + CRC.size <= len(data):
+        kind, offset, length = RECORD.unpack_from(data, position)
+        payload_size = 0 if kind == DELETE else length
+        end = position + RECORD.size + payload_size
+        if kind not in (INSERT, DELETE, SNAPSHOT) or end + CRC.size > len(data):
+            break
+        payload = data[position + RECORD.size:end]
+        expected = zlib.crc32(payload, zlib.crc32(data[position:position + RECORD.size]))
+        if CRC.unpack_from(data, end)[0] != expected:
+            break
+        records.append((kind, offset, length, payload.decode('utf8', errors='surrogatepass')))
+        position = end + CRC.size
+
+    return (base_size, base_mtime), records, position
+
+
+def replay(records, text=''):
+    """Applies journal records on top of a base text and returns the resulting PieceTable."""
+    document = PieceTable(text)
+    for kind, offset, length, payload in records:
+        if kind == INSERT:
+            document.insert(offset, payload)
+        elif kind == DELETE:
+            document.delete(offset, length)
+        else:
+            document.reset(payload)
+    return document
+
+
+class EditJournal:
+    """Append-only log of the edits made since a document was last loaded or saved.
+
+    Each edit costs a record the size of the edit. Once the log grows large it is compacted in the
+    background into a single snapshot record, edits made meanwhile are carried over to the new log.
+    The journal is locked while open, so another editor neither overwrites it nor offers to recover
+    it: opening one that is locked raises BlockingIOError.
+    """
+
+    def __init__(self, path, base=(-1, -1), append_at=None):
+        self.path = path
+        self.base = base
+        # Locked before truncating, a journal another editor is writing is left alone
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+        try:
+            lock_journal(self.file)
+        except OSError:
+            self.file.close()
+            raise
+        if append_at is None:
+            self.file.truncate(0)
+            self.file.write(HEADER.pack(MAGIC, *base))
+        else:
+            # Continue a recovered journal, dropping a torn record at its end
+            self.file.truncate(append_at)
+            self.file.seek(append_at)
+        self.size = self.file.tell()
+
+        self.compaction = None  # (thread, temporary path) while compacting
+        self.pending = []  # Records appended while compacting, to carry over
+
+    def _append(self, record):
+        self.file.write(record)
+        self.size += len(record)
+        if self.compaction is not None:
+            self.pending.append(record)
+
+    def insert(self, offset, text):
+        """Records text inserted at an offset."""
+        payload = text.encode('utf8', errors='surrogatepass')
+        self._append(encode_record(INSERT, offset, len(payload), payload))
+
+    def delete(self, offset, length):
+        """Records length characters deleted at an offset."""
+        self._append(encode_record(DELETE, offset, length))
+
+    def snapshot(self, text):
+        """Records the whole text, the records before it are no longer needed."""
+        payload = text.encode('utf8', errors='surrogatepass')
+        self._append(encode_record(SNAPSHOT, 0, len(payload), payload))
+
+    def flush(self, fsync=False):
+        """Pushes buffered records to the operating system, and to disk with fsync."""
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def needs_compaction(self, threshold):
+        """Returns True if the journal grew past threshold bytes and is not being compacted already."""
+        return self.compaction is None and self.size > threshold
+
+    def start_compaction(self, snapshot):
+        """Writes a new journal holding only a document snapshot on a worker thread."""
+        temp_path = self.path + '.compact'
+
+        def run():
+            with open(temp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, *self.base))
+                payload = snapshot.text().encode('utf8', errors='surrogatepass')
+                f.write(encode_record(SNAPSHOT, 0, len(payload), payload))
+
+        thread = threading.Thread(target=run, name='journal-compaction', daemon=True)
+        self.compaction = (thread, temp_path)
+        self.pending = []
+        thread.start()
+
+    def finish_compaction(self):
+        """Swaps in the compacted journal once it is written, returns True when it did."""
+        if self.compaction is None or self.compaction[0].is_alive():
+            return False
+        _, temp_path = self.compaction
+        self.compaction = None
+
+        if not os.path.exists(temp_path):
+            return False  # The worker failed, keep appending to the current journal
+        # The compacted journal is locked before it takes the place of the current one
+        compacted = open(temp_path, 'ab')
+        try:
+            lock_journal(compacted)
+            compacted.writelines(self.pending)
+        except OSError:
+            compacted.close()
+            raise
+        self.pending = []
+
+        os.replace(temp_path, self.path)
+        self.file.close()
+        self.file = compacted
+        self.size = self.file.tell()
+        return True
+
+    def close(self, remove=False):
+        """Closes the journal, deleting it when its edits are no longer needed."""
+        if self.compaction is not None:
+            self.compaction[0].join()
+            try:
+                os.remove(self.compaction[1])
+            except OSError:
+                pass
+            self.compaction = None
+        self.file.close()
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+import time
+
+from textcodec import DETECT_BYTES, decoded_newline, detect_format, fallback_format, make_decoder
+from watcher import read_stamp
+
+FIRST_CHUNK_BYTES = DETECT_BYTES  # Small first chunk, also used to detect the format, so text shows up quickly
+CHUNK_BYTES = 256 * 1024  # Size of the following chunks
+QUEUE_CHUNKS = 8  # Chunks decoded ahead of the UI, bounds the memory used while loading
+
+
+class FileLoader:
+    """Reads and decodes a file on a worker thread, handing the text out in chunks through a queue.
+
+    The encoding and line endings are detected from the first chunk, which is then decoded along
+    with the rest by an incremental decoder, so the file is read only once. Line endings are turned
+    into '\n'. Queue items are (kind, payload, position) tuples where kind is 'format' (payload is
+    the detected TextFormat, sent again before 'done' when the line ending only showed up after the
+    first chunk), 'text' (payload is the decoded chunk and position the number of bytes read so
+    far), 'restart' (payload is the TextFormat the file is decoded with again from the start, after
+    the detected encoding failed further on; the text handed out so far must be dropped), 'done'
+    (payload tells whether line endings were mixed) or 'error' (payload is the exception). Once
+    done, stamp is the FileStamp of the bytes read, taken on the handle they were read from.
+    """
+
+    def __init__(self, path, encoding=None, first_chunk=FIRST_CHUNK_BYTES, chunk=CHUNK_BYTES):
+        self.path = path
+        self.encoding = encoding
+        self.first_chunk = first_chunk
+        self.chunk = chunk
+        self.size = os.path.getsize(path)
+        self.queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.stamp = None
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='file-loader', daemon=True)
+
+        # Timings in seconds, filled in by the UI side as the text is displayed
+        self.started = None
+        self.first_paint = None
+        self.total = None
+
+    def start(self):
+        """Starts reading the file in the background."""
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def cancel(self):
+        """Stops the worker, anything still queued is dropped."""
+        self.cancelled.set()
+
+    def elapsed(self):
+        """Returns seconds since the load started."""
+        return time.perf_counter() - self.started
+
+    def progress(self, position):
+        """Returns the percentage of the file read for a byte position."""
+        if not self.size:
+            return 100
+        return min(100, position * 100 // self.size)
+
+    def _put(self, item):
+        """Queues an item, giving up if the load gets cancelled while the queue is full."""
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self, f, text_format):
+        """Decodes and queues a file from its start, returns (decoder, last text, line ending) or None if the
+        load got cancelled."""
+        f.seek(0)
+        decoder = make_decoder(text_format)
+        newline = text_format.newline
+        guessed = None  # Whether the first chunk had no line ending to detect, known once it is decoded
+        first = True
+        data = f.read(self.first_chunk)
+        while data and not self.cancelled.is_set():
+            text = decoder.decode(data)
+            if guessed is None:
+                guessed = decoder.newlines is None
+            elif guessed and decoder.newlines is not None:
+                # E.g. a minified file: the first line ending comes after the detection sample
+                newline = decoded_newline(decoder.newlines)
+                guessed = False
+            if first and text:
+                if text_format.bom:
+                    text = text.removeprefix('\ufeff')
+                first = False
+            if text and not self._put(('text', text, f.tell())):
+                return None
+            data = f.read(self.chunk)
+        text = decoder.decode(b'', final=True)
+        if guessed and decoder.newlines is not None:
+            newline = decoded_newline(decoder.newlines)  # A lone '\r' held back until the end
+        return decoder, text, newline
+
+    def _run(self):
+        """Worker thread body: reads, decodes and queues the file chunk by chunk."""
+        try:
+            with open(self.path, 'rb') as f:
+                text_format = detect_format(f.read(self.first_chunk), self.encoding)
+                kind = 'format'
+                while True:
+                    if not self._put((kind, text_format, 0)):
+                        return
+                    try:
+                        decoded = self._decode(f, text_format)
+                        break
+                    except UnicodeDecodeError as e:
+                        # Detected from the first chunk only, start over with an encoding that fits the failing bytes
+                        fallback = None if self.encoding else fallback_format(text_format, e.object)
+                        if fallback is None:
+                            raise
+                        text_format = fallback
+                        kind = 'restart'
+                if decoded is None:
+                    return
+                decoder, text, newline = decoded
+                if not self.cancelled.is_set():
+                    # What was read, so anything written after the last read shows up as a change
+                    self.stamp = read_stamp(f, f.tell())
+        except (OSError, UnicodeDecodeError, LookupError) as e:
+            self._put(('error', e, 0))
+            return
+
+        if text:
+            self._put(('text', text, self.size))
+        if newline != text_format.newline:
+            self._put(('format', text_format._replace(newline=newline), self.size))
+        self._put(('done', isinstance(decoder.newlines, tuple), self.size))
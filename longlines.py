@@ -0,0 +1,114 @@
+from bisect import bisect_right
+
+LONG_LINE_CHARS = 10000  # Lines longer than this make a file open in long-line mode
+CHUNK_CHARS = 2000  # Long lines are shown in pieces of this many characters
+
+
+def longest_line(text, carried=0):
+    """Returns the length of the longest line of a text and of its last, unfinished line.
+
+    carried is the length of the unfinished line the text continues, for texts read chunk by chunk.
+    """
+    lines = text.split('\n')
+    longest = max(carried + len(lines[0]), max(map(len, lines)))
+    return longest, len(lines[-1]) + (carried if len(lines) == 1 else 0)
+
+
+class SoftBreaks:
+    """Maps the text field of long-line mode to the document it shows.
+
+    Lines longer than CHUNK_CHARS are shown cut into pieces by extra newlines, soft breaks, that are
+    only in the text field: the document, and so the saved file, never sees them. Each soft break
+    is kept as the document offset the piece after it starts at and the text field line of that
+    piece, both sorted. Edits only add soft breaks when they insert a long run of text, so a piece
+    may grow past CHUNK_CHARS by typing, which Tk handles fine.
+
+    Text field lines and columns are 1-based and 0-based like Tk's, the document is a PieceTable.
+    """
+
+    def __init__(self, document, chunk=CHUNK_CHARS):
+        self.document = document
+        self.chunk = chunk
+        self.offsets = []  # Document offset of the piece after each soft break
+        self.lines = []  # Text field line of that piece
+
+    def clear(self):
+        """Forgets every soft break, for an empty text field."""
+        self.offsets = []
+        self.lines = []
+
+    def to_offset(self, line, column):
+        """Returns the document offset of a text field line and column."""
+        i = bisect_right(self.lines, line) - 1
+        if i >= 0 and self.lines[i] == line:
+            # A piece after a soft break, it ends at the next soft break of the same line or the line's end
+            start = self.offsets[i]
+            end = self.document.line_end(self.document.offset_to_index(start)[0])
+            if i + 1 < len(self.offsets):
+                end = min(end, self.offsets[i + 1])
+            return min(start + column, end)
+        # The first piece of a document line, after i + 1 soft breaks
+        return self.document.index_to_offset(line - i - 1, column)
+
+    def to_index(self, offset):
+        """Returns the text field (line, column) of a document offset, after the soft break it may be at."""
+        line, column = self.document.offset_to_index(offset)
+        i = bisect_right(self.offsets, offset) - 1
+        if i >= 0 and self.lines[i] - i - 1 == line:
+            return self.lines[i], offset - self.offsets[i]
+        return line + i + 1, column
+
+    def soften(self, text):
+        """Returns a text as shown, with soft breaks in its long lines, and the (offset in text, line
+        offset) of each of them."""
+        if len(text) <= self.chunk:
+            return text, []
+        shown = []
+        added = []
+        offset = 0
+        line = 0
+        for i, segment in enumerate(text.split('\n')):
+            if i:
+                shown.append('\n')
+                offset += 1
+                line += 1
+            shown.append(segment[:self.chunk])
+            for start in range(self.chunk, len(segment), self.chunk):
+                line += 1
+                added.append((offset + start, line))
+                shown.append('\n')
+                shown.append(segment[start:start + self.chunk])
+            offset += len(segment)
+        return ''.join(shown), added
+
+    def _shift(self, i, chars, lines):
+        """Moves the soft breaks from the i-th on by chars characters and lines lines."""
+        if i < len(self.offsets) and (chars or lines):
+            self.offsets[i:] = [offset + chars for offset in self.offsets[i:]]
+            self.lines[i:] = [line + lines for line in self.lines[i:]]
+
+    def inserted(self, line, offset, text):
+        """Records text inserted on a text field line at a document offset; returns the text to insert
+        in the text field, with soft breaks.
+
+        Must be called before the document gets the text.
+        """
+        shown, added = self.soften(text)
+        i = bisect_right(self.lines, line)  # The pieces after the line move, a piece the text goes in stays
+        self._shift(i, len(text), text.count('\n') + len(added))
+        self.offsets[i:i] = [offset + start for start, _ in added]
+        self.lines[i:i] = [line + lines for _, lines in added]
+        return shown
+
+    def deleted(self, start_line, end_line, start, end):
+        """Records the text between two text field positions deleted, which are on start_line and
+        end_line and at the document offsets start and end.
+
+        The soft breaks whose newline is deleted, ending the lines from start_line to end_line - 1,
+        go away.
+        """
+        i = bisect_right(self.lines, start_line)
+        j = bisect_right(self.lines, end_line)
+        del self.offsets[i:j]
+        del self.lines[i:j]
+        self._shift(i, start - end, start_line - end_line)
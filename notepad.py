@@ -1,558 +1,2682 @@
-import os
-import tempfile
-from datetime import datetime
-
-import pyperclip
-import win32api
-import win32print
-
-import tkinter as tk
-from tkinter import ttk
-from tkinter.filedialog import askopenfilename, asksaveasfilename
+import time
 
+LAUNCHED = time.perf_counter()  # Start of the startup profile, taken before the other imports
 
-def open_file():
-    """Opens a file dialog to select a text file and displays its content in the text field."""
-    global open_flag
-    global filepath
+import sys
 
-    filepath = askopenfilename(filetypes=[('text file', '*.txt')])
-    name = os.path.basename(filepath)
+if __name__ == '__main__':
+    import instance
 
-    if not filepath:
-        return
+    # In single-instance mode a launch hands its file to the running editor and exits here, in milliseconds
+    if instance.handed_off(sys.argv[1:]):
+        sys.exit(0)
 
-    text_field.delete('1.0', 'end-1c')
+    import batch
 
-    with open(filepath, 'r', encoding='utf8') as f:
-        content = f.read()
-        text_field.insert('end-1c', content)
+    # Batch mode exits here, before Tk and the rest of the editor get imported
+    if batch.requested(sys.argv[1:]):
+        sys.exit(batch.main(sys.argv[1:]))
 
-    root.title(f'{name} | Notepad')
-    open_flag = True
-    return filepath
-
-
-def save():
-    """Saves the current content to the existing file or prompts for a new file if it hasn't been saved before."""
-    global open_flag
-    global filepath
+import argparse
+import os
+import queue
+import re
+from datetime import datetime
 
-    if open_flag:
-        with open(filepath, 'w', encoding='utf8') as f:
-            content = text_field.get('1.0', 'end-1c')
-            f.write(content)
-    else:
-        filepath = asksaveasfilename(filetypes=[('text file', '*.txt')], )
-        name = os.path.basename(filepath)
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+from tkinter.filedialog import askdirectory, askopenfilename, asksaveasfilename
+
+from backends import clipboard, print_backend
+from counters import TextCounts, count_words
+from document import PieceTable, dense_replacements, replaced_text
+from findinfiles import BATCH_FILES, FilesJob, batched, parse_globs, replace_files, search_files, walk_files
+from instance import HANDOFF_TIMEOUT, InstanceServer, file_argument, hand_off, requested, supported
+from journal import (EditJournal, SNAPSHOT, file_signature, journal_in_use, journal_path, read_journal, replay,
+                     untitled_journals)
+from loader import FileLoader
+from longlines import LONG_LINE_CHARS, SoftBreaks, longest_line
+from printing import PrintJob, PrintSpooler, page_layout, parse_page_ranges
+from profiler import StartupProfiler
+from saving import SaveJob
+from search import SearchEngine, SearchTask, compile_pattern, find_between
+from textcodec import (DEFAULT_FORMAT, DETECT_BYTES, ENCODING_NAMES, detect_format, format_label,
+                       is_ascii_compatible)
+from tracing import traced, tracer
+from undo import UndoManager, as_replacements, format_size
+from viewer import MappedFile
+from watcher import FileWatcher, ReloadJob, stamp_file
 
-        if not filepath:
-            return
-
-        with open(filepath, 'w', encoding='utf8') as f:
-            content = text_field.get('1.0', 'end-1c')
-            f.write(content)
-        root.title(f'{name} | Notepad')
-
-
-def save_file_as():
-    """Prompts the user to save the current content to a new file."""
-    global filepath
-
-    filepath = asksaveasfilename(filetypes=[('text file', '*.txt')])
-    name = os.path.basename(filepath)
-
-    if not filepath:
-        return
-
-    with open(filepath, 'w', encoding='utf8') as f:
-        content = text_field.get('1.0', 'end-1c')
-        f.write(content)
-
-    root.title(f'{name} | Notepad')
-
-
-def printer():
-    """Opens a print dialog to allow the user to select a printer and print the current content."""
-    installed_printers = list(win32print.EnumPrinters(2))
-    installed_printers_list = [printer[2] for printer in installed_printers]  # Extract printer names
-
-    # Setup printer selection window
-    printers_window = tk.Tk()
-    printers_window.title('Select printer')
-    printers_window.geometry('300x150')
-    printers_window.resizable(False, False)
-    title = tk.Label(printers_window, text='Select printer:', font=('Arial', 12))
-    title.pack(pady=(15, 0))
 
-    # Combobox to select printer
-    selected_printer_var = tk.StringVar(printers_window)
-    printers_combobox = ttk.Combobox(
-        printers_window, width=40, state='readonly', values=installed_printers_list, textvariable=selected_printer_var
-    )
-    printers_combobox.pack(pady=(15, 0))
-    printers_combobox.set(installed_printers_list[-1])  # Set default printer
+# Font and size lists used for font selection in menus and comboboxes
+fonts = ['Arial', 'Times New Roman', 'Comic Sans MS', 'Courier New', 'Impact']
+sizes = ['8', '10', '12', '14', '16', '18', '20', '22', '24', '26', '28', '36', '48', '56', '64']
 
-    def print_in_selected():
-        """Sets the selected printer as default and sends the current content to print."""
-        selected_printer = selected_printer_var.get()
-        win32print.SetDefaultPrinter(selected_printer)
-        content = text_field.get('1.0', 'end-1c')
-        filename = tempfile.mktemp(".txt")
-        open(filename, "w").write(content)
-        win32api.ShellExecute(0, 'printto', filename, '"%s"' % win32print.GetDefaultPrinter(), '.', 0)
-        printers_window.destroy()
+# Saving, a document is dirty when its version differs from the last saved one
+FSYNC_ON_SAVE = True  # Flush saved files to disk before replacing the original
+SAVE_POLL_MS = 20  # How often a running save is checked for completion
 
-    print_button = tk.Button(printers_window, text='Print', command=print_in_selected)
-    print_button.pack(pady=(30, 0))
+# Autosave journal of the unsaved edits, for crash recovery
+AUTOSAVE_MS = 1000  # How often the journal is flushed to disk
+JOURNAL_COMPACT_BYTES = 8 * 1024 * 1024  # Journals larger than this (and than twice the text) get compacted
 
+# Watching the open file for changes made by other programs
+WATCH_POLL_MS = 1000  # How often the file is checked where inotify is not available
+WATCH_SETTLE_MS = 100  # Delay after an inotify event, so a burst of writes is read once
+RELOAD_POLL_MS = 20  # How often a running reload is checked for completion
+
+# Background file loading
+LOAD_BATCH_CHARS = 256 * 1024  # Characters inserted per event loop turn while loading
+
+# Read-only large file viewer
+LARGE_FILE_BYTES = 256 * 1024 * 1024  # Files from this size on open in the viewer
+VIEWER_MARGIN_LINES = 200  # Lines kept above and below the visible ones
+VIEWER_POLL_MS = 200  # Status bar refresh interval while the line index is built
+
+# Printing
+PRINT_POLL_MS = 100  # How often the status bar shows the progress of the print jobs
+PRINT_WIDTH_SAMPLE = 'abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789'  # Averaged for the character width
+
+# Tracing, off unless the performance overlay is shown
+OVERLAY_REFRESH_MS = 500  # How often the overlay statistics are redrawn
+OVERLAY_ROWS = 12  # Handlers listed in the overlay, slowest first
+IDLE_PROBE_MS = 50  # Interval of the timer whose lateness measures the event loop lag
+
+# Find & Replace
+TAG_BATCH_RANGES = 10000  # Match ranges tagged per Tcl call
+HIGHLIGHT_MARGIN_LINES = 100  # "Highlight all" tags the matches this many lines above and below the visible ones
+HIGHLIGHT_MARGIN_CHARS = 64 * 1024  # and at most this many characters around them, for very long lines
+HIGHLIGHT_MAX_MATCHES = 5000  # Matches tagged per region searched, bounds the tags in the text field
+SEARCH_DEBOUNCE_MS = 150  # Search as you type starts once typing in the Find entry pauses this long
+SEARCH_POLL_MS = 30  # How often the first match and the count are picked up from the search worker
+FILES_POLL_MS = 100  # How often Find in Files lists the results of its worker processes
+FILES_MAX_ROWS = 20000  # Matches listed by Find in Files, the count goes on past them
+
+# Clipboard
+PASTE_CHUNK_CHARS = 256 * 1024  # Larger pastes are inserted this many characters per event loop turn
+
+# Undo history
+UNDO_BUDGET_BYTES = 64 * 1024 * 1024  # Memory the undo history may take before its oldest steps are dropped
+
+# Status bar counters
+STATUS_REFRESH_MS = 16  # Refresh the status bar at most once per frame
+
+# Long-line mode, for files with lines longer than LONG_LINE_CHARS
+LONG_LINE_RECOUNT_MS = 1000  # The counters are updated once typing pauses this long instead of after every key
+
+
+class Notepad:
+    """The editor window: the text field, its menus and bars, and the document behind it.
+
+    root is the window to build the editor in, a new Tk application when None. profiler times the
+    startup phases, one starting now is made if None.
+    """
+
+    def __init__(self, root=None, profiler=None):
+        self.profiler = profiler if profiler is not None else StartupProfiler()
+
+        # File state
+        self.open_flag = False  # Tracks if a file is currently open
+        self.filepath = ''  # Stores the path of the currently opened or saved file
+
+        # Saving, a document is dirty when its version differs from the last saved one
+        self.save_job = None  # SaveJob in progress, None when idle
+        self.save_pending = False  # Another save was requested while one was running
+        self.saved_path = ''  # File the document was last loaded from or saved to
+        self.saved_fingerprint = None  # Hash of the saved file content, None if unknown
+
+        # Autosave journal of the unsaved edits, for crash recovery
+        self.journal = None  # EditJournal of the current document
+
+        # Encoding and line endings of the document, detected when loading and kept when saving
+        self.text_format = DEFAULT_FORMAT
+
+        # Watching the open file for changes made by other programs
+        self.file_watcher = None  # FileWatcher of the file the document was loaded from or saved to
+        self.watch_pending = None  # after() id of the next check of the file
+        self.reload_job = None  # ReloadJob bringing the document up to date with the file
+        self.conflict_window = None  # Prompt shown when the file changed while the document has unsaved edits
+
+        # Single-instance mode, later launches hand their file to this editor
+        self.instance_server = None  # InstanceServer listening for them
+        self.instance_requests = {}  # Request being read to after() id of its timeout
+
+        # Background file loading
+        self.loader = None  # FileLoader of the file being opened, None when idle
+
+        # Read-only large file viewer
+        self.viewer = None  # MappedFile shown in the viewer, None when editing normally
+        self.viewer_window_start = 0  # 0-based file line shown on the first line of the text field
+        self.viewer_find_offset = -1  # Byte offset of the last match found in the viewer
+
+        # Long-line mode, long lines are shown cut into pieces and the costly updates wait for typing to pause
+        self.long_lines = None  # SoftBreaks of the text field in long-line mode, None otherwise
+        self.loading_line_chars = 0  # Length of the last line loaded so far, which may go on in the next chunk
+        self.wrap_before_long_lines = None  # Text wrapping setting to restore when leaving long-line mode
+        self.recount_pending = None  # after() id of the deferred counters update
+
+        # Document model, text_field is a view kept in sync with it through the edit hook below
+        self.document = PieceTable()
+        self.saved_version = self.document.version  # Document version matching saved_path, an empty new document is clean
+
+        # Find & Replace
+        self.search_engine = SearchEngine()
+        self.highlight_search = None  # compile_pattern() arguments of "Highlight all", None when off
+        self.highlight_window = None  # (start, end, document version, capped) of the region whose matches are tagged
+        self.highlight_refresh_pending = None  # after() id of the scheduled highlight update
+        self.search_task = None  # SearchTask of the search as you type in progress
+        self.files_job = None  # Find in Files search or replace in progress
+        self.pending_position = None  # (line, column, length) selected once the file being opened is loaded
+
+        # Printing, jobs are paginated and sent to the printer on a worker thread
+        self.print_spooler = PrintSpooler()
+        self.print_poll_pending = False
+
+        # Performance overlay, built when first shown
+        self.performance_overlay = None
+        self.overlay_refresh_pending = None  # after() ids of the overlay refresh and the event loop lag probe
+        self.idle_probe_pending = None
+
+        # Dialogs built on first use
+        self.find_window = None
+        self.files_window = None
+        self.printers_window = None
+        self.printers_combobox = None
+
+        # Clipboard
+        self.paste_pending = None  # after() id of the next chunk of a large paste
+
+        # Undo history, fed by the edit hook below instead of Tk's unbounded one
+        self.undo_history = UndoManager(UNDO_BUDGET_BYTES)
+
+        # Status bar counters, kept up to date from edit deltas instead of rescanning the text
+        self.counts = TextCounts()
+        self.status_refresh_pending = None  # after() id of the scheduled status bar refresh
+        self.selection_counts = None  # Cached (selection range, characters, words) of the current selection
+
+        # Set up the main application window
+        self.root = root if root is not None else tk.Tk()
+        self.root.title('New text file | Notepad')
+        self.root.geometry('1200x600')
+        self.root.minsize(600, 300)
+        self.profiler.mark('window')
+
+        # Main menu bar setup
+        self.main_menu = tk.Menu(self.root)
+
+        # File menu: contains options for file management
+        self.file_menu = tk.Menu(self.main_menu, tearoff=0)
+        self.main_menu.add_cascade(label='File', menu=self.file_menu)
+        self.file_menu.add_command(label='Open', command=self.open_file)
+        self.file_menu.add_command(label='Open large file (read-only)', command=self.open_large_file)
+
+        # Submenu to load the current file again with another encoding
+        self.reopen_menu = tk.Menu(self.file_menu, tearoff=0)
+        self.file_menu.add_cascade(label='Reopen with encoding', menu=self.reopen_menu)
+        for encoding, encoding_name in ENCODING_NAMES.items():
+            self.reopen_menu.add_command(label=encoding_name,
+                                         command=lambda encoding=encoding: self.reopen_with_encoding(encoding))
+
+        self.file_menu.add_command(label='Save', command=self.save)
+        self.file_menu.add_command(label='Save as...', command=self.save_file_as)
+        self.file_menu.add_command(label='Print', command=self.printer)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label='Exit', command=self.exit_program)
+
+        # Edit menu: contains options for text editing actions
+        self.edit_menu = tk.Menu(self.main_menu, tearoff=0)
+        self.main_menu.add_cascade(label='Edit', menu=self.edit_menu)
+        self.edit_menu.add_command(label='Undo', command=self.undo_command)
+        self.edit_menu.add_command(label='Redo', command=self.redo_command)
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label='Cut', command=self.cut_command)
+        self.edit_menu.add_command(label='Copy', command=self.copy_command)
+        self.edit_menu.add_command(label='Paste', command=self.paste_command)
+        self.edit_menu.add_command(label='Delete', command=self.delete_command)
+        self.edit_menu.add_command(label='Select All', command=self.select_command)
+        self.edit_menu.add_command(label='Find & Replace', command=self.find_replace)
+        self.edit_menu.add_command(label='Find in Files...', command=self.find_in_files)
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label='Time and date', command=self.time_and_date)
+
+        # Right-click context menu for editing (bound to right mouse button)
+        self.main_menu_mouse = tk.Menu(self.root)
+        self.edit_menu_mouse = tk.Menu(self.main_menu_mouse, tearoff=0)
+        self.main_menu_mouse.add_cascade(label='Edit', menu=self.edit_menu_mouse)
+        self.edit_menu_mouse.add_command(label='Undo', command=self.undo_command)
+        self.edit_menu_mouse.add_command(label='Redo', command=self.redo_command)
+        self.edit_menu_mouse.add_separator()
+        self.edit_menu_mouse.add_command(label='Cut', command=self.cut_command)
+        self.edit_menu_mouse.add_command(label='Copy', command=self.copy_command)
+        self.edit_menu_mouse.add_command(label='Paste', command=self.paste_command)
+        self.edit_menu_mouse.add_command(label='Delete', command=self.delete_command)
+        self.edit_menu_mouse.add_command(label='Select All', command=self.select_command)
+        self.edit_menu_mouse.add_separator()
+        self.edit_menu_mouse.add_command(label='Time and date', command=self.time_and_date)
+
+        # View menu: controls display settings like font, wrapping, and status bar visibility
+        self.view_menu = tk.Menu(self.main_menu, tearoff=0)
+        self.main_menu.add_cascade(label='View', menu=self.view_menu)
+
+        # Font submenu for selecting font type and size
+        self.font_menu = tk.Menu(self.view_menu, tearoff=0)
+        self.view_menu.add_cascade(label='Font', menu=self.font_menu)
+
+        # Submenu for selecting font type
+        self.font_menu_type = tk.Menu(self.font_menu, tearoff=0)
+        self.font_menu.add_cascade(label='Font type', menu=self.font_menu_type)
+
+        # Populate font type submenu with font options
+        for font in fonts:
+            self.font_menu_type.add_command(label=font, command=lambda font=font: self.get_font_type(font))
+
+        # Submenu for selecting font size
+        self.font_menu_size = tk.Menu(self.font_menu, tearoff=0)
+        self.font_menu.add_cascade(label='Size', menu=self.font_menu_size)
+
+        # Populate font size submenu with size options
+        for size in sizes:
+            self.font_menu_size.add_command(label=size, command=lambda size=size: self.get_font_size(size))
+
+        # About menu with application information
+        self.about_menu = tk.Menu(self.main_menu, tearoff=0)
+        self.main_menu.add_cascade(label='About', menu=self.about_menu)
+        self.about_menu.add_command(label='About', command=self.about)
+
+        # Additional view options for option and status bars, and text wrapping
+        self.view_menu.add_separator()
+        self.hide_option_var = tk.IntVar(self.root, value=1)
+        self.view_menu.add_checkbutton(label='Option bar', onvalue=1, offvalue=0, command=self.hide, variable=self.hide_option_var)
+        self.hide_status_var = tk.IntVar(self.root, value=1)
+        self.view_menu.add_checkbutton(label='Status bar', onvalue=1, offvalue=0, command=self.hide, variable=self.hide_status_var)
+        self.wrap_var = tk.IntVar(self.root, value=1)
+        self.view_menu.add_checkbutton(label='Text wrapping', onvalue=1, offvalue=0, command=self.wrap, variable=self.wrap_var)
+
+        # Tracing of the handlers, shown as an overlay over the text field while it runs
+        self.view_menu.add_separator()
+        self.performance_var = tk.IntVar(self.root, value=0)
+        self.view_menu.add_checkbutton(label='Performance overlay', onvalue=1, offvalue=0,
+                                       command=self.toggle_performance_overlay, variable=self.performance_var)
+        self.view_menu.add_command(label='Export trace...', command=self.export_trace)
+
+        # Apply main menu to the application window
+        self.root.config(menu=self.main_menu)
+
+        self.profiler.mark('menus')
+
+        # Option bar with buttons for quick access to file and edit actions
+        self.option_bar = tk.Frame(self.root, height=50)
+        self.option_bar.pack(fill='both', anchor='n')
+
+        self.open_button = tk.Button(self.option_bar, text='📂', command=self.open_file)
+        self.open_button.pack(side='left', padx=5, pady=2, anchor='center')
+
+        self.save_button = tk.Button(self.option_bar, text='💾', command=self.save)
+        self.save_button.pack(side='left', pady=2, anchor='center')
+
+        self.printer_button = tk.Button(self.option_bar, text='🖨', command=self.printer)
+        self.printer_button.pack(side='left', padx=5, pady=2, anchor='center')
+
+        self.find_button = tk.Button(self.option_bar, text='🔍', command=self.find_replace)
+        self.find_button.pack(side='left', padx=5, pady=2, anchor='center')
+
+        self.undo_button = tk.Button(self.option_bar, text=' ↩', command=self.undo_command)
+        self.undo_button.pack(side='left', pady=2, anchor='center')
+
+        self.redo_button = tk.Button(self.option_bar, text='↪ ', command=self.redo_command)
+        self.redo_button.pack(side='left', padx=5, pady=2, anchor='center')
+
+        # Font selection combobox for font type
+        self.font_combobox_var = tk.StringVar(self.root)
+        self.font_combobox = ttk.Combobox(self.option_bar, width=20, state='readonly', textvariable=self.font_combobox_var, values=fonts)
+        self.font_combobox.set('Arial')  # Set default font
+        self.font_combobox.pack(side='left', padx=5, pady=2, anchor='center')
+        self.font_combobox_var.trace('w', self.font_type)
+
+        # Font size combobox for font size
+        self.font_size_combobox_var = tk.StringVar(self.root)
+        self.font_size_combobox = ttk.Combobox(self.option_bar, width=5, state='readonly', textvariable=self.font_size_combobox_var, values=sizes)
+        self.font_size_combobox.set('12')  # Set default size
+        self.font_size_combobox.pack(side='left', padx=5, pady=2, anchor='center')
+        self.font_size_combobox_var.trace('w', self.font_type)
+
+        self.profiler.mark('option bar')
+
+        # Status bar at the bottom to display character and line count
+        self.bottom_bar = tk.Label(self.root, height=50)
+        self.bottom_bar.pack(fill='both', anchor='s', side='bottom')
+
+        # Vertical and horizontal scrollbars for text area
+        self.vertical_scroll = ttk.Scrollbar(self.root, orient='vertical')
+        self.vertical_scroll.pack(fill='y', side='right')
+        self.horizontal_scroll = ttk.Scrollbar(self.root, orient='horizontal')
+        self.horizontal_scroll.pack(fill='x', side='bottom')
+
+        # Main text field setup
+        self.text_field = tk.Text(self.root, wrap='word', font=('Arial', 12), yscrollcommand=self.text_field_scrolled, xscrollcommand=self.horizontal_scroll.set)
+        self.text_field.pack(fill='both', expand=True)
+        self.vertical_scroll.config(command=self.text_field.yview)
+        self.horizontal_scroll.config(command=self.text_field.xview)
+        # Highlight tag configuration
+        self.text_field.tag_config('highlight', background='lightblue')  # Use light blue for selection highlight
+
+        # Route insert/delete through Python so the counters follow every edit, including undo/redo and paste
+        self.text_field_command_orig = self.text_field._w + '_orig'
+        self.root.tk.call('rename', self.text_field._w, self.text_field_command_orig)
+        self.root.tk.createcommand(self.text_field._w, self.text_field_command)
+
+        # Selection changes update the selection counts, context menu display on right click
+        self.text_field.bind('<<Selection>>', self.count_characters_func)
+        self.text_field.bind('<<Undo>>', lambda event: self.undo_command() or 'break')
+        self.text_field.bind('<<Redo>>', lambda event: self.redo_command() or 'break')
+        self.text_field.bind('<<Cut>>', lambda event: self.cut_command() or 'break')
+        self.text_field.bind('<<Copy>>', lambda event: self.copy_command() or 'break')
+        self.text_field.bind('<<Paste>>', lambda event: self.paste_command() or 'break')
+        self.root.bind('<Button-3>', self.show_menu_mouse)
+
+        # Display for character count and encoding
+        self.count_characters = tk.Label(self.bottom_bar, text='0 characters | 1 lines | 0 words')
+        self.count_characters.pack(side='left', padx=10, anchor='center')
+        self.utf_label = tk.Label(self.bottom_bar, text=format_label(self.text_format))
+        self.utf_label.pack(side='right', padx=10)
+
+        # Progress of a file being opened, only shown while loading
+        self.load_label = tk.Label(self.bottom_bar, text='')
+        self.cancel_load_button = tk.Button(self.bottom_bar, text='Cancel', command=self.cancel_loading)
+        self.root.bind('<Escape>', self.cancel_loading)
+
+        # Progress of the print jobs, only shown once something was printed
+        self.print_label = tk.Label(self.bottom_bar, text='')
+        self.cancel_print_button = tk.Button(self.bottom_bar, text='Cancel print', command=self.cancel_printing)
+
+        # The first time the text field is drawn ends the startup profile
+        self.text_field.bind('<Expose>', self.first_expose)
+        self.profiler.mark('text field and status bar')
+
+        # Closing the window goes through the unsaved changes check
+        self.root.protocol('WM_DELETE_WINDOW', self.exit_program)
+
+        # Journal the edits of the new document, recovering the ones of a crashed session if wanted
+        self.root.after_idle(self.journal_new_document)
+        self.root.after(AUTOSAVE_MS, self.autosave)
+
+    def first_expose(self, event):
+        """Ends the startup profile once the window shows up, after Tk has drawn it."""
+        self.text_field.unbind('<Expose>')
+        self.root.after_idle(self.profiler.painted)
+
+    @traced('open_file')
+    def open_file(self):
+        """Opens a file dialog to select a text file and loads its content into the text field in the background."""
+        path = askopenfilename(filetypes=[('text file', '*.txt')])
+
+        if not path:
+            return
 
-def exit_program():
-    """Opens a confirmation dialog to ask the user if they want to exit the application."""
-    exit_window = tk.Toplevel()
-    exit_window.title('Exit')
-    exit_window.geometry('200x150')
-    exit_window.resizable(False, False)
-    statement = tk.Label(exit_window, text='Are you sure?', font=('Arial', 12))
-    statement.pack(pady=(30, 0))
-    yes_button = tk.Button(exit_window, text='Yes', width=5, font=('Arial', 12), command=root.quit)
-    yes_button.pack(side='left', padx=(30, 0))
-    no_button = tk.Button(exit_window, text='No', width=5, font=('Arial', 12), command=exit_window.destroy)
-    no_button.pack(side='right', padx=(0, 30))
+        return self.load_file(path)
+
+    @traced('load_file')
+    def load_file(self, path, encoding=None):
+        """Loads a file into the editor, detecting its encoding unless one is given.
+
+        Raises OSError, with the current document left as it is, if the file can't be opened.
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+        if size >= LARGE_FILE_BYTES:
+            self.open_large_file(path)
+            return path
+
+        self.cancel_loading()
+        self.cancel_paste()
+        self.stop_watching()
+        self.close_journal(remove=not self.is_dirty())
+        self.close_viewer()
+        self.filepath = path
+        self.open_flag = False  # Only becomes True once the whole file is loaded, so a partial load is never saved over it
+
+        self.text_field.delete('1.0', 'end-1c')
+        self.start_loading(self.filepath, encoding)
+        return self.filepath
+
+    def open_path(self, path):
+        """Loads a file, reporting in the status bar instead of raising when it can't be opened."""
+        try:
+            self.load_file(path)
+        except OSError as e:
+            self.load_label.configure(text=f'Could not open {os.path.basename(path)}: {e.strerror or e}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return False
+        return True
+
+    def reopen_with_encoding(self, encoding):
+        """Loads the current file again, decoding it with the given encoding."""
+        if not self.filepath or self.viewer is not None or not os.path.exists(self.filepath):
+            return
 
+        self.load_file(self.filepath, encoding)
+
+    def set_text_format(self, new_format, mixed=False):
+        """Sets the encoding and line endings used to save the document and shows them in the status bar."""
+        self.text_format = new_format
+        self.utf_label.configure(text=format_label(self.text_format, mixed))
+
+    def start_loading(self, path, encoding=None):
+        """Starts streaming a file into the text field, showing progress in the status bar."""
+        name = os.path.basename(path)
+        self.root.title(f'{name} (loading) | Notepad')
+
+        # Chunks are not undoable and the user can't type in the middle of a load
+        self.text_field.configure(state='disabled')
+        self.undo_history.enabled = False
+        self.leave_long_line_mode()
+        self.loading_line_chars = 0
+
+        self.loader = FileLoader(path, encoding)
+        self.loader.start()
+        self.load_label.configure(text='Loading 0%')
+        self.load_label.pack(side='left', padx=10, anchor='center')
+        self.cancel_load_button.pack(side='left', anchor='center')
+        self.root.after(1, self.poll_loading)
+
+    def poll_loading(self):
+        """Moves decoded chunks from the loader into the text field, one batch per event loop turn."""
+        if self.loader is None:
+            return
 
-def font_type(*args):
-    """Applies the selected font type and size to the text field."""
-    global size
+        batch = []
+        batch_chars = 0
+        finished = None
+        position = 0
+
+        while batch_chars < LOAD_BATCH_CHARS:
+            try:
+                kind, payload, position = self.loader.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'text':
+                batch.append(payload)
+                batch_chars += len(payload)
+            elif kind == 'format':
+                self.set_text_format(payload)
+            elif kind == 'restart':
+                batch = []
+                batch_chars = 0
+                self.restart_loading(payload)
+            else:
+                finished = (kind, payload)
+                break
+
+        if batch:
+            text = ''.join(batch)
+            if self.long_lines is None:
+                longest, self.loading_line_chars = longest_line(text, self.loading_line_chars)
+                if longest > LONG_LINE_CHARS:
+                    self.enter_long_line_mode()
+            self.text_field.configure(state='normal')
+            self.text_field.insert('end-1c', text)
+            self.text_field.configure(state='disabled')
+            if self.loader.first_paint is None:
+                self.text_field.update_idletasks()
+                self.loader.first_paint = self.loader.elapsed()
+            self.load_label.configure(text=f'Loading {self.loader.progress(position)}%')
+
+        if finished is None:
+            self.root.after(1, self.poll_loading)
+        elif finished[0] == 'done':
+            if finished[1]:
+                self.set_text_format(self.text_format, mixed=True)
+            self.finish_loading()
+        else:
+            self.finish_loading(error=finished[1])
+
+    def restart_loading(self, text_format):
+        """Drops the text loaded so far, the loader decodes the file again from its start with another encoding."""
+        self.text_field.configure(state='normal')
+        self.text_field.delete('1.0', 'end-1c')
+        self.text_field.configure(state='disabled')
+        self.leave_long_line_mode()
+        self.loading_line_chars = 0
+        self.set_text_format(text_format)
+
+    def finish_loading(self, error=None, cancelled=False):
+        """Ends the current load and reports the outcome and timings in the status bar."""
+        name = os.path.basename(self.loader.path)
+        self.loader.total = self.loader.elapsed()
+        tracer.add('open_file (background)', self.loader.started, self.loader.total, self.loader.thread.ident)
+        first_paint = self.loader.first_paint if self.loader.first_paint is not None else self.loader.total
+
+        self.text_field.configure(state='normal')
+        self.undo_history.clear()
+        self.undo_history.enabled = True
+        self.cancel_load_button.pack_forget()
+
+        if error is not None:
+            self.load_label.configure(text=f'Could not open {name}: {error}')
+            self.root.title('New text file | Notepad')
+        elif cancelled:
+            self.load_label.configure(text=f'Loading cancelled, {name} is not fully loaded')
+            self.root.title(f'{name} (partial) | Notepad')
+        else:
+            self.load_label.configure(text=f'Loaded in {self.loader.total:.2f} s (first paint {first_paint * 1000:.0f} ms)')
+            self.root.title(f'{name} | Notepad')
+            self.open_flag = True
+            self.mark_saved(self.loader.path, self.document.version)
+            self.start_journal(self.loader.path)
+            self.watch_file(self.loader.path, self.loader.stamp)
+
+        self.loader = None
+        position, self.pending_position = self.pending_position, None
+        if position is not None and error is None and not cancelled:
+            self.show_position(*position)
+
+    def cancel_loading(self, event=None):
+        """Cancels the file load in progress, keeping whatever was already loaded."""
+        if self.loader is None:
+            return
 
-    type_font = font_combobox.get()
-    size = font_size_combobox.get()
-    size = int(size)
-    text_field.configure(font=(type_font, size))
+        self.loader.cancel()
+        self.finish_loading(cancelled=True)
+
+    @traced('open_large_file')
+    def open_large_file(self, path=None):
+        """Opens a file in the read-only large file viewer, which only keeps the visible lines in the text field."""
+        if path is None:
+            path = askopenfilename(filetypes=[('text file', '*.txt'), ('all files', '*')])
+            if not path:
+                return
+
+        with open(path, 'rb') as f:
+            file_format = detect_format(f.read(DETECT_BYTES))
+        if not is_ascii_compatible(file_format.encoding):
+            # The line index looks for single newline bytes
+            encoding_name = ENCODING_NAMES[file_format.encoding]
+            self.load_label.configure(text=f'{encoding_name} files can\'t be opened in the large file viewer')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
+        viewer = MappedFile(path, file_format.encoding)  # Opened before the current document is closed, it may fail
+
+        self.cancel_loading()
+        self.cancel_paste()
+        self.stop_watching()
+        self.close_journal(remove=not self.is_dirty())
+        self.close_viewer()
+        self.text_field.delete('1.0', 'end-1c')
+        self.leave_long_line_mode()
+
+        self.viewer = viewer
+        self.set_text_format(file_format)
+        self.viewer_find_offset = -1
+        self.filepath = path
+        self.open_flag = False  # The text field only holds a window of the file, it must never be saved over it
+
+        # The scrollbar follows the line index instead of the text field contents
+        self.text_field.configure(state='disabled', yscrollcommand=self.viewer_scrolled)
+        self.undo_history.enabled = False
+        self.vertical_scroll.configure(command=self.viewer_scrollbar)
+        self.show_viewer_window(0)
+
+        self.root.title(f'{os.path.basename(path)} (read-only) | Notepad')
+        self.poll_viewer_index()
+        return path
+
+    def close_viewer(self):
+        """Leaves the large file viewer and gives the text field back to normal editing."""
+        if self.viewer is None:
+            return
 
+        self.viewer.close()
+        self.viewer = None
+        self.call_text_field('configure', '-state', 'normal')
+        self.call_text_field('delete', '1.0', 'end')
+        self.document.reset()
+        self.counts.reset()
+        self.text_field.configure(yscrollcommand=self.text_field_scrolled)
+        self.undo_history.clear()
+        self.undo_history.enabled = True
+        self.vertical_scroll.configure(command=self.text_field.yview)
+
+    def viewer_visible_lines(self):
+        """Returns how many lines fit in the text field with the current font."""
+        linespace = tkfont.Font(font=self.text_field.cget('font')).metrics('linespace')
+        return max(1, self.text_field.winfo_height() // linespace)
+
+    def show_viewer_window(self, top):
+        """Fills the text field with the lines around top (0-based) and scrolls top to the first visible line."""
+        known = self.viewer.known_line_count()
+        top = max(0, min(top, known - 1))
+        start = max(0, top - VIEWER_MARGIN_LINES)
+        count = min(known - start, top - start + self.viewer_visible_lines() + VIEWER_MARGIN_LINES)
+
+        # Window contents are not edits, so they bypass the counters
+        self.viewer_window_start = start
+        self.call_text_field('configure', '-state', 'normal')
+        self.call_text_field('delete', '1.0', 'end')
+        self.call_text_field('insert', '1.0', self.viewer.read_lines(start, count))
+        self.call_text_field('configure', '-state', 'disabled')
+        self.text_field.yview(f'{top - start + 1}.0')
+
+    def viewer_scrolled(self, first, last):
+        """Moves the viewer window when the view gets close to its edges and updates the scrollbar."""
+        if self.viewer is None:
+            return
 
-def hide():
-    """Toggles visibility of the option bar and status bar based on user selection."""
-    hide_option_checked = hide_option_var.get()
-    hide_status_checked = hide_status_var.get()
-
-    # Hide/show the top option bar
-    if hide_option_checked == 0:
-        option_bar.pack_forget()
-    elif hide_option_checked == 1:
-        text_field.pack_forget()
-        vertical_scroll.pack_forget()
-        option_bar.pack(fill='x', anchor='n')
-        vertical_scroll.pack(fill='y', side='right')
-        text_field.pack(fill='both', expand=True)
+        top = int(self.text_field.index('@0,0').split('.')[0]) - 1
+        bottom = int(self.text_field.index(f'@0,{self.text_field.winfo_height()}').split('.')[0]) - 1
+        window_lines = int(self.call_text_field('index', 'end-1c').split('.')[0])
 
-    # Hide/show the bottom status bar
-    if hide_status_checked == 0:
-        bottom_bar.pack_forget()
-    elif hide_status_checked == 1:
-        text_field.pack_forget()
-        vertical_scroll.pack_forget()
-        horizontal_scroll.pack_forget()
-        bottom_bar.pack(fill='x', side='bottom')
-        vertical_scroll.pack(fill='y', side='right')
-        horizontal_scroll.pack(fill='x', side='bottom')
-        text_field.pack(fill='both', expand=True)
+        near_top = top < VIEWER_MARGIN_LINES // 2 and self.viewer_window_start > 0
+        near_bottom = (bottom > window_lines - VIEWER_MARGIN_LINES // 2
+                       and self.viewer_window_start + window_lines < self.viewer.known_line_count())
+        if near_top or near_bottom:
+            self.show_viewer_window(self.viewer_window_start + top)
+            return
 
+        total = self.viewer.estimated_line_count()
+        self.vertical_scroll.set((self.viewer_window_start + top) / total, (self.viewer_window_start + bottom + 1) / total)
 
-def show_menu_mouse(event):
-    """Displays the context menu when the user right-clicks within the text field."""
-    edit_menu_mouse.post(event.x_root, event.y_root)
-
-
-def wrap():
-    """Toggles text wrapping mode in the text field."""
-    wrap_checked = wrap_var.get()
-
-    if wrap_checked == 0:
-        text_field.configure(wrap='none')
-    elif wrap_checked == 1:
-        text_field.configure(wrap='word')
-
-
-def undo_command():
-    """Undoes the last action in the text field."""
-    text_field.edit_undo()
-
-
-def redo_command():
-    """Redoes the previously undone action in the text field."""
-    text_field.edit_redo()
-
-
-def cut_command():
-    """Cuts the selected text and copies it to the clipboard."""
-    sel_start, sel_end = text_field.tag_ranges('sel')
-    cut = text_field.get(sel_start, sel_end)
-    pyperclip.copy(cut)
-    text_field.delete(sel_start, sel_end)
-
-
-def copy_command():
-    """Copies the selected text to the clipboard."""
-    sel_start, sel_end = text_field.tag_ranges('sel')
-    cut = text_field.get(sel_start, sel_end)
-    pyperclip.copy(cut)
+    def viewer_scrollbar(self, *args):
+        """Handles scrollbar drags in the viewer by jumping to the matching line of the file."""
+        if args[0] == 'moveto':
+            self.show_viewer_window(int(float(args[1]) * self.viewer.estimated_line_count()))
+        else:
+            self.text_field.yview(*args)
 
+    def poll_viewer_index(self):
+        """Refreshes the status bar and scrollbar while the line index is being built."""
+        if self.viewer is None:
+            return
 
-def paste_command():
-    """Pastes the clipboard content at the current cursor position in the text field."""
-    text_field.insert(tk.INSERT, root.clipboard_get())
+        self.count_characters_func()
+        if self.viewer.indexed:
+            self.viewer_scrolled(*self.text_field.yview())
+        else:
+            self.root.after(VIEWER_POLL_MS, self.poll_viewer_index)
+
+    def viewer_find_next(self, search_text):
+        """Finds the next occurrence in the mapped file and shows it, returns its 0-based line or None."""
+        offset = self.viewer.find(search_text, self.viewer_find_offset + 1)
+        if offset < 0:
+            return None
+
+        line = self.viewer.offset_line(offset)
+        if line >= self.viewer.known_line_count():
+            return None  # Past the part of the file indexed so far
+        self.viewer_find_offset = offset
+
+        self.show_viewer_window(line - self.viewer_visible_lines() // 2)
+        start = f'{line - self.viewer_window_start + 1}.{self.viewer.column(line, offset)}'
+        end = f'{start}+{len(search_text)}c'
+        self.text_field.tag_remove('highlight', '1.0', 'end')
+        self.text_field.tag_add('highlight', start, end)
+        self.text_field.mark_set('insert', start)
+        self.text_field.see(start)
+        return line
+
+    @traced('save')
+    def save(self):
+        """Saves the current content to the existing file or prompts for a new file if it hasn't been saved before."""
+        if self.viewer is not None:
+            return  # The large file viewer is read-only
+
+        if self.open_flag:
+            self.start_save(self.filepath)
+        else:
+            path = asksaveasfilename(filetypes=[('text file', '*.txt')], )
+
+            if not path:
+                return
+
+            self.filepath = path
+            self.open_flag = True
+            self.start_save(self.filepath)
+            self.root.title(f'{os.path.basename(self.filepath)} | Notepad')
+
+    @traced('save_file_as')
+    def save_file_as(self):
+        """Prompts the user to save the current content to a new file."""
+        if self.viewer is not None:
+            return  # The large file viewer is read-only
+
+        path = asksaveasfilename(filetypes=[('text file', '*.txt')])
+
+        if not path:
+            return
 
+        self.filepath = path
+        self.open_flag = True
+        self.start_save(self.filepath)
+        self.root.title(f'{os.path.basename(self.filepath)} | Notepad')
+
+    def journal_new_document(self):
+        """Journals the untitled document the editor starts with, unless a file given at launch replaced it."""
+        if self.filepath or self.loader is not None or self.viewer is not None:
+            return  # The file gets its own journal once loaded
+        self.start_journal('')
+
+    def start_journal(self, path):
+        """Starts journaling the edits of the document, first offering to recover a journal left by a crash."""
+        self.close_journal(remove=not self.is_dirty())
+        # Each editor journals its untitled document apart, a new one recovers any left by a crash
+        for journal_file in untitled_journals() if not path else [journal_path(path)]:
+            if not os.path.exists(journal_file) or journal_in_use(journal_file):
+                continue  # A running editor is still writing it
+            try:
+                base, records, valid_size = read_journal(journal_file)
+            except (OSError, ValueError):
+                continue
+            # Edits only apply to the file they were made on, unless a snapshot makes them self-contained
+            if records and (base == file_signature(path) or any(record[0] == SNAPSHOT for record in records)):
+                try:
+                    journal = EditJournal(journal_file, base, append_at=valid_size)  # Locked, no other editor offers it too
+                except OSError:
+                    continue
+                self.offer_recovery(path, journal, records)
+                return
+
+        self.open_journal(journal_path(path), file_signature(path))
+
+    def open_journal(self, journal_file, base, append_at=None):
+        """Journals the edits to journal_file from now on, going on without a journal if it can't be written."""
+        try:
+            self.journal = EditJournal(journal_file, base, append_at=append_at)
+        except OSError as e:
+            self.journal = None
+            if isinstance(e, BlockingIOError):
+                self.load_label.configure(text='Unsaved changes are not journaled, another editor has this file open')
+            else:
+                self.load_label.configure(text=f'Unsaved changes are not journaled, {os.path.dirname(journal_file)} '
+                                               f'is not writable: {e.strerror or e}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+
+    def offer_recovery(self, path, journal, records):
+        """Asks the user whether to recover the unsaved edits found in a journal, opened and locked."""
+        recovery_window = tk.Toplevel(self.root)
+        recovery_window.title('Recover')
+        recovery_window.geometry('320x150')
+        recovery_window.resizable(False, False)
+        recovery_window.grab_set()  # No editing until the user decided, the edits would not be journaled
+        name = os.path.basename(path) if path else 'a new text file'
+        statement = tk.Label(recovery_window, text=f'Unsaved changes to {name}\nfrom a previous session were found.\n'
+                                                   'Recover them?', font=('Arial', 12))
+        statement.pack(pady=(20, 0))
+
+        def recover():
+            """Replays the journal on top of the loaded document and keeps journaling to it."""
+            recovery_window.destroy()
+            text = replay(records, self.document.text()).text()
+            self.undo_history.clear()
+            self.document.reset(text)
+            if self.long_lines is not None:
+                self.render_long_lines()
+            else:
+                self.call_text_field('delete', '1.0', 'end')
+                self.call_text_field('insert', '1.0', text)
+            self.counts.reset(text)
+            self.text_changed()
+            self.journal = journal
+
+        def discard():
+            """Starts a new journal, dropping the old edits."""
+            recovery_window.destroy()
+            journal.close(remove=True)
+            self.open_journal(journal_path(path), file_signature(path))
+
+        def postpone():
+            """Leaves the journal for next time, the edits of this session are not journaled."""
+            recovery_window.destroy()
+            journal.close()
+
+        recovery_window.protocol('WM_DELETE_WINDOW', postpone)
+        yes_button = tk.Button(recovery_window, text='Yes', width=5, font=('Arial', 12), command=recover)
+        yes_button.pack(side='left', padx=(50, 0))
+        no_button = tk.Button(recovery_window, text='No', width=5, font=('Arial', 12), command=discard)
+        no_button.pack(side='right', padx=(0, 50))
+
+    def watch_file(self, path, stamp=None):
+        """Starts watching the file the document matches for changes made by other programs.
+
+        stamp is the state of the file the document matches, taken when it was read or written; the
+        file is stamped now if it is None.
+        """
+        self.stop_watching()
+        self.file_watcher = FileWatcher(path, stamp if stamp is not None else stamp_file(path))
+        fd = self.file_watcher.fileno()
+        if fd is not None:
+            self.root.tk.createfilehandler(fd, tk.READABLE, self.file_events)
+        else:
+            self.schedule_file_check(WATCH_POLL_MS)
+
+    def stop_watching(self):
+        """Stops watching the file, dropping a reload in progress."""
+        if self.file_watcher is None:
+            return
+        if self.file_watcher.fileno() is not None:
+            self.root.tk.deletefilehandler(self.file_watcher.fileno())
+        self.file_watcher.close()
+        self.file_watcher = None
+        if self.watch_pending is not None:
+            self.root.after_cancel(self.watch_pending)
+            self.watch_pending = None
+        self.reload_job = None
+        if self.conflict_window is not None:
+            self.conflict_window.destroy()
+            self.conflict_window = None
+
+    def file_events(self, fd, mask):
+        """Checks the file shortly after inotify reported events about it."""
+        if self.file_watcher is not None and self.file_watcher.events():
+            self.schedule_file_check(WATCH_SETTLE_MS)
+
+    def schedule_file_check(self, delay):
+        """Checks the file after delay ms, unless a check is already scheduled."""
+        if self.watch_pending is None:
+            self.watch_pending = self.root.after(delay, self.check_file)
+
+    def check_file(self):
+        """Looks whether the file changed on disk: reloads it if the document has no unsaved edits, else asks."""
+        if self.watch_pending is not None:
+            self.root.after_cancel(self.watch_pending)
+            self.watch_pending = None
+        watcher = self.file_watcher
+        if watcher is None:
+            return
+        if watcher.fileno() is None:
+            self.schedule_file_check(WATCH_POLL_MS)
+        if self.reload_job is not None or self.save_job is not None or self.loader is not None or \
+                self.paste_pending is not None or self.conflict_window is not None:
+            self.schedule_file_check(WATCH_POLL_MS)  # Looked at again once that is done
+            return
 
-def delete_command():
-    """Deletes the selected text from the text field."""
-    sel_start, sel_end = text_field.tag_ranges('sel')
-    text_field.delete(sel_start, sel_end)
-
+        stamp = watcher.current()
+        if not watcher.differs(stamp) or stamp == watcher.failed:
+            return
+        if stamp is None:
+            watcher.stamp = None
+            self.load_label.configure(text=f'{os.path.basename(watcher.path)} was deleted or moved by another program')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+        elif self.is_dirty():
+            self.show_conflict(stamp)
+        else:
+            self.start_reload(watcher.stamp)
+
+    def start_reload(self, known):
+        """Starts reading the changed file in the background, only its new end if it grew since the known stamp."""
+        pending = self.file_watcher.pending if known is not None else b''
+        self.reload_job = ReloadJob(self.file_watcher.path, self.text_format, self.document.snapshot(), known, pending)
+        self.reload_job.start()
+        self.root.after(RELOAD_POLL_MS, self.poll_reload)
+
+    def poll_reload(self):
+        """Brings the document up to date with the file once the reload is read, editing only what changed."""
+        job = self.reload_job
+        if job is None:
+            return  # Stopped watching meanwhile
+        if not job.done.is_set():
+            self.root.after(RELOAD_POLL_MS, self.poll_reload)
+            return
 
-def select_command():
-    """Selects all the text in the text field."""
-    text_field.tag_add('sel', '1.0', 'end-1c')
+        self.reload_job = None
+        tracer.add('reload (background)', job.started, job.duration, job.thread.ident)
+        path = self.file_watcher.path
+        name = os.path.basename(path)
+        if job.error is not None:
+            # The document still matches the known stamp, so nothing the other program wrote gets skipped,
+            # but the same file content is not read again until it changes
+            self.file_watcher.failed = job.stamp
+            self.load_label.configure(text=f'Could not reload {name}: {job.error}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
+        if self.document.version != job.version:
+            self.check_file()  # Edited meanwhile, look again
+            return
 
+        if job.kind == 'append':
+            following = self.text_field.yview()[1] >= 1.0  # The end is shown, keep showing it like tail -f
+            self.undo_history.enabled = False  # Text another program wrote is not the user's to undo
+            try:
+                self.text_field.insert('end-1c', job.text)
+            finally:
+                self.undo_history.enabled = True
+            if following:
+                self.text_field.see('end')
+            status = f'{len(job.text):,} characters appended to {name} by another program'
+        elif job.kind == 'patch':
+            # One undo step, so the edits of a reload asked for in a conflict can be brought back
+            self.replace_ranges(job.replacements)
+            status = f'Reloaded {name}, changed by another program'
+
+        self.file_watcher.stamp = job.stamp
+        self.file_watcher.pending = job.pending
+        self.file_watcher.failed = None
+        self.mark_saved(path, self.document.version)
+        if job.kind != 'same':
+            # The journaled edits were made on the old file
+            self.load_label.configure(text=status)
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            self.close_journal(remove=True)
+            self.open_journal(journal_path(path), file_signature(path))
+
+    def show_conflict(self, stamp, save_path=None):
+        """Asks whether to reload the file changed by another program while the document has unsaved edits.
+
+        Keeping the document saves it to save_path right away if given.
+        """
+        if self.conflict_window is not None:
+            self.conflict_window.lift()
+            return
+        name = os.path.basename(self.file_watcher.path)
+        conflict_window = self.conflict_window = tk.Toplevel(self.root)
+        conflict_window.title('Changed on disk')
+        conflict_window.geometry('360x150')
+        conflict_window.resizable(False, False)
+        statement = tk.Label(conflict_window, text=f'{name} was changed by another program,\nbut you have unsaved changes.\n'
+                                                   'Reload it? Undo brings your changes back.', font=('Arial', 12))
+        statement.pack(pady=(20, 0))
+
+        def reload():
+            """Replaces the document with the file."""
+            conflict_window.destroy()
+            self.conflict_window = None
+            self.start_reload(None)
+
+        def keep():
+            """Keeps the document, the next save overwrites the file."""
+            conflict_window.destroy()
+            self.conflict_window = None
+            self.file_watcher.stamp = stamp
+            if save_path is not None:
+                self.start_save(save_path)
+                return
+            self.load_label.configure(text=f'Kept your changes, saving will overwrite {name}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+
+        conflict_window.protocol('WM_DELETE_WINDOW', keep)
+        reload_button = tk.Button(conflict_window, text='Reload', width=8, font=('Arial', 12), command=reload)
+        reload_button.pack(side='left', padx=(50, 0))
+        keep_button = tk.Button(conflict_window, text='Keep mine', width=8, font=('Arial', 12), command=keep)
+        keep_button.pack(side='right', padx=(0, 50))
+
+    def restart_journal(self, job):
+        """Starts a new journal for the file just saved, the old edits are on disk now."""
+        self.close_journal(remove=True)
+        self.open_journal(journal_path(job.path), file_signature(job.path))
+        if self.journal is not None and self.document.version != job.version:
+            # Edited while saving: the saved file misses those edits, so log the current text
+            self.journal.snapshot(self.document.text())
+
+    def close_journal(self, remove=False):
+        """Stops journaling, removing the journal when its edits don't need recovering."""
+        if self.journal is not None:
+            self.journal.close(remove=remove)
+            self.journal = None
+
+    def autosave(self):
+        """Periodically flushes the journal and compacts it in the background when it gets large."""
+        self.root.after(AUTOSAVE_MS, self.autosave)
+        if self.journal is None:
+            return
+        try:
+            self.journal.flush()
+            self.journal.finish_compaction()
+        except OSError as e:
+            self.close_journal()
+            self.load_label.configure(text=f'Unsaved changes are no longer journaled: {e.strerror or e}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
+        if self.journal.needs_compaction(max(JOURNAL_COMPACT_BYTES, 2 * len(self.document))):
+            self.journal.start_compaction(self.document.snapshot())
+
+    def is_dirty(self):
+        """Returns True when the document has changes that are not saved."""
+        return self.viewer is None and self.document.version != self.saved_version
+
+    def mark_saved(self, path, version, fingerprint=None):
+        """Records that a document version matches the file at path."""
+        self.saved_path = path
+        self.saved_version = version
+        self.saved_fingerprint = fingerprint
+
+    @traced('start_save')
+    def start_save(self, path):
+        """Saves a snapshot of the document on a worker thread, doing nothing if it is unchanged since the last save."""
+        if self.save_job is not None:
+            self.save_pending = True  # Save again with the latest text once the running save is done
+            return
 
-def time_and_date():
-    """Inserts the current date and time at the cursor position."""
-    now = datetime.now()
-    date_string = now.strftime("%d/%m/%Y %H:%M:%S")
-    text_field.insert(tk.INSERT, date_string)
+        if self.file_watcher is not None and path == self.file_watcher.path:
+            stamp = self.file_watcher.current()
+            if self.file_watcher.differs(stamp):
+                if stamp is not None and stamp == self.file_watcher.failed:
+                    # It could not be reloaded, so checking it again would do nothing: let the user decide
+                    self.show_conflict(stamp, save_path=path)
+                else:
+                    self.check_file()  # Changed by another program, reload it or ask instead of overwriting it
+                return
+
+        if path == self.saved_path and not self.is_dirty():
+            self.load_label.configure(text='No changes to save')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
 
+        previous = self.saved_fingerprint if path == self.saved_path else None
+        self.save_job = SaveJob(path, self.document.snapshot(), encoding=self.text_format.encoding, newline=self.text_format.newline,
+                           fsync=FSYNC_ON_SAVE, previous_fingerprint=previous, bom=self.text_format.bom)
+        self.save_job.start()
+        self.load_label.configure(text=f'Saving {os.path.basename(path)}...')
+        self.load_label.pack(side='left', padx=10, anchor='center')
+        self.root.after(SAVE_POLL_MS, self.poll_save)
+
+    def poll_save(self):
+        """Reports the outcome of the save in progress once it is done."""
+        if not self.save_job.done.is_set():
+            self.root.after(SAVE_POLL_MS, self.poll_save)
+            return
 
-def about():
-    """Displays information about the application."""
-    about_window = tk.Toplevel()
-    about_window.title('About')
-    about_window.geometry('200x180')
-    about_window.resizable(False, False)
-    about_info = tk.Label(about_window, text='Notepad\n'
-                                             'Version: 0.2 beta\n\n'
-                                             'Made by:\n'
-                                             'Kamil Seternus\n'
-                                             '2024',
-                          font=('Arial', 12))
-    about_info.pack(pady=(30, 0))
+        job = self.save_job
+        self.save_job = None
+        name = os.path.basename(job.path)
+        tracer.add('save (background)', job.started, job.duration, job.thread.ident)
+
+        if job.error is not None:
+            self.load_label.configure(text=f'Could not save {name}: {job.error}')
+        else:
+            self.mark_saved(job.path, job.version, job.fingerprint)
+            self.restart_journal(job)
+            self.watch_file(job.path, job.stamp)
+            if job.skipped:
+                self.load_label.configure(text='No changes to save')
+            else:
+                self.load_label.configure(text=f'Saved {name} in {job.duration * 1000:.0f} ms')
+
+        if self.save_pending:
+            self.save_pending = False
+            self.start_save(self.filepath)
+
+    @traced('printer')
+    def printer(self):
+        """Opens a print dialog to allow the user to select a printer and print the current content."""
+        if self.viewer is not None:
+            self.load_label.configure(text='The large file viewer can\'t print')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
 
+        try:
+            installed_printers_list = print_backend().printers()
+            default_printer = print_backend().default_printer()
+        except OSError as e:
+            self.load_label.configure(text=f'Printing is not available: {e}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
+        if not installed_printers_list:
+            self.load_label.configure(text='No printers found')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
 
-def get_font_type(font):
-    """Sets the font type in the font selection combobox."""
-    font_combobox.set(font)
+        if self.printers_window is None:
+            self.build_printers_window()
+        self.printers_combobox.configure(values=installed_printers_list)
+        # Set default printer
+        if default_printer in installed_printers_list:
+            self.printers_combobox.set(default_printer)
+        else:
+            self.printers_combobox.set(installed_printers_list[-1])
+
+        # Printing the selection is only offered when there is one
+        if self.text_field.tag_ranges('sel'):
+            self.print_selection_button.configure(state='normal')
+        else:
+            self.print_selection_var.set(0)
+            self.print_selection_button.configure(state='disabled')
+        self.printers_window.deiconify()
+        self.printers_window.lift()
+
+    def build_printers_window(self):
+        """Builds the printer selection window, which is hidden instead of destroyed when closed."""
+        self.printers_window = tk.Toplevel(self.root)
+        self.printers_window.title('Select printer')
+        self.printers_window.geometry('300x220')
+        self.printers_window.resizable(False, False)
+        self.printers_window.protocol('WM_DELETE_WINDOW', self.printers_window.withdraw)
+        title = tk.Label(self.printers_window, text='Select printer:', font=('Arial', 12))
+        title.pack(pady=(15, 0))
+
+        # Combobox to select printer
+        self.printers_combobox = ttk.Combobox(self.printers_window, width=40, state='readonly')
+        self.printers_combobox.pack(pady=(15, 0))
+
+        # What to print: the selection only and which pages, e.g. "1-3, 5", all when empty
+        options_frame = tk.Frame(self.printers_window)
+        options_frame.pack(pady=(15, 0))
+        self.print_selection_var = tk.IntVar(self.printers_window, value=0)
+        self.print_selection_button = tk.Checkbutton(options_frame, text='Selection only',
+                                                     variable=self.print_selection_var)
+        self.print_selection_button.pack(side='left')
+        tk.Label(options_frame, text='Pages:').pack(side='left', padx=(10, 0))
+        self.print_pages_entry = tk.Entry(options_frame, width=12)
+        self.print_pages_entry.pack(side='left')
+        self.print_pages_error = tk.Label(self.printers_window, text='', fg='red')
+        self.print_pages_error.pack()
+
+        print_button = tk.Button(self.printers_window, text='Print', command=self.print_in_selected)
+        print_button.pack(pady=(5, 0))
+
+    def print_layout(self):
+        """Returns the PageLayout matching the font and wrap setting of the text field."""
+        font = tkfont.Font(font=self.text_field.cget('font'))
+        pixels_per_point = self.root.winfo_fpixels('1p')
+        char_width = font.measure(PRINT_WIDTH_SAMPLE) / len(PRINT_WIDTH_SAMPLE) / pixels_per_point
+        line_height = font.metrics('linespace') / pixels_per_point
+        return page_layout(char_width, line_height, wrap=self.text_field.cget('wrap') != 'none')
+
+    @traced('print_in_selected')
+    def print_in_selected(self):
+        """Queues a print job for the printer and pages selected in the printer window."""
+        try:
+            pages = parse_page_ranges(self.print_pages_entry.get())
+        except ValueError:
+            self.print_pages_error.configure(text='Enter pages like 1-3, 5')
+            return
+        self.print_pages_error.configure(text='')
+        self.printers_window.withdraw()
+
+        start, end = 0, None
+        selection = self.text_field.tag_ranges('sel')
+        if self.print_selection_var.get() and selection:
+            start, end = self.index_to_offset(str(selection[0])), self.index_to_offset(str(selection[-1]))
+
+        # The job paginates a snapshot on the spooler thread, editing can go on meanwhile
+        name = os.path.basename(self.filepath) or 'New text file'
+        job = PrintJob(name, self.document.snapshot(), print_backend(), self.printers_combobox.get(),
+                       self.print_layout(), start, end, pages)
+        self.print_spooler.submit(job)
+        self.cancel_print_button.pack(side='left', anchor='center')
+        if not self.print_poll_pending:
+            self.print_poll_pending = True
+            self.poll_printing()
+
+    def poll_printing(self):
+        """Shows the progress of the print jobs in the status bar until they are all finished."""
+        for job in self.print_spooler.forget_finished():
+            tracer.add('print (background)', job.started, job.duration, job.thread)
+            if job.state == 'done':
+                status = f'Sent {job.name} to {job.printer} ({job.pages_printed} pages)'
+            elif job.state == 'cancelled':
+                status = f'Printing {job.name} cancelled'
+            else:
+                status = f'Could not print {job.name}: {job.error}'
+            self.print_label.configure(text=status)
+
+        active = self.print_spooler.active()
+        if not active:
+            self.print_poll_pending = False
+            self.cancel_print_button.pack_forget()
+            return
 
+        job = active[0]
+        if job.state == 'spooling':
+            status = f'Sending {job.name} to {job.printer}'
+        else:
+            status = f'Printing {job.name}: page {job.pages_done + 1}'
+        if len(active) > 1:
+            status += f', {len(active) - 1} more queued'
+        self.print_label.configure(text=status)
+        self.print_label.pack(side='left', padx=10, anchor='center')
+        self.root.after(PRINT_POLL_MS, self.poll_printing)
+
+    def cancel_printing(self):
+        """Cancels the print jobs that were not handed to the printer yet."""
+        self.print_spooler.cancel_all()
+
+    def serve_instance(self, server):
+        """Opens the files later launches hand to this editor over the server's socket."""
+        self.instance_server = server
+        self.root.tk.createfilehandler(server.fileno(), tk.READABLE, self.instance_request)
+
+    def instance_request(self, fd, mask):
+        """Starts reading the hand-off of a launch that connected, as its bytes arrive."""
+        request = self.instance_server.accept()
+        if request is None:
+            return
+        self.instance_requests[request] = self.root.after(int(HANDOFF_TIMEOUT * 1000), self.end_instance_request, request)
+        self.root.tk.createfilehandler(request, tk.READABLE, self.read_instance_request)
 
-def get_font_size(size):
-    """Sets the font size in the font selection combobox."""
-    font_size_combobox.set(size)
+    def read_instance_request(self, request, mask):
+        """Raises the window and opens the file a launch handed off, if it gave one, once it sent all of it."""
+        try:
+            path = request.read()
+        except OSError:
+            self.end_instance_request(request)
+            return
+        if path is None:
+            return  # More to come
+        self.end_instance_request(request)
+
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+        if path:
+            self.open_handed_off(path)
+
+    def open_handed_off(self, path):
+        """Opens a file handed off by a launch, asking for confirmation first if there are unsaved changes."""
+        if not self.is_dirty():
+            self.open_path(path)
+            return
 
+        open_window = tk.Toplevel(self.root)
+        open_window.title('Open')
+        open_window.geometry('320x150')
+        open_window.resizable(False, False)
+        statement = tk.Label(open_window, text=f'There are unsaved changes.\nOpen {os.path.basename(path)} anyway?',
+                             font=('Arial', 12))
+        statement.pack(pady=(30, 0))
+
+        def open_file():
+            """Drops the unsaved changes and opens the file."""
+            open_window.destroy()
+            self.open_path(path)
+
+        yes_button = tk.Button(open_window, text='Yes', width=5, font=('Arial', 12), command=open_file)
+        yes_button.pack(side='left', padx=(30, 0))
+        no_button = tk.Button(open_window, text='No', width=5, font=('Arial', 12), command=open_window.destroy)
+        no_button.pack(side='right', padx=(0, 30))
+
+    def end_instance_request(self, request):
+        """Stops reading a hand-off; a launch that didn't finish it in time starts an editor of its own."""
+        timeout = self.instance_requests.pop(request, None)
+        if timeout is None:
+            return
+        self.root.after_cancel(timeout)
+        self.root.tk.deletefilehandler(request)
+        request.close()
 
-def count_characters_func(event):
-    """Updates character and line count in the status bar."""
-    count_char = len(text_field.get('1.0', 'end'))
-    lines = text_field.get('1.0', 'end').count('\n')
-    count_characters.configure(text=f'{count_char - 1} characters | {lines} lines')
-    utf_label.configure(text='UTF-8')
+    def stop_serving(self):
+        """Stops taking files from later launches, which then start editors of their own."""
+        if self.instance_server is None:
+            return
+        for request in list(self.instance_requests):
+            self.end_instance_request(request)
+        self.root.tk.deletefilehandler(self.instance_server.fileno())
+        self.instance_server.close()
+        self.instance_server = None
+
+    def exit_program(self):
+        """Exits the application, asking for confirmation first if there are unsaved changes."""
+        if not self.is_dirty():
+            self.quit_program()
+            return
 
+        exit_window = tk.Toplevel(self.root)
+        exit_window.title('Exit')
+        exit_window.geometry('260x150')
+        exit_window.resizable(False, False)
+        statement = tk.Label(exit_window, text='There are unsaved changes.\nExit anyway?', font=('Arial', 12))
+        statement.pack(pady=(30, 0))
+        yes_button = tk.Button(exit_window, text='Yes', width=5, font=('Arial', 12), command=self.quit_program)
+        yes_button.pack(side='left', padx=(30, 0))
+        no_button = tk.Button(exit_window, text='No', width=5, font=('Arial', 12), command=exit_window.destroy)
+        no_button.pack(side='right', padx=(0, 30))
+
+    def quit_program(self):
+        """Stops the application, letting a save in progress finish first."""
+        remove = True
+        if self.save_job is not None:
+            self.save_job.thread.join()
+            remove = self.save_job.error is None  # A failed save leaves the edits to the journal
+        self.close_journal(remove=remove)
+        self.cancel_search()
+        self.cancel_files_job()
+        self.cancel_paste()
+        self.stop_watching()
+        self.stop_serving()
+        self.print_spooler.cancel_all()
+        self.print_spooler.close()
+        clipboard(self.root).keep()
+        self.root.quit()
+
+    @traced('font_type')
+    def font_type(self, *args):
+        """Applies the selected font type and size to the text field."""
+        type_font = self.font_combobox.get()
+        size = self.font_size_combobox.get()
+        size = int(size)
+        self.text_field.configure(font=(type_font, size))
+
+    def hide(self):
+        """Toggles visibility of the option bar and status bar based on user selection."""
+        hide_option_checked = self.hide_option_var.get()
+        hide_status_checked = self.hide_status_var.get()
+
+        # Hide/show the top option bar
+        if hide_option_checked == 0:
+            self.option_bar.pack_forget()
+        elif hide_option_checked == 1:
+            self.text_field.pack_forget()
+            self.vertical_scroll.pack_forget()
+            self.option_bar.pack(fill='x', anchor='n')
+            self.vertical_scroll.pack(fill='y', side='right')
+            self.text_field.pack(fill='both', expand=True)
+
+        # Hide/show the bottom status bar
+        if hide_status_checked == 0:
+            self.bottom_bar.pack_forget()
+        elif hide_status_checked == 1:
+            self.text_field.pack_forget()
+            self.vertical_scroll.pack_forget()
+            self.horizontal_scroll.pack_forget()
+            self.bottom_bar.pack(fill='x', side='bottom')
+            self.vertical_scroll.pack(fill='y', side='right')
+            self.horizontal_scroll.pack(fill='x', side='bottom')
+            self.text_field.pack(fill='both', expand=True)
+
+    def show_menu_mouse(self, event):
+        """Displays the context menu when the user right-clicks within the text field."""
+        self.edit_menu_mouse.post(event.x_root, event.y_root)
+
+    def wrap(self):
+        """Toggles text wrapping mode in the text field."""
+        wrap_checked = self.wrap_var.get()
+
+        if wrap_checked == 0:
+            self.text_field.configure(wrap='none')
+        elif wrap_checked == 1:
+            self.text_field.configure(wrap='word')
+
+    def enter_long_line_mode(self):
+        """Switches to long-line mode, for text the text field can't lay out quickly as it is.
+
+        Tk lays out a whole line whenever any of it changes or scrolls into view, which gets slow for
+        lines of many thousand characters, and slowest when wrapping words. From now on, long lines
+        inserted are shown cut into pieces by soft breaks that only exist in the text field, wrapping
+        is turned off and the counters are only updated once typing pauses. Only text inserted after
+        the switch is cut, so it must happen before the first long line reaches the text field.
+        """
+        if self.long_lines is not None:
+            return
+        self.long_lines = SoftBreaks(self.document)
+        self.wrap_before_long_lines = self.wrap_var.get()
+        self.wrap_var.set(0)
+        self.wrap()
+        self.count_characters_func()
+
+    def leave_long_line_mode(self):
+        """Leaves long-line mode once the text field is empty, restoring the wrapping setting."""
+        if self.long_lines is None:
+            return
+        self.long_lines = None
+        if self.recount_pending is not None:
+            self.root.after_cancel(self.recount_pending)
+            self.recount_pending = None
+        self.wrap_var.set(self.wrap_before_long_lines)
+        self.wrap()
+
+    def render_long_lines(self, top=0, cursor=0):
+        """Shows the whole document again in long-line mode, with the view and cursor at document offsets."""
+        self.long_lines.clear()
+        shown = self.long_lines.inserted(1, 0, self.document.text())
+        self.call_text_field('delete', '1.0', 'end')
+        self.call_text_field('insert', '1.0', shown)
+        self.call_text_field('mark', 'set', 'insert', self.offset_to_index(min(cursor, len(self.document))))
+        self.text_field.yview(self.offset_to_index(min(top, len(self.document))))
+
+    def schedule_recount(self):
+        """Updates the counters from the whole document once edits pause, in long-line mode."""
+        if self.recount_pending is not None:
+            self.root.after_cancel(self.recount_pending)
+        self.recount_pending = self.root.after(LONG_LINE_RECOUNT_MS, self.recount)
+
+    @traced('recount')
+    def recount(self):
+        """Recounts the characters, lines and words of the document."""
+        self.recount_pending = None
+        self.counts.reset(self.document.text())
+        self.count_characters_func()
+
+    def toggle_performance_overlay(self):
+        """Starts or stops tracing, with its statistics shown in the corner of the text field."""
+        if not self.performance_var.get():
+            tracer.enable(False)
+            self.root.after_cancel(self.overlay_refresh_pending)
+            self.root.after_cancel(self.idle_probe_pending)
+            self.performance_overlay.place_forget()
+            return
 
-def find_replace():
-    """Opens a window to find and replace text within the text field."""
-    # Create window
-    find_window = tk.Toplevel()
-    find_window.title('Find and Replace')
-    find_window.geometry('400x250')
-    find_window.resizable(False, False)
+        tracer.enable()
+        if self.performance_overlay is None:
+            self.performance_overlay = tk.Label(self.root, justify='left', anchor='nw', font=('Courier New', 9),
+                                                background='light yellow', relief='solid', borderwidth=1)
+        self.performance_overlay.place(in_=self.text_field, relx=1.0, x=-8, y=8, anchor='ne')
+        self.refresh_performance_overlay()
+        self.probe_idle_latency()
+
+    def refresh_performance_overlay(self):
+        """Shows the rolling percentiles of the slowest handlers in the overlay while tracing."""
+        lines = [f'{"handler":<26}{"count":>7}{"p50":>8}{"p95":>8}{"p99":>8}{"max":>8}  ms']
+        for name, count, p50, p95, p99, longest in tracer.summary()[:OVERLAY_ROWS]:
+            lines.append(f'{name[:26]:<26}{count:>7}{p50 * 1000:>8.2f}{p95 * 1000:>8.2f}{p99 * 1000:>8.2f}'
+                         f'{longest * 1000:>8.2f}')
+        self.performance_overlay.configure(text='\n'.join(lines))
+        self.overlay_refresh_pending = self.root.after(OVERLAY_REFRESH_MS, self.refresh_performance_overlay)
+
+    def probe_idle_latency(self, due=None):
+        """Records how late a timer due at perf_counter time due fires, i.e. how busy the event loop is."""
+        if due is not None:
+            tracer.add('idle latency', due, max(0.0, time.perf_counter() - due))
+        self.idle_probe_pending = self.root.after(IDLE_PROBE_MS, self.probe_idle_latency,
+                                                  time.perf_counter() + IDLE_PROBE_MS / 1000)
+
+    def export_trace(self):
+        """Saves the spans traced so far as a Chrome trace, to open in chrome://tracing or Perfetto."""
+        path = asksaveasfilename(defaultextension='.json', filetypes=[('Chrome trace', '*.json')])
+        if not path:
+            return
 
-    # Frame for the entries and buttons
-    frame = tk.Frame(find_window)
-    frame.pack(padx=10, pady=10)
+        try:
+            count = tracer.export(path)
+        except OSError as e:
+            self.load_label.configure(text=f'Could not export the trace: {e}')
+        else:
+            self.load_label.configure(text=f'Exported {count} trace events to {os.path.basename(path)}')
+        self.load_label.pack(side='left', padx=10, anchor='center')
+
+    def editable(self):
+        """Returns True when the user may edit the document, i.e. not in the read-only viewer, while a file
+        loads or while a large paste is inserted."""
+        return self.viewer is None and self.loader is None and self.paste_pending is None
+
+    def undo_command(self):
+        """Undoes the last action in the text field."""
+        if self.editable():
+            edits = self.undo_history.undo()
+            if edits:
+                self.apply_edits(edits)
+
+    def redo_command(self):
+        """Redoes the previously undone action in the text field."""
+        if self.editable():
+            edits = self.undo_history.redo()
+            if edits:
+                self.apply_edits(edits)
+
+    def apply_edits(self, edits):
+        """Applies (offset, length, text) edits from the undo history without recording them, and shows the last one."""
+        self.undo_history.enabled = False
+        try:
+            replacements = as_replacements(edits)
+            if replacements is not None and len(replacements) > 1:
+                self.replace_ranges(replacements)  # E.g. undoing a Replace All, in one pass
+            else:
+                for offset, length, text in edits:
+                    self.text_field.replace(self.offset_to_index(offset), self.offset_to_index(offset + length), text)
+        finally:
+            self.undo_history.enabled = True
+
+        offset, _, text = edits[-1]
+        self.text_field.mark_set('insert', self.offset_to_index(offset + len(text)))
+        self.text_field.see('insert')
+
+    def selected_text(self):
+        """Returns the start and end indices and the text of the selection, None if nothing is selected."""
+        selection = self.text_field.tag_ranges('sel')
+        if not selection:
+            return None
+        start, end = str(selection[0]), str(selection[-1])
+        if self.viewer is not None:
+            return start, end, self.text_field.get(start, end)
+        # From the document, which is faster for large selections and has no soft breaks of long-line mode
+        return start, end, self.document.get(self.index_to_offset(start), self.index_to_offset(end))
+
+    def cut_command(self):
+        """Cuts the selected text and copies it to the clipboard."""
+        selected = self.selected_text()
+        if selected is None:
+            return
+        start, end, text = selected
+        if self.copy_to_clipboard(text) and self.editable():
+            self.text_field.delete(start, end)
+
+    def copy_command(self):
+        """Copies the selected text to the clipboard."""
+        selected = self.selected_text()
+        if selected is not None:
+            self.copy_to_clipboard(selected[2])
+
+    def paste_command(self):
+        """Pastes the clipboard content at the current cursor position in the text field.
+
+        Large texts are inserted PASTE_CHUNK_CHARS at a time, one chunk per event loop turn so the
+        editor keeps drawing, and the whole paste is a single undo step.
+        """
+        if not self.editable():
+            return
+        try:
+            text = clipboard(self.root).paste()
+        except OSError as e:
+            self.load_label.configure(text=f'Could not paste: {e}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return
 
-    # Variable to hold the found indices and the current index
-    found_indices = []
-    current_index = -1  # Start at -1 for the first "Find Next" call
-    last_search_text = ""
+        self.undo_history.begin_group()
+        selection = self.text_field.tag_ranges('sel')
+        if selection and self.root.tk.call('tk', 'windowingsystem') != 'x11':
+            self.text_field.delete(selection[0], selection[-1])  # Pasting replaces the selection, as in Tk outside X11
+        if len(text) <= PASTE_CHUNK_CHARS:
+            self.text_field.insert(tk.INSERT, text)
+            self.undo_history.end_group()
+            self.text_field.see(tk.INSERT)
+            return
 
-    # Create a tag for highlighting found text
-    text_field.tag_configure('highlight', foreground='blue', background='light blue')  # Example style
+        # The mark moves past each chunk inserted at it; the user can't edit until the paste is done,
+        # the disabled text field drops key presses and editable() refuses the menu actions
+        self.text_field.mark_set('paste_end', tk.INSERT)
+        self.text_field.configure(state='disabled')
+        self.paste_next(text, 0)
+
+    def paste_next(self, text, done):
+        """Inserts the next chunk of a large paste."""
+        chunk = text[done:done + PASTE_CHUNK_CHARS]
+        self.text_field.configure(state='normal')
+        self.text_field.insert('paste_end', chunk)
+        self.text_field.configure(state='disabled')
+        done += len(chunk)
+
+        if done < len(text):
+            self.load_label.configure(text=f'Pasting {done * 100 // len(text)}%')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            self.paste_pending = self.root.after(1, self.paste_next, text, done)
+        else:
+            self.paste_pending = None
+            self.finish_paste()
+            self.load_label.configure(text=f'Pasted {len(text):,} characters')
+
+    def finish_paste(self):
+        """Ends a large paste, making it one undo step and moving the cursor after it."""
+        self.text_field.configure(state='normal')
+        self.undo_history.end_group()
+        self.text_field.mark_set('insert', 'paste_end')
+        self.text_field.mark_unset('paste_end')
+        self.text_field.see('insert')
+
+    def cancel_paste(self):
+        """Stops a large paste in progress, keeping what was already pasted."""
+        if self.paste_pending is None:
+            return
+        self.root.after_cancel(self.paste_pending)
+        self.paste_pending = None
+        self.finish_paste()
+        self.load_label.configure(text='Paste stopped')
 
-    def update_count_label():
-        """Updates the count of found occurrences."""
-        count_label.config(text=f'Occurrences: {len(found_indices)}')
+    def copy_to_clipboard(self, text):
+        """Puts text on the clipboard, returns False and tells the user if that failed."""
+        try:
+            clipboard(self.root).copy(text)
+        except OSError as e:
+            self.load_label.configure(text=f'Could not copy: {e}')
+            self.load_label.pack(side='left', padx=10, anchor='center')
+            return False
+        return True
+
+    def delete_command(self):
+        """Deletes the selected text from the text field."""
+        selection = self.text_field.tag_ranges('sel')
+        if selection and self.editable():
+            self.text_field.delete(selection[0], selection[-1])
+
+    def select_command(self):
+        """Selects all the text in the text field."""
+        self.text_field.tag_add('sel', '1.0', 'end-1c')
+
+    def time_and_date(self):
+        """Inserts the current date and time at the cursor position."""
+        if not self.editable():
+            return
+        now = datetime.now()
+        date_string = now.strftime("%d/%m/%Y %H:%M:%S")
+        self.text_field.insert(tk.INSERT, date_string)
+
+    def about(self):
+        """Displays information about the application."""
+        about_window = tk.Toplevel(self.root)
+        about_window.title('About')
+        about_window.geometry('200x180')
+        about_window.resizable(False, False)
+        about_info = tk.Label(about_window, text='Notepad\n'
+                                                 'Version: 0.2 beta\n\n'
+                                                 'Made by:\n'
+                                                 'Kamil Seternus\n'
+                                                 '2024',
+                              font=('Arial', 12))
+        about_info.pack(pady=(30, 0))
+
+    def get_font_type(self, font):
+        """Sets the font type in the font selection combobox."""
+        self.font_combobox.set(font)
+
+    def get_font_size(self, size):
+        """Sets the font size in the font selection combobox."""
+        self.font_size_combobox.set(size)
+
+    @traced('count_characters_func')
+    def count_characters_func(self, event=None):
+        """Schedules a status bar refresh, merging bursts of edits into one update per frame."""
+        if self.status_refresh_pending is None:
+            self.status_refresh_pending = self.root.after(STATUS_REFRESH_MS, self.refresh_status_bar)
+
+    @traced('refresh_status_bar')
+    def refresh_status_bar(self):
+        """Updates character, line, word and selection counts in the status bar."""
+        self.status_refresh_pending = None
+
+        if self.viewer is not None:
+            status = f'{self.viewer.size:,} bytes | {self.viewer.estimated_line_count():,} lines | read-only'
+            if not self.viewer.indexed:
+                status += f' | indexing {self.viewer.indexed_bytes * 100 // max(1, self.viewer.size)}%'
+            self.count_characters.configure(text=status)
+            return
 
-    def clear_highlights():
-        """Removes all current highlights."""
-        text_field.tag_remove('highlight', '1.0', 'end')
+        status = f'{self.counts.characters} characters | {self.counts.lines} lines | {self.counts.words} words'
+        if self.long_lines is not None:
+            status += ' | long lines' + (', counting' if self.recount_pending is not None else '')
+        status += f' | undo {format_size(self.undo_history.size)}'
+
+        selection = self.text_field.tag_ranges('sel')
+        if selection:
+            key = (str(selection[0]), str(selection[-1]))
+            # Only rescan the selection when it actually moved or the text changed
+            if self.selection_counts is None or self.selection_counts[0] != key:
+                selected = self.document.get(self.index_to_offset(str(selection[0])), self.index_to_offset(str(selection[-1])))
+                self.selection_counts = (key, len(selected), count_words(selected))
+            status += f' | {self.selection_counts[1]} selected ({self.selection_counts[2]} words)'
+
+        self.count_characters.configure(text=status)
+
+    def call_text_field(self, *args):
+        """Calls the original Tk text widget command, bypassing the edit tracking."""
+        return self.root.tk.call((self.text_field_command_orig,) + args)
+
+    def text_field_end(self):
+        """Returns the index of the last editable position of the text field."""
+        return self.call_text_field('index', 'end-1c')
+
+    def clamp_to_end(self, index):
+        """Clamps index to the last editable position, mirroring what Tk does for insert/delete."""
+        end = self.text_field_end()
+        if self.root.tk.getboolean(self.call_text_field('compare', index, '>', end)):
+            return end
+        return index
+
+    def index_to_offset(self, index):
+        """Converts a resolved Tk index ('line.column') to a document offset."""
+        line, column = index.split('.')
+        if self.long_lines is not None:
+            return self.long_lines.to_offset(int(line), int(column))
+        return self.document.index_to_offset(int(line), int(column))
+
+    def offset_to_index(self, offset):
+        """Converts a document offset to a Tk index."""
+        if self.long_lines is not None:
+            line, column = self.long_lines.to_index(offset)
+        else:
+            line, column = self.document.offset_to_index(offset)
+        return f'{line}.{column}'
+
+    def tracked_insert(self, index, *chars_and_tags):
+        """Inserts text into the text field and mirrors it into the document."""
+        chars = ''.join(chars_and_tags[0::2])
+        index = self.clamp_to_end(self.call_text_field('index', index))
+        offset = self.index_to_offset(index)
+        if self.long_lines is not None:
+            shown = self.long_lines.inserted(int(index.split('.')[0]), offset, chars)
+            if shown != chars:
+                chars_and_tags = (shown,) + chars_and_tags[1:2]
+
+        result = self.call_text_field('insert', index, *chars_and_tags)
+        self.edited(offset, 0, chars)
+        return result
+
+    def tracked_delete(self, index1, index2=None, *more_ranges):
+        """Deletes text from the text field and mirrors it into the document."""
+        if more_ranges and self.long_lines is not None:
+            # Back to front, so the ranges still to delete keep their indices
+            ranges = (index1, index2) + more_ranges
+            for i in reversed(range(0, len(ranges), 2)):
+                self.tracked_delete(*ranges[i:i + 2])
+            return ''
+        if more_ranges:
+            # Multi-range deletes are rare, just resync after them
+            result = self.call_text_field('delete', index1, index2, *more_ranges)
+            self.resync_document()
+            return result
+
+        start = self.clamp_to_end(self.call_text_field('index', index1))
+        end = self.clamp_to_end(self.call_text_field('index', index2 if index2 is not None else f'{start}+1c'))
+        if not self.root.tk.getboolean(self.call_text_field('compare', start, '<', end)):
+            return ''
+        offset = self.index_to_offset(start)
+        end_offset = self.index_to_offset(end)
+        if self.long_lines is not None:
+            if offset == end_offset:
+                # Only soft breaks, delete the character next to them as Backspace or Delete meant to
+                if self.root.tk.getboolean(self.call_text_field('compare', end, '==', 'insert')) and offset > 0:
+                    offset -= 1
+                    start = self.offset_to_index(offset)
+                elif end_offset < len(self.document):
+                    end_offset += 1
+                    end = self.offset_to_index(end_offset)
+                else:
+                    return ''
+            self.long_lines.deleted(int(start.split('.')[0]), int(end.split('.')[0]), offset, end_offset)
+
+        result = self.call_text_field('delete', start, end)
+        self.edited(offset, end_offset - offset, '')
+        return result
+
+    def tracked_replace(self, index1, index2, *chars_and_tags):
+        """Replaces a range of the text field and mirrors it into the document."""
+        chars = ''.join(chars_and_tags[0::2])
+        start = self.clamp_to_end(self.call_text_field('index', index1))
+        end = self.clamp_to_end(self.call_text_field('index', index2))
+        offset = self.index_to_offset(start)
+        removed = max(0, self.index_to_offset(end) - offset)
+        if self.long_lines is not None:
+            self.long_lines.deleted(int(start.split('.')[0]), int(end.split('.')[0]), offset, offset + removed)
+            shown = self.long_lines.inserted(int(start.split('.')[0]), offset, chars)
+            if shown != chars:
+                chars_and_tags = (shown,) + chars_and_tags[1:2]
+
+        result = self.call_text_field('replace', start, end, *chars_and_tags)
+        self.edited(offset, removed, chars)
+        return result
+
+    def text_changed(self):
+        """Invalidates the cached selection counts and schedules status bar and highlight refreshes after an edit."""
+        self.selection_counts = None
+        self.count_characters_func()
+        self.schedule_highlight_refresh()
+
+    @traced('edited')
+    def edited(self, offset, removed, inserted):
+        """Applies an edit to the document, updates the counters from the lines around it and schedules a refresh."""
+        self.text_changed()
+
+        if self.undo_history.enabled:
+            self.undo_history.record(offset, self.document.get(offset, offset + removed) if removed else '', inserted)
+
+        if self.journal is not None and self.loader is None:  # Loaded text is in the file already
+            if removed:
+                self.journal.delete(offset, removed)
+            if inserted:
+                self.journal.insert(offset, inserted)
+
+        if removed == len(self.document):
+            # Whole document replaced, e.g. when opening a file
+            self.document.reset(inserted)
+            self.counts.reset(inserted)
+            return
 
-    def highlight_next_occurrence():
-        """Selects the next occurrence of the found text in the main text field."""
-        nonlocal current_index, last_search_text
-        search_text = find_entry.get()
+        if self.long_lines is not None:
+            # The lines around an edit may be megabytes long, count the whole text once typing pauses instead
+            self.document.replace(offset, removed, inserted)
+            self.schedule_recount()
+            return
 
-        # Reset if new search text is different from the last search
-        if search_text != last_search_text:
-            clear_highlights()  # Clear previous highlights
-            found_indices.clear()
-            current_index = -1
-            last_search_text = search_text
+        first, _ = self.document.offset_to_index(offset)
+        last, _ = self.document.offset_to_index(offset + removed)
+        line_start = self.document.line_start(first)
+        before = self.document.get(line_start, self.document.line_end(last))
+
+        self.document.replace(offset, removed, inserted)
+
+        last, _ = self.document.offset_to_index(offset + len(inserted))
+        after = self.document.get(line_start, self.document.line_end(last))
+        self.counts.replace(before, after)
+
+    def resync_document(self):
+        """Reloads the document from the text field, for edits that can't be mirrored piece by piece."""
+        content = self.call_text_field('get', '1.0', 'end-1c')
+        self.document.reset(content)
+        self.counts.reset(content)
+        self.text_changed()
+        if self.journal is not None:
+            self.journal.snapshot(content)
+
+    def text_field_command(self, operation, *args):
+        """Dispatches text_field widget commands, tracking the ones that modify the text."""
+        if operation in ('insert', 'delete', 'replace') and str(self.call_text_field('cget', '-state')) == 'disabled':
+            # Tk ignores edits of a disabled text field, but its key bindings and our menu actions still
+            # send them: mirroring them would change a document the text field doesn't show
+            return ''
+        if operation == 'insert':
+            return self.tracked_insert(*args)
+        if operation == 'delete':
+            return self.tracked_delete(*args)
+        if operation == 'replace':
+            return self.tracked_replace(*args)
+        return self.call_text_field(operation, *args)
+
+    def tag_ranges(self, tag, ranges):
+        """Adds a tag to (start, end) document offset ranges, batching them into few Tcl calls."""
+        for batch_start in range(0, len(ranges), TAG_BATCH_RANGES):
+            indices = []
+            for start, end in ranges[batch_start:batch_start + TAG_BATCH_RANGES]:
+                indices.append(self.offset_to_index(start))
+                indices.append(self.offset_to_index(end))
+            self.text_field.tag_add(tag, *indices)
+
+    def text_field_scrolled(self, first, last):
+        """yscrollcommand of the text field: moves the scrollbar and follows the view with the highlights."""
+        self.vertical_scroll.set(first, last)
+        self.schedule_highlight_refresh()
+
+    def set_highlight_all(self, search):
+        """Highlights the matches of search, compile_pattern() arguments, around the view; None turns it off.
+
+        Raises re.error for an invalid pattern.
+        """
+        if search is not None:
+            compile_pattern(*search)
+        if search == self.highlight_search:
+            return
+        self.text_field.tag_remove('match', '1.0', 'end')
+        self.highlight_search = search
+        self.highlight_window = None
+        self.refresh_highlights()
+
+    def schedule_highlight_refresh(self):
+        """Updates the highlights once the pending scrolls and edits are done."""
+        if self.highlight_search is not None and self.highlight_refresh_pending is None:
+            self.highlight_refresh_pending = self.root.after_idle(self.refresh_highlights)
+
+    def highlight_region(self):
+        """Returns the start and end offsets of the visible text plus the highlight margins, and the
+        (start, end) offsets of the visible text."""
+        top = self.text_field.index('@0,0')
+        bottom = self.text_field.index(f'@{self.text_field.winfo_width()},{self.text_field.winfo_height()}')
+        first_line = max(1, int(top.split('.')[0]) - HIGHLIGHT_MARGIN_LINES)
+        last_line = int(bottom.split('.')[0]) + HIGHLIGHT_MARGIN_LINES
+        first = self.index_to_offset(f'{first_line}.0')
+        last = self.index_to_offset(self.text_field.index(f'{last_line}.end'))
+        visible = self.index_to_offset(top), self.index_to_offset(bottom) + 1  # bottom is the last character shown
+        start = max(first, visible[0] - HIGHLIGHT_MARGIN_CHARS)
+        end = min(last, visible[1] + HIGHLIGHT_MARGIN_CHARS)
+        return start, end, visible
+
+    def untag_region(self, tag, start, end):
+        """Removes a tag between two document offsets."""
+        if start < end:
+            self.text_field.tag_remove(tag, self.offset_to_index(start), self.offset_to_index(end))
+
+    def tag_region(self, tag, start, end, visible):
+        """Tags the "Highlight all" matches between two document offsets, the visible ones first.
+
+        The visible part and the parts above and below it each get HIGHLIGHT_MAX_MATCHES, so dense
+        matches in a margin never use up the ones on screen. Returns True if a part had more matches.
+        """
+        parts = [(max(start, visible[0]), min(end, visible[1])),
+                 (start, min(end, visible[0])),
+                 (max(start, visible[1]), end)]
+        capped = False
+        for part_start, part_end in parts:
+            if part_start < part_end:
+                ranges = find_between(self.document, part_start, part_end, *self.highlight_search,
+                                      limit=HIGHLIGHT_MAX_MATCHES)
+                self.tag_ranges(tag, ranges)
+                capped = capped or len(ranges) >= HIGHLIGHT_MAX_MATCHES
+        return capped
+
+    @traced('refresh_highlights')
+    def refresh_highlights(self):
+        """Tags the matches around the view and untags the ones that left it.
+
+        While the text is unchanged only the regions entering and leaving the margins are searched and
+        untagged, so scrolling costs what it uncovers. After an edit the tags moved with the text but
+        the matches may have changed, so the whole region is searched again, and so it is when a part of
+        it had more matches than tagged, which may scroll into view. Either way the tags in the text
+        field stay bounded by the region, whatever the number of matches in the document.
+        """
+        self.highlight_refresh_pending = None
+        if self.highlight_search is None or self.viewer is not None:
+            return
 
-        # Clear previous highlights if no search text is provided
-        if not search_text:
-            update_count_label()
+        start, end, visible = self.highlight_region()
+        version = self.document.version
+        if self.highlight_window is None or self.highlight_window[2] != version or self.highlight_window[3]:
+            self.text_field.tag_remove('match', '1.0', 'end')
+            capped = self.tag_region('match', start, end, visible)
+        else:
+            old_start, old_end, _, _ = self.highlight_window
+            if end <= old_start or start >= old_end:
+                self.untag_region('match', old_start, old_end)
+                capped = self.tag_region('match', start, end, visible)
+            else:
+                self.untag_region('match', old_start, start)
+                self.untag_region('match', end, old_end)
+                capped = self.tag_region('match', start, old_start, visible)
+                capped = self.tag_region('match', old_end, end, visible) or capped
+        self.highlight_window = (start, end, version, capped)
+
+    def replace_ranges(self, replacements):
+        """Replaces sorted (start, end, text) ranges of the text searched by search_engine as one undo step.
+
+        Only the changed ranges are edited, back to front so the indices of the ranges still to do stay
+        valid, which keeps the cursor, the view and the rest of the layout in place.
+        """
+        if not replacements:
             return
 
+        text = self.search_engine.text(self.document)
+        self.call_text_field('mark', 'set', 'replace_top', '@0,0')
+        top = self.index_to_offset(self.call_text_field('index', '@0,0'))
+        cursor = self.index_to_offset(self.call_text_field('index', 'insert'))
+        self.undo_history.begin_group()
+
+        # The widget is edited directly, the document and counters are updated in one pass below
+        for start, end, new in reversed(replacements):
+            self.undo_history.record(start, text[start:end], new)
+            if self.long_lines is not None:
+                continue  # Shown again from the document below, the soft breaks move with the text
+            start_index, end_index = self.search_engine.index(start), self.search_engine.index(end)
+            if new:
+                self.call_text_field('replace', start_index, end_index, new)
+            else:
+                self.call_text_field('delete', start_index, end_index)
+
+        self.undo_history.end_group()
+        self.text_field.yview('replace_top')
+        self.call_text_field('mark', 'unset', 'replace_top')
+
+        if self.long_lines is not None:
+            self.document.replace_many(replacements)
+            self.render_long_lines(top, cursor)
+            self.schedule_recount()
+        elif dense_replacements(replacements, len(text)):
+            # Counting the new text once is cheaper than counting the words around every match
+            new_text = replaced_text(text, replacements)
+            self.counts.reset(new_text)
+            self.document.reset(new_text)
+        else:
+            self.counts.replace_ranges(text, replacements)
+            self.document.replace_many(replacements)
+        self.text_changed()
+
+        if self.journal is not None:
+            for start, end, new in reversed(replacements):
+                self.journal.delete(start, end - start)
+                self.journal.insert(start, new)
+
+    def cancel_search(self):
+        """Stops the search as you type in progress, if any."""
+        if self.search_task is not None:
+            self.search_task.cancel()
+            self.search_task = None
+
+    @traced('show_match')
+    def show_match(self, matches, index):
+        """Highlights, selects and scrolls to one of the matches of a search over the current document."""
         # Remove previous selection if one exists
-        if found_indices and current_index >= 0:
-            start, end = found_indices[current_index]
-            text_field.tag_remove('highlight', start, end)  # Remove previous highlight
-
-        # Search for occurrences if the list is empty
-        if not found_indices:
-            start_index = '1.0'
-            while True:
-                start_index = text_field.search(search_text, start_index, stopindex='end')
-                if not start_index:
-                    break
-                end_index = f"{start_index}+{len(search_text)}c"
-                found_indices.append((start_index, end_index))
-                start_index = end_index
-
-            update_count_label()  # Update count after search
-
-        # Update index to highlight the next occurrence
-        if found_indices:
-            current_index = (current_index + 1) % len(found_indices)  # Wrap around
-            start, end = found_indices[current_index]
-            text_field.tag_add('highlight', start, end)  # Highlight the found occurrence
-            text_field.mark_set('insert', start)  # Set cursor to start of found text
-            text_field.see(start)  # Scroll to the highlighted occurrence
-
-            # Optionally create a selection-like effect
-            text_field.tag_add('sel', start, end)  # This creates a selection
-
-    def replace_selection():
-        """Replaces the currently selected text with the input from the replace entry."""
-        try:
-            sel_start = text_field.index(tk.SEL_FIRST)  # Get the start of the selection
-            sel_end = text_field.index(tk.SEL_LAST)  # Get the end of the selection
-            text_field.delete(sel_start, sel_end)  # Delete the selected text
-            text_field.insert(sel_start, replace_entry.get())  # Insert the new text
+        self.text_field.tag_remove('highlight', '1.0', 'end')
+        if not matches:
+            return
 
-            # Reset found indices and current index
-            found_indices.clear()
+        start, end = (self.offset_to_index(offset) for offset in matches[index])
+        self.text_field.tag_add('highlight', start, end)  # Highlight the found occurrence
+        self.text_field.mark_set('insert', start)  # Set cursor to start of found text
+        self.text_field.see(start)  # Scroll to the highlighted occurrence
+
+        # Optionally create a selection-like effect
+        self.text_field.tag_remove('sel', '1.0', 'end')
+        self.text_field.tag_add('sel', start, end)  # This creates a selection
+
+    @traced('replace_all_matches')
+    def replace_all_matches(self, search_text, replace_text, regex=False, ignore_case=False, whole_word=False):
+        """Replaces every match of a search as one undo step and returns how many were replaced.
+
+        Raises re.error if the pattern or, for a regex, the group references of the replacement are invalid.
+        """
+        if regex:
+            # Group references in the replacement need the match objects
+            text = self.search_engine.text(self.document)
+            pattern = compile_pattern(search_text, regex, ignore_case, whole_word)
+            replacements = [(match.start(), match.end(), match.expand(replace_text))
+                            for match in pattern.finditer(text) if match.end() > match.start()]
+        else:
+            matches = self.search_engine.find_all(self.document, search_text, regex, ignore_case, whole_word)
+            replacements = [(start, end, replace_text) for start, end in zip(matches.starts, matches.ends)]
+
+        self.replace_ranges(replacements)
+        return len(replacements)
+
+    def find_replace(self):
+        """Opens a window to find and replace text within the text field."""
+        if self.find_window is None:
+            self.build_find_window()
+        self.find_window.deiconify()
+        self.find_window.lift()
+
+    def build_find_window(self):
+        """Builds the Find and Replace window, which is hidden instead of destroyed when closed."""
+        # Create window
+        find_window = self.find_window = tk.Toplevel(self.root)
+        find_window.title('Find and Replace')
+        find_window.geometry('400x300')
+        find_window.resizable(False, False)
+        find_window.protocol('WM_DELETE_WINDOW', find_window.withdraw)
+
+        # Frame for the entries and buttons
+        frame = tk.Frame(find_window)
+        frame.pack(padx=10, pady=10)
+
+        # The current match and the search it belongs to, matches themselves are cached by search_engine
+        current_index = -1  # Start at -1 for the first "Find Next" call
+        last_search = None
+        search_typed_pending = None  # after() id of the debounced search as you type
+
+        # Create tags for highlighting the current match and all the other ones
+        self.text_field.tag_configure('highlight', foreground='blue', background='light blue')  # Example style
+        self.text_field.tag_configure('match', background='light yellow')
+
+        def update_count_label(count):
+            """Updates the count of found occurrences."""
+            count_label.config(text=f'Occurrences: {count}')
+
+        def clear_highlights():
+            """Removes all current highlights."""
+            self.text_field.tag_remove('highlight', '1.0', 'end')
+            self.set_highlight_all(None)
+
+        def search_options():
+            """Returns the search options selected in the window."""
+            return {
+                'regex': bool(regex_var.get()),
+                'ignore_case': not match_case_var.get(),
+                'whole_word': bool(whole_word_var.get()),
+            }
+
+        def find_matches():
+            """Returns the matches of the search text, or None if the pattern is invalid."""
+            try:
+                return self.search_engine.find_all(self.document, find_entry.get(), **search_options())
+            except re.error as e:
+                count_label.config(text=f'Invalid pattern: {e}')
+                return None
+
+        def highlight_all():
+            """Hands the search to the viewport highlighting when "Highlight all" is checked."""
+            if not highlight_all_var.get() or last_search is None or not last_search[0] or self.viewer is not None:
+                self.set_highlight_all(None)
+                return
+            search_text, options = last_search[0], dict(last_search[1])
+            try:
+                self.set_highlight_all((search_text, options['regex'], options['ignore_case'], options['whole_word']))
+            except re.error as e:
+                count_label.config(text=f'Invalid pattern: {e}')
+
+        @traced('find.toggle_highlight_all')
+        def toggle_highlight_all():
+            """Applies or removes the highlighting of all matches."""
+            highlight_all()
+
+        def stop_search_as_you_type():
+            """Drops the pending and running search as you type."""
+            nonlocal search_typed_pending
+
+            self.cancel_search()
+            if search_typed_pending is not None:
+                self.root.after_cancel(search_typed_pending)
+                search_typed_pending = None
+
+        def search_typed(*args):
+            """Restarts the search as you type once typing pauses."""
+            nonlocal search_typed_pending
+
+            stop_search_as_you_type()
+            search_typed_pending = self.root.after(SEARCH_DEBOUNCE_MS, search_as_you_type)
+
+        @traced('find.search_as_you_type')
+        def search_as_you_type():
+            """Starts searching for the typed text on a worker thread, from the cursor on."""
+            nonlocal search_typed_pending, current_index, last_search
+            search_typed_pending = None
+            if self.viewer is not None:
+                return  # The large file viewer only searches on Find Next
+
+            search_text = find_entry.get()
+            options = search_options()
+            search = (search_text, tuple(options.items()))
+            if search != last_search:
+                clear_highlights()
+                current_index = -1
+                last_search = search
+            if not search_text:
+                update_count_label(0)
+                return
+
+            try:
+                compile_pattern(search_text, **options)
+            except re.error as e:
+                count_label.config(text=f'Invalid pattern: {e}')
+                return
+
+            origin = self.index_to_offset(self.text_field.index('insert'))
+            self.search_task = SearchTask(self.document.snapshot(), search_text, origin=origin, **options)
+            self.search_task.start()
+            poll_search(self.search_task, False)
+
+        def poll_search(task, shown):
+            """Shows the first match of a running search as soon as it is found and counts the others as they come."""
+            nonlocal current_index
+
+            if task is not self.search_task:
+                return  # Cancelled or superseded by a newer search
+            if task.version != self.document.version:
+                self.cancel_search()  # The text changed under the search, Find Next searches again
+                return
+
+            finished = task.finished()
+            matches = task.matches()
+            if not shown and (task.first is not None or (finished and matches)):
+                current_index = task.first if task.first is not None else 0  # Wrap around past the cursor
+                self.show_match(matches, current_index)
+                shown = True
+            if not finished:
+                count_label.config(text=f'Occurrences: {len(matches)}...')
+                self.root.after(SEARCH_POLL_MS, poll_search, task, shown)
+                return
+
+            self.search_task = None
+            tracer.add('search (background)', task.started, task.duration, task.thread.ident)
+            self.search_engine.adopt(task)  # Find Next goes on from these matches without scanning again
+            update_count_label(len(matches))
+            highlight_all()
+
+        @traced('find.find_next')
+        def highlight_next_occurrence():
+            """Selects the next occurrence of the found text in the main text field."""
+            nonlocal current_index, last_search
+            stop_search_as_you_type()
+            search_text = find_entry.get()
+            search = (search_text, tuple(search_options().items()))
+
+            # Reset if the search text or options are different from the last search
+            if search != last_search:
+                clear_highlights()  # Clear previous highlights
+                current_index = -1
+                last_search = search
+
+            # Clear previous highlights if no search text is provided
+            if not search_text:
+                update_count_label(0)
+                return
+
+            # The large file viewer searches the mapped file instead of the text field
+            if self.viewer is not None:
+                line = self.viewer_find_next(search_text)
+                count_label.config(text=f'Found on line {line + 1}' if line is not None else 'Not found')
+                return
+
+            # One scan gives the matches, their count and the highlights, until the text changes
+            matches = find_matches()
+            if matches is None:
+                return
+            update_count_label(len(matches))
+            highlight_all()
+
+            # Update index to highlight the next occurrence
+            if matches:
+                current_index = (current_index + 1) % len(matches)  # Wrap around
+            self.show_match(matches, current_index)
+
+        @traced('find.replace_selection')
+        def replace_selection():
+            """Replaces the currently selected text with the input from the replace entry."""
+            nonlocal current_index
+
+            if not self.editable():
+                return  # The large file viewer is read-only, a loading file can't be edited yet
+
+            try:
+                sel_start = self.text_field.index(tk.SEL_FIRST)  # Get the start of the selection
+                sel_end = self.text_field.index(tk.SEL_LAST)  # Get the end of the selection
+                self.text_field.delete(sel_start, sel_end)  # Delete the selected text
+                self.text_field.insert(sel_start, replace_entry.get())  # Insert the new text
+
+                # Reset current index, the text changed so the matches get recomputed
+                current_index = -1
+                clear_highlights()  # Clear highlights after replacement
+                highlight_next_occurrence()  # Update highlights after replacement
+            except tk.TclError:
+                print("No text selected for replacement.")  # Log message if nothing is selected
+
+        @traced('find.replace_all')
+        def replace_all():
+            """Replaces all occurrences of the searched text with the replacement text."""
+            nonlocal current_index
+
+            if not self.editable():
+                return  # The large file viewer is read-only, a loading file can't be edited yet
+
+            search_text = find_entry.get()
+            replace_text = replace_entry.get()
+            if not search_text:
+                return
+
+            if find_matches() is None:
+                return
+
+            try:
+                replaced = self.replace_all_matches(search_text, replace_text, **search_options())
+            except re.error as e:
+                count_label.config(text=f'Invalid replacement: {e}')
+                return
+
+            # Reset current index
             current_index = -1
             clear_highlights()  # Clear highlights after replacement
-            highlight_next_occurrence()  # Update highlights after replacement
-        except tk.TclError:
-            print("No text selected for replacement.")  # Log message if nothing is selected
-
-    def replace_all():
-        """Replaces all occurrences of the searched text with the replacement text."""
-        search_text = find_entry.get()
-        replace_text = replace_entry.get()
-
-        content = text_field.get('1.0', 'end-1c')
-        new_content = content.replace(search_text, replace_text)
-        text_field.delete('1.0', 'end-1c')
-        text_field.insert('end-1c', new_content)
-
-        # Reset found indices and current index
-        found_indices.clear()
-        current_index = -1
-        clear_highlights()  # Clear highlights after replacement
-        update_count_label()  # Update count after replacement
-
-    # Create buttons and entries
-    # Entry for text to find
-    find_label = tk.Label(frame, text='Find:')
-    find_label.grid(row=0, column=0, pady=(10, 0), sticky='w')
-    find_entry = tk.Entry(frame, width=40)
-    find_entry.grid(row=1, column=0, pady=(5, 10))
-
-    # Entry for text to replace with
-    replace_label = tk.Label(frame, text='Replace with:')
-    replace_label.grid(row=2, column=0, pady=(10, 0), sticky='w')
-    replace_entry = tk.Entry(frame, width=40)
-    replace_entry.grid(row=3, column=0, pady=(5, 10))
-
-    # Button for finding next occurrence
-    find_next_button = tk.Button(frame, text='Find Next', command=highlight_next_occurrence, width=15)
-    find_next_button.grid(row=1, column=1, padx=(10, 0), pady=(5, 10), sticky='nsew')
-
-    # Button for replacing selected text
-    replace_selected_button = tk.Button(frame, text='Replace Selected', command=replace_selection, width=15)
-    replace_selected_button.grid(row=2, column=1, padx=(10, 0), pady=(5, 10), sticky='nsew')
-
-    # Button for replacing all text
-    replace_all_button = tk.Button(frame, text='Replace All', command=replace_all, width=15)
-    replace_all_button.grid(row=3, column=1, padx=(10, 0), pady=(5, 10), sticky='nsew')
-
-    # Label to show occurrence count
-    count_label = tk.Label(frame, text='Occurrences: 0')
-    count_label.grid(row=4, column=0, pady=(5, 10), sticky='w')
-
-
-# Font and size lists used for font selection in menus and comboboxes
-fonts = ['Arial', 'Times New Roman', 'Comic Sans MS', 'Courier New', 'Impact']
-sizes = ['8', '10', '12', '14', '16', '18', '20', '22', '24', '26', '28', '36', '48', '56', '64']
+            count_label.config(text=f'Replaced {replaced} occurrences')
+
+        # Create buttons and entries
+        # Entry for text to find
+        find_label = tk.Label(frame, text='Find:')
+        find_label.grid(row=0, column=0, pady=(10, 0), sticky='w')
+        find_var = tk.StringVar(find_window)
+        find_var.trace_add('write', search_typed)  # Search as you type
+        find_entry = tk.Entry(frame, width=40, textvariable=find_var)
+        find_entry.grid(row=1, column=0, pady=(5, 10))
+
+        # Entry for text to replace with
+        replace_label = tk.Label(frame, text='Replace with:')
+        replace_label.grid(row=2, column=0, pady=(10, 0), sticky='w')
+        replace_entry = tk.Entry(frame, width=40)
+        replace_entry.grid(row=3, column=0, pady=(5, 10))
+
+        # Button for finding next occurrence
+        find_next_button = tk.Button(frame, text='Find Next', command=highlight_next_occurrence, width=15)
+        find_next_button.grid(row=1, column=1, padx=(10, 0), pady=(5, 10), sticky='nsew')
+
+        # Button for replacing selected text
+        replace_selected_button = tk.Button(frame, text='Replace Selected', command=replace_selection, width=15)
+        replace_selected_button.grid(row=2, column=1, padx=(10, 0), pady=(5, 10), sticky='nsew')
+
+        # Button for replacing all text
+        replace_all_button = tk.Button(frame, text='Replace All', command=replace_all, width=15)
+        replace_all_button.grid(row=3, column=1, padx=(10, 0), pady=(5, 10), sticky='nsew')
+
+        # Search options
+        options_frame = tk.Frame(frame)
+        options_frame.grid(row=4, column=0, columnspan=2, sticky='w')
+        regex_var = tk.IntVar(find_window, value=0)
+        tk.Checkbutton(options_frame, text='Regex', variable=regex_var, command=search_typed).pack(side='left')
+        match_case_var = tk.IntVar(find_window, value=1)
+        tk.Checkbutton(options_frame, text='Match case', variable=match_case_var, command=search_typed).pack(side='left')
+        whole_word_var = tk.IntVar(find_window, value=0)
+        tk.Checkbutton(options_frame, text='Whole word', variable=whole_word_var, command=search_typed).pack(side='left')
+        highlight_all_var = tk.IntVar(find_window, value=0)
+        tk.Checkbutton(options_frame, text='Highlight all', variable=highlight_all_var,
+                       command=toggle_highlight_all).pack(side='left')
+
+        # Label to show occurrence count
+        count_label = tk.Label(frame, text='Occurrences: 0')
+        count_label.grid(row=5, column=0, pady=(5, 10), sticky='w')
+
+    def find_in_files(self):
+        """Opens the window to find and replace text across the files of a directory."""
+        if self.files_window is None:
+            self.build_find_in_files_window()
+        self.files_window.deiconify()
+        self.files_window.lift()
+
+    def cancel_files_job(self):
+        """Stops the Find in Files search or replace in progress, if any."""
+        if self.files_job is not None:
+            self.files_job.cancel()
+            self.files_job = None
+
+    def open_match(self, path, line, column, length):
+        """Opens a file at a match found by Find in Files, unless it is the file already open."""
+        opened = self.filepath is not None and os.path.abspath(self.filepath) == os.path.abspath(path)
+        if not opened or (self.loader is None and self.viewer is None and not self.open_flag):
+            if not self.open_path(path):
+                return
+        self.show_position(line, column, length)
+
+    def show_position(self, line, column, length):
+        """Selects length characters at a 1-based line and 0-based column, once the file being opened shows them."""
+        if self.loader is not None:
+            self.pending_position = (line, column, length)  # Applied by finish_loading
+            return
 
-# Global variables to manage file state
-open_flag = False  # Tracks if a file is currently open
-filepath = ''  # Stores the path of the currently opened or saved file
-
-# Set up the main application window
-root = tk.Tk()
-root.title('New text file | Notepad')
-root.geometry('1200x600')
-root.minsize(600, 300)
-
-# Main menu bar setup
-main_menu = tk.Menu(root)
-
-# File menu: contains options for file management
-file_menu = tk.Menu(main_menu, tearoff=0)
-main_menu.add_cascade(label='File', menu=file_menu)
-file_menu.add_command(label='Open', command=open_file)
-file_menu.add_command(label='Save', command=save)
-file_menu.add_command(label='Save as...', command=save_file_as)
-file_menu.add_command(label='Print', command=printer)
-file_menu.add_separator()
-file_menu.add_command(label='Exit', command=exit_program)
-
-# Edit menu: contains options for text editing actions
-edit_menu = tk.Menu(main_menu, tearoff=0)
-main_menu.add_cascade(label='Edit', menu=edit_menu)
-edit_menu.add_command(label='Undo', command=undo_command)
-edit_menu.add_command(label='Redo', command=redo_command)
-edit_menu.add_separator()
-edit_menu.add_command(label='Cut', command=cut_command)
-edit_menu.add_command(label='Copy', command=copy_command)
-edit_menu.add_command(label='Paste', command=paste_command)
-edit_menu.add_command(label='Delete', command=delete_command)
-edit_menu.add_command(label='Select All', command=select_command)
-edit_menu.add_command(label='Find & Replace', command=find_replace)
-edit_menu.add_separator()
-edit_menu.add_command(label='Time and date', command=time_and_date)
-
-# Right-click context menu for editing (bound to right mouse button)
-main_menu_mouse = tk.Menu(root)
-edit_menu_mouse = tk.Menu(main_menu_mouse, tearoff=0)
-main_menu_mouse.add_cascade(label='Edit', menu=edit_menu_mouse)
-edit_menu_mouse.add_command(label='Undo', command=undo_command)
-edit_menu_mouse.add_command(label='Redo', command=redo_command)
-edit_menu_mouse.add_separator()
-edit_menu_mouse.add_command(label='Cut', command=cut_command)
-edit_menu_mouse.add_command(label='Copy', command=copy_command)
-edit_menu_mouse.add_command(label='Paste', command=paste_command)
-edit_menu_mouse.add_command(label='Delete', command=delete_command)
-edit_menu_mouse.add_command(label='Select All', command=select_command)
-edit_menu_mouse.add_separator()
-edit_menu_mouse.add_command(label='Time and date', command=time_and_date)
-
-# View menu: controls display settings like font, wrapping, and status bar visibility
-view_menu = tk.Menu(main_menu, tearoff=0)
-main_menu.add_cascade(label='View', menu=view_menu)
-
-# Font submenu for selecting font type and size
-font_menu = tk.Menu(view_menu, tearoff=0)
-view_menu.add_cascade(label='Font', menu=font_menu)
-
-# Submenu for selecting font type
-font_menu_type = tk.Menu(font_menu, tearoff=0)
-font_menu.add_cascade(label='Font type', menu=font_menu_type)
-
-# Populate font type submenu with font options
-for font in fonts:
-    font_menu_type.add_command(label=font, command=lambda font=font: get_font_type(font))
-
-# Submenu for selecting font size
-font_menu_size = tk.Menu(font_menu, tearoff=0)
-font_menu.add_cascade(label='Size', menu=font_menu_size)
-
-# Populate font size submenu with size options
-for size in sizes:
-    font_menu_size.add_command(label=size, command=lambda size=size: get_font_size(size))
-
-# About menu with application information
-about_menu = tk.Menu(main_menu, tearoff=0)
-main_menu.add_cascade(label='About', menu=about_menu)
-about_menu.add_command(label='About', command=about)
-
-# Additional view options for option and status bars, and text wrapping
-view_menu.add_separator()
-hide_option_var = tk.IntVar(value=1)
-view_menu.add_checkbutton(label='Option bar', onvalue=1, offvalue=0, command=hide, variable=hide_option_var)
-hide_status_var = tk.IntVar(value=1)
-view_menu.add_checkbutton(label='Status bar', onvalue=1, offvalue=0, command=hide, variable=hide_status_var)
-wrap_var = tk.IntVar(value=1)
-view_menu.add_checkbutton(label='Text wrapping', onvalue=1, offvalue=0, command=wrap, variable=wrap_var)
-
-# Apply main menu to the application window
-root.config(menu=main_menu)
-
-# Option bar with buttons for quick access to file and edit actions
-option_bar = tk.Frame(root, height=50)
-option_bar.pack(fill='both', anchor='n')
-
-open_button = tk.Button(option_bar, text='📂', command=open_file)
-open_button.pack(side='left', padx=5, pady=2, anchor='center')
-
-save_button = tk.Button(option_bar, text='💾', command=save)
-save_button.pack(side='left', pady=2, anchor='center')
-
-printer_button = tk.Button(option_bar, text='🖨', command=printer)
-printer_button.pack(side='left', padx=5, pady=2, anchor='center')
-
-printer_button = tk.Button(option_bar, text='🔍', command=find_replace)
-printer_button.pack(side='left', padx=5, pady=2, anchor='center')
-
-undo_button = tk.Button(option_bar, text=' ↩', command=undo_command)
-undo_button.pack(side='left', pady=2, anchor='center')
-
-redo_button = tk.Button(option_bar, text='↪ ', command=redo_command)
-redo_button.pack(side='left', padx=5, pady=2, anchor='center')
-
-# Font selection combobox for font type
-font_combobox_var = tk.StringVar()
-font_combobox = ttk.Combobox(option_bar, width=20, state='readonly', textvariable=font_combobox_var, values=fonts)
-font_combobox.set('Arial')  # Set default font
-font_combobox.pack(side='left', padx=5, pady=2, anchor='center')
-font_combobox_var.trace('w', font_type)
-
-# Font size combobox for font size
-font_size_combobox_var = tk.StringVar()
-font_size_combobox = ttk.Combobox(option_bar, width=5, state='readonly', textvariable=font_size_combobox_var, values=sizes)
-font_size_combobox.set('12')  # Set default size
-font_size_combobox.pack(side='left', padx=5, pady=2, anchor='center')
-font_size_combobox_var.trace('w', font_type)
-
-# Status bar at the bottom to display character and line count
-bottom_bar = tk.Label(root, height=50)
-bottom_bar.pack(fill='both', anchor='s', side='bottom')
-
-# Vertical and horizontal scrollbars for text area
-vertical_scroll = ttk.Scrollbar(root, orient='vertical')
-vertical_scroll.pack(fill='y', side='right')
-horizontal_scroll = ttk.Scrollbar(root, orient='horizontal')
-horizontal_scroll.pack(fill='x', side='bottom')
-
-# Main text field setup
-text_field = tk.Text(root, wrap='word', font=('Arial', 12), yscrollcommand=vertical_scroll.set, xscrollcommand=horizontal_scroll.set, undo=True)
-text_field.pack(fill='both', expand=True)
-vertical_scroll.config(command=text_field.yview)
-horizontal_scroll.config(command=text_field.xview)
-# Highlight tag configuration
-text_field.tag_config('highlight', background='lightblue')  # Use light blue for selection highlight
-
-# Key bindings for real-time character and line count updates and context menu display
-text_field.bind('<KeyPress>', count_characters_func)
-text_field.bind('<KeyRelease>', count_characters_func)
-root.bind('<Button-3>', show_menu_mouse)
-
-# Display for character count and encoding
-count_characters = tk.Label(bottom_bar, text='0 characters | 1 lines')
-count_characters.pack(side='left', padx=10, anchor='center')
-utf_label = tk.Label(bottom_bar, text='UTF-8')
-utf_label.pack(side='right', padx=10)
-
-# Start the Tkinter main loop
-root.mainloop()
+        if self.viewer is not None:
+            if line > self.viewer.known_line_count():
+                if not self.viewer.indexed:
+                    self.root.after(VIEWER_POLL_MS, self.show_position, line, column, length)
+                return
+            self.show_viewer_window(line - 1 - self.viewer_visible_lines() // 2)
+            start = f'{line - self.viewer_window_start}.{column}'
+            end = f'{start}+{length}c'
+        else:
+            offset = self.document.index_to_offset(line, column)
+            start, end = self.offset_to_index(offset), self.offset_to_index(offset + length)
+
+        self.text_field.tag_remove('highlight', '1.0', 'end')
+        self.text_field.tag_add('highlight', start, end)
+        self.text_field.tag_remove('sel', '1.0', 'end')
+        self.text_field.tag_add('sel', start, end)
+        self.text_field.mark_set('insert', start)
+        self.text_field.see(start)
+
+    def build_find_in_files_window(self):
+        """Builds the Find in Files window, which is hidden instead of destroyed when closed."""
+        files_window = self.files_window = tk.Toplevel(self.root)
+        files_window.title('Find in Files')
+        files_window.geometry('760x560')
+        files_window.protocol('WM_DELETE_WINDOW', files_window.withdraw)
+
+        frame = tk.Frame(files_window)
+        frame.pack(fill='x', padx=10, pady=10)
+        frame.columnconfigure(1, weight=1)
+
+        # Results of the last search, and the settings they were found with
+        results = {}  # path -> FileResult, in the order found
+        searched = None  # (directory, include, exclude, search) of the results
+        rows = {}  # Result list item -> (path, line, column, length) it opens
+        listed = 0  # Matches listed so far, at most FILES_MAX_ROWS
+        replaced = {'files': 0, 'matches': 0, 'failed': 0}  # Progress of the replace in progress
+        rewritten = set()  # Absolute paths of the files it changed
+
+        def settings():
+            """Returns the directory, globs and compile_pattern() arguments entered, or None if invalid."""
+            directory = directory_entry.get()
+            search = (find_entry.get(), bool(regex_var.get()), not match_case_var.get(), bool(whole_word_var.get()))
+            if not os.path.isdir(directory):
+                status_label.config(text='Choose a directory to search')
+                return None
+            if not search[0]:
+                status_label.config(text='Enter the text to find')
+                return None
+            try:
+                compile_pattern(*search)
+            except re.error as e:
+                status_label.config(text=f'Invalid pattern: {e}')
+                return None
+            return directory, include_entry.get(), exclude_entry.get(), search
+
+        def browse():
+            """Picks the directory to search."""
+            directory = askdirectory(parent=files_window, initialdir=directory_entry.get() or None)
+            if directory:
+                directory_entry.delete(0, 'end')
+                directory_entry.insert(0, directory)
+
+        def clear_list():
+            """Empties the result list."""
+            nonlocal listed
+
+            result_list.delete(*result_list.get_children())
+            rows.clear()
+            listed = 0
+
+        def list_result(result):
+            """Adds a file and its matches to the result list."""
+            nonlocal listed
+
+            name = os.path.relpath(result.path, searched[0])
+            if result.error is not None:
+                result_list.insert('', 'end', text=name, values=('', result.error), tags=('error',))
+                return
+            item = result_list.insert('', 'end', text=f'{name} ({len(result.matches)})', open=True)
+            line, column, length, _ = result.matches[0]
+            rows[item] = (result.path, line, column, length)
+            for line, column, length, text in result.matches[:max(0, FILES_MAX_ROWS - listed)]:
+                rows[result_list.insert(item, 'end', values=(line, text))] = (result.path, line, column, length)
+            listed += min(len(result.matches), max(0, FILES_MAX_ROWS - listed))
+
+        def find_all():
+            """Searches the files of the directory in the background, listing the matches as they come."""
+            nonlocal searched
+
+            self.cancel_files_job()
+            current = settings()
+            if current is None:
+                return
+            directory, include, exclude, search = current
+            clear_list()
+            results.clear()
+            searched = current
+
+            batches = batched(walk_files(directory, parse_globs(include), parse_globs(exclude)), BATCH_FILES)
+            self.files_job = FilesJob(search_files, batches, (search,))
+            self.files_job.start()
+            poll(self.files_job, 'search')
+
+        def preview_replace():
+            """Shows what Replace would change in the files found, asking to go ahead."""
+            current = settings()
+            if current is None:
+                return
+            if self.files_job is not None or current != searched:
+                status_label.config(text='Find All with these settings first')
+                return
+
+            # The open file is only rewritten if the editor holds no unsaved changes to it
+            open_path = os.path.abspath(self.filepath) if self.filepath and self.is_dirty() else None
+            found = [result for result in results.values()
+                     if result.matches and result.error is None and os.path.abspath(result.path) != open_path]
+            if not found:
+                status_label.config(text='Nothing to replace')
+                return
+            build_preview(found, current[3], replace_entry.get())
+
+        def build_preview(found, search, replacement):
+            """Builds the window listing each matching line before and after the replacement."""
+            pattern = compile_pattern(*search)
+            changed = []  # (file, [(line, before, after)])
+            shown = 0
+            substitute = replacement if search[1] else lambda match: replacement
+            try:
+                for result in found:
+                    lines = result.matches[:max(0, FILES_MAX_ROWS - shown)]
+                    changed.append((result, [(line, text, pattern.sub(substitute, text)) for line, _, _, text in lines]))
+                    shown += len(lines)
+            except re.error as e:
+                status_label.config(text=f'Invalid replacement: {e}')
+                return
+
+            preview = tk.Toplevel(files_window)
+            preview.title('Replace in Files')
+            preview.geometry('760x420')
+            preview.transient(files_window)
+            count = sum(len(result.matches) for result in found)
+            tk.Label(preview, text=f'Replace {count:,} matches in {len(found):,} files?').pack(anchor='w', padx=10, pady=5)
+
+            changes = ttk.Treeview(preview, columns=('line', 'before', 'after'))
+            changes.heading('#0', text='File')
+            changes.heading('line', text='Line')
+            changes.heading('before', text='Before')
+            changes.heading('after', text='After')
+            changes.column('line', width=60, stretch=False)
+            for result, lines in changed:
+                item = changes.insert('', 'end', text=os.path.relpath(result.path, searched[0]), open=True)
+                for values in lines:
+                    changes.insert(item, 'end', values=values)
+            changes.pack(fill='both', expand=True, padx=10)
+
+            def apply():
+                """Rewrites the files in the background."""
+                preview.destroy()
+                items = [(result.path, result.mtime_ns, result.size) for result in found]
+                clear_list()
+                for key in replaced:
+                    replaced[key] = 0
+                rewritten.clear()
+                self.files_job = FilesJob(replace_files, batched(items, BATCH_FILES), (search, replacement))
+                self.files_job.start()
+                poll(self.files_job, 'replace')
+
+            buttons = tk.Frame(preview)
+            buttons.pack(pady=10)
+            tk.Button(buttons, text='Replace', command=apply, width=12).pack(side='left', padx=5)
+            tk.Button(buttons, text='Cancel', command=preview.destroy, width=12).pack(side='left', padx=5)
+
+        def stop():
+            """Stops the search or replace in progress."""
+            if self.files_job is not None:
+                self.cancel_files_job()
+                status_label.config(text='Stopped')
+
+        def poll(job, kind):
+            """Moves results from the job to the list and shows its progress, until it is done."""
+            nonlocal searched
+
+            if job is not self.files_job:
+                return  # Stopped or superseded
+            finished = None
+            files_done = job.files_done
+            while finished is None:
+                try:
+                    state, payload, files_done = job.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if state != 'results':
+                    finished = (state, payload)
+                elif kind == 'search':
+                    for result in payload:
+                        results[result.path] = result
+                        list_result(result)
+                else:
+                    for path, count, error in payload:
+                        name = os.path.relpath(path, searched[0])
+                        if error is not None:
+                            replaced['failed'] += 1
+                            result_list.insert('', 'end', text=name, values=('', error), tags=('error',))
+                        elif count:
+                            replaced['files'] += 1
+                            replaced['matches'] += count
+                            rewritten.add(os.path.abspath(path))
+                            result_list.insert('', 'end', text=name, values=('', f'{count} replaced'))
+
+            matches = sum(len(result.matches) for result in results.values())
+            if kind == 'search':
+                progress = f'{files_done:,} files searched, {matches:,} matches in {len(results):,} files'
+            else:
+                progress = f'{replaced["matches"]:,} matches replaced in {replaced["files"]:,} files'
+            if finished is None:
+                status_label.config(text=f'{progress}...')
+                self.root.after(FILES_POLL_MS, poll, job, kind)
+                return
+
+            self.files_job = None
+            tracer.add(f'find in files {kind} (background)', job.started, job.duration, job.thread.ident)
+            if finished[0] == 'error':
+                status_label.config(text=f'Stopped: {finished[1]}')
+            elif kind == 'search':
+                status_label.config(text=f'{progress} in {job.duration:.2f} s')
+            else:
+                failed = f', {replaced["failed"]:,} files failed' if replaced['failed'] else ''
+                status_label.config(text=f'{progress}{failed}')
+                # The matches moved, and the open file may have been rewritten under a clean editor
+                results.clear()
+                searched = None
+                if self.filepath is not None and os.path.abspath(self.filepath) in rewritten and not self.is_dirty():
+                    self.load_file(self.filepath)
+
+        def open_selected(event=None):
+            """Opens the file of the double-clicked result at its match."""
+            item = result_list.focus()
+            if item in rows:
+                self.open_match(*rows[item])
+
+        # Where and what to search
+        tk.Label(frame, text='Directory:').grid(row=0, column=0, sticky='w')
+        directory_entry = tk.Entry(frame)
+        directory_entry.grid(row=0, column=1, sticky='ew', pady=2)
+        if self.filepath:
+            directory_entry.insert(0, os.path.dirname(os.path.abspath(self.filepath)))
+        tk.Button(frame, text='Browse...', command=browse, width=12).grid(row=0, column=2, padx=(10, 0))
+
+        tk.Label(frame, text='Find:').grid(row=1, column=0, sticky='w')
+        find_entry = tk.Entry(frame)
+        find_entry.grid(row=1, column=1, sticky='ew', pady=2)
+        tk.Button(frame, text='Find All', command=find_all, width=12).grid(row=1, column=2, padx=(10, 0))
+
+        tk.Label(frame, text='Replace with:').grid(row=2, column=0, sticky='w')
+        replace_entry = tk.Entry(frame)
+        replace_entry.grid(row=2, column=1, sticky='ew', pady=2)
+        tk.Button(frame, text='Replace...', command=preview_replace, width=12).grid(row=2, column=2, padx=(10, 0))
+
+        tk.Label(frame, text='Include:').grid(row=3, column=0, sticky='w')
+        include_entry = tk.Entry(frame)
+        include_entry.insert(0, '*')
+        include_entry.grid(row=3, column=1, sticky='ew', pady=2)
+        tk.Button(frame, text='Stop', command=stop, width=12).grid(row=3, column=2, padx=(10, 0))
+
+        tk.Label(frame, text='Exclude:').grid(row=4, column=0, sticky='w')
+        exclude_entry = tk.Entry(frame)
+        exclude_entry.insert(0, '.git; .hg; .svn; __pycache__; node_modules')
+        exclude_entry.grid(row=4, column=1, sticky='ew', pady=2)
+
+        # Search options
+        options_frame = tk.Frame(frame)
+        options_frame.grid(row=5, column=0, columnspan=3, sticky='w')
+        regex_var = tk.IntVar(files_window, value=0)
+        tk.Checkbutton(options_frame, text='Regex', variable=regex_var).pack(side='left')
+        match_case_var = tk.IntVar(files_window, value=1)
+        tk.Checkbutton(options_frame, text='Match case', variable=match_case_var).pack(side='left')
+        whole_word_var = tk.IntVar(files_window, value=0)
+        tk.Checkbutton(options_frame, text='Whole word', variable=whole_word_var).pack(side='left')
+
+        # Matches grouped by file, double-click opens one
+        list_frame = tk.Frame(files_window)
+        list_frame.pack(fill='both', expand=True, padx=10)
+        result_list = ttk.Treeview(list_frame, columns=('line', 'text'))
+        result_list.heading('#0', text='File')
+        result_list.heading('line', text='Line')
+        result_list.heading('text', text='Text')
+        result_list.column('#0', width=240)
+        result_list.column('line', width=60, stretch=False)
+        result_list.tag_configure('error', foreground='red')
+        result_scroll = tk.Scrollbar(list_frame, command=result_list.yview)
+        result_list.configure(yscrollcommand=result_scroll.set)
+        result_scroll.pack(side='right', fill='y')
+        result_list.pack(side='left', fill='both', expand=True)
+        result_list.bind('<Double-1>', open_selected)
+        result_list.bind('<Return>', open_selected)
+
+        status_label = tk.Label(files_window, text='', anchor='w')
+        status_label.pack(fill='x', padx=10, pady=5)
+
+
+def main():
+    """Runs the editor on the file given, if any, --profile-startup prints where the startup time goes."""
+    parser = argparse.ArgumentParser(prog='notepad.py', description='A simple text editor.',
+                                     epilog='Batch mode, without the editor: notepad.py --count PATTERN FILE... '
+                                            'or notepad.py --replace PATTERN REPLACEMENT FILE...')
+    parser.add_argument('path', nargs='?', help='file to open')
+    parser.add_argument('--profile-startup', action='store_true', help='print where the startup time goes')
+    parser.add_argument('--single-instance', action='store_true',
+                        help='open files of later launches in this editor instead of new ones')
+    args = parser.parse_args()
+
+    server = None
+    if (args.single_instance or requested([])) and supported():
+        try:
+            server = InstanceServer()
+        except OSError:
+            # Another editor started listening since the check at the top, or the socket can't be made
+            if hand_off(file_argument(sys.argv[1:])):
+                return
+
+    profile = args.profile_startup or bool(os.environ.get('NOTEPAD_PROFILE_STARTUP'))
+    profiler = StartupProfiler(LAUNCHED, sys.stderr if profile else None)
+    profiler.mark('imports')
+    app = Notepad(profiler=profiler)
+    if server is not None:
+        app.serve_instance(server)
+    if args.path:
+        app.open_path(args.path)
+    app.root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
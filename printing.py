@@ -0,0 +1,241 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+PRINT_CHUNK_CHARS = 1024 * 1024  # Text paginated at a time, bounds the memory used by a job
+TAB_SIZE = 8
+
+# Printable area of an A4 page in points, minus 0.75 in margins
+PAGE_WIDTH_POINTS = 595 - 2 * 54
+PAGE_HEIGHT_POINTS = 842 - 2 * 54
+
+# How many characters fit on a printed line and lines on a page, and whether long lines wrap or get cut
+PageLayout = namedtuple('PageLayout', 'chars_per_line lines_per_page wrap')
+
+
+def page_layout(char_width, line_height, wrap=True):
+    """Returns the PageLayout for a font whose average character width and line height are in points."""
+    return PageLayout(max(1, int(PAGE_WIDTH_POINTS // char_width)), max(1, int(PAGE_HEIGHT_POINTS // line_height)),
+                      wrap)
+
+
+def parse_page_ranges(text):
+    """Parses page ranges like '1-3, 5' into sorted (first, last) pairs, None for all pages.
+
+    Raises ValueError if the text is not a valid list of ranges.
+    """
+    if not text.strip():
+        return None
+    ranges = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        first = int(first)
+        last = int(last) if last.strip() else first
+        if first < 1 or last < first:
+            raise ValueError(f'invalid page range {part.strip()!r}')
+        ranges.append((first, last))
+    return sorted(ranges)
+
+
+def in_ranges(page, ranges):
+    """Returns True if a 1-based page number is part of the ranges, None meaning all pages."""
+    return ranges is None or any(first <= page <= last for first, last in ranges)
+
+
+def text_lines(chunks):
+    """Yields the lines of text given in chunks, without their line endings."""
+    partial = ''
+    for chunk in chunks:
+        for start in range(0, len(chunk), PRINT_CHUNK_CHARS):
+            lines = (partial + chunk[start:start + PRINT_CHUNK_CHARS]).split('\n')
+            partial = lines.pop()
+            yield from lines
+    yield partial
+
+
+def wrap_line(line, layout):
+    """Splits a line into the printed lines it takes, breaking at spaces when wrapping."""
+    line = line.expandtabs(TAB_SIZE)
+    width = layout.chars_per_line
+    if len(line) <= width:
+        return [line]
+    if not layout.wrap:
+        return [line[:width]]
+
+    printed = []
+    while len(line) > width:
+        cut = line.rfind(' ', 0, width + 1)
+        if cut <= 0:
+            cut = width  # A word longer than the line is broken anywhere
+        printed.append(line[:cut].rstrip(' '))
+        line = line[cut:].lstrip(' ')
+    printed.append(line)
+    return printed
+
+
+def paginate(chunks, layout):
+    """Yields the pages of a text as lists of printed lines, form feeds force a new page."""
+    page = []
+    for line in text_lines(chunks):
+        breaks = line.split('\f')
+        for i, part in enumerate(breaks):
+            if i:
+                yield page
+                page = []
+            for printed in wrap_line(part, layout):
+                page.append(printed)
+                if len(page) == layout.lines_per_page:
+                    yield page
+                    page = []
+    if page:
+        yield page
+
+
+class PrintJob:
+    """Paginates a document snapshot into a spool file and hands it to a print backend.
+
+    start and end limit the job to a part of the document, e.g. the selection. pages is a list of
+    (first, last) page ranges, None for all. The job runs on the PrintSpooler thread, state and
+    pages_done can be read from the UI and cancel() stops it between two pages.
+    """
+
+    def __init__(self, name, snapshot, backend, printer, layout, start=0, end=None, pages=None):
+        self.name = name
+        self.snapshot = snapshot
+        self.backend = backend
+        self.printer = printer
+        self.layout = layout
+        self.start = start
+        self.end = end
+        self.pages = pages
+
+        self.state = 'queued'  # Then 'paginating', 'spooling' and 'done', 'cancelled' or 'failed'
+        self.pages_done = 0  # Pages paginated so far
+        self.pages_printed = 0  # Of those, pages within the page ranges
+        self.error = None
+        self.started = None  # perf_counter time the worker picked the job up
+        self.duration = None  # Seconds from then until the job finished
+        self.thread = None  # Ident of the worker thread that ran the job
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    def cancel(self):
+        """Stops the job if it was not handed to the printer yet."""
+        self.cancelled.set()
+
+    def finished(self):
+        """Returns True once the job is done, cancelled or failed."""
+        return self.done.is_set()
+
+    def write_pages(self, f):
+        """Writes the pages within the page ranges to a file, form feeds between them."""
+        last_page = max(last for _, last in self.pages) if self.pages is not None else None
+        for number, page in enumerate(paginate(self.snapshot.chunks(self.start, self.end), self.layout), 1):
+            if self.cancelled.is_set():
+                return False
+            if in_ranges(number, self.pages):
+                if self.pages_printed:
+                    f.write('\f')
+                f.write('\n'.join(page))
+                f.write('\n')
+                self.pages_printed += 1
+            self.pages_done = number
+            if last_page is not None and number >= last_page:
+                break
+        return True
+
+    def run(self, directory):
+        """Worker thread body: paginates to a spool file in directory, prints it and removes it."""
+        path = None
+        self.started = time.perf_counter()
+        self.thread = threading.get_ident()
+        try:
+            if self.cancelled.is_set():
+                self.state = 'cancelled'
+                return
+
+            self.state = 'paginating'
+            fd, path = tempfile.mkstemp(dir=directory, prefix='print-', suffix='.txt')
+            with open(fd, 'w', encoding='utf-8', errors='replace') as f:
+                completed = self.write_pages(f)
+            if not completed or self.cancelled.is_set():
+                self.state = 'cancelled'
+                return
+            if not self.pages_done:
+                raise ValueError('there is nothing to print')
+            if not self.pages_printed:
+                raise ValueError(f'the document has only {self.pages_done} pages')
+
+            self.state = 'spooling'
+            self.backend.print_file(path, self.printer)
+            self.state = 'done'
+            if getattr(self.backend, 'keeps_file', False):
+                path = None  # The backend still reads it, the spool directory goes away with the spooler
+        except (OSError, ValueError) as e:
+            self.error = e
+            self.state = 'failed'
+        finally:
+            if path is not None:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.duration = time.perf_counter() - self.started
+            self.done.set()
+
+
+class PrintSpooler:
+    """Runs print jobs one after the other on a worker thread, spool files live in a private temporary directory."""
+
+    def __init__(self):
+        self.directory = None
+        self.jobs = []  # Submitted jobs, finished ones included until forget_finished()
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def submit(self, job):
+        """Queues a job, starting the worker on first use, and returns it."""
+        if self.thread is None:
+            self.directory = tempfile.mkdtemp(prefix='notepad-print-')
+            self.thread = threading.Thread(target=self._run, name='print-spooler', daemon=True)
+            self.thread.start()
+        self.jobs.append(job)
+        self.queue.put(job)
+        return job
+
+    def _run(self):
+        """Worker thread body."""
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.run(self.directory)
+
+    def active(self):
+        """Returns the jobs not finished yet, in print order."""
+        return [job for job in self.jobs if not job.finished()]
+
+    def forget_finished(self):
+        """Drops the finished jobs, returning them."""
+        finished = [job for job in self.jobs if job.finished()]
+        self.jobs = [job for job in self.jobs if not job.finished()]
+        return finished
+
+    def cancel_all(self):
+        """Cancels every job not finished yet."""
+        for job in self.active():
+            job.cancel()
+
+    def close(self, wait=True):
+        """Stops the worker after the current job and removes the spool directory."""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        if wait:
+            self.thread.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.thread = None
@@ -0,0 +1,36 @@
+import time
+
+
+class StartupProfiler:
+    """Times the phases of starting the editor, from launch to the first paint of the window.
+
+    Each call to mark() ends the running phase. With an output stream, the breakdown is written to
+    it once the window is painted.
+    """
+
+    def __init__(self, started=None, output=None):
+        self.started = time.perf_counter() if started is None else started
+        self.last = self.started
+        self.output = output
+        self.phases = []  # (name, seconds) in order
+        self.first_paint = None  # Seconds from launch to the first paint, once painted
+
+    def mark(self, phase):
+        """Ends the running phase, giving it a name."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def painted(self):
+        """Ends the last phase when the window got painted for the first time, and reports."""
+        self.mark('first paint')
+        self.first_paint = self.last - self.started
+        if self.output is not None:
+            print(self.report(), file=self.output)
+
+    def report(self):
+        """Returns the breakdown of the startup time as text."""
+        lines = [f'Startup: {self.first_paint * 1000:.1f} ms to first paint']
+        for name, seconds in self.phases:
+            lines.append(f'  {name:<28} {seconds * 1000:8.1f} ms')
+        return '\n'.join(lines)
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from watcher import stamp_file
+
+WRITE_CHUNK_CHARS = 1024 * 1024  # Text handed to the file object per write call
+
+
+def text_chunks(snapshot):
+    """Yields the text of a snapshot in pieces of at most WRITE_CHUNK_CHARS."""
+    for chunk in snapshot.chunks():
+        for start in range(0, len(chunk), WRITE_CHUNK_CHARS):
+            yield chunk[start:start + WRITE_CHUNK_CHARS]
+
+
+def fingerprint(snapshot, encoding='utf8'):
+    """Returns a hash of the encoded text of a snapshot."""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in text_chunks(snapshot):
+        digest.update(chunk.encode(encoding, errors='backslashreplace'))
+    return digest.hexdigest()
+
+
+def write_text(f, chunks, encoding, fsync, bom):
+    """Writes text chunks to an open text file and flushes it, returns a hash of the encoded text."""
+    digest = hashlib.blake2b(digest_size=16)
+    if bom:
+        f.write('\ufeff')
+    for chunk in chunks:
+        f.write(chunk)
+        digest.update(chunk.encode(encoding, errors='backslashreplace'))
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+    return digest.hexdigest()
+
+
+def atomic_write(path, chunks, encoding='utf8', newline=None, fsync=False, bom=False, written=None):
+    """Writes text chunks to path through a temporary file in the same directory and os.replace.
+
+    The target is either left untouched or fully replaced, never truncated. A symlink is followed,
+    the file it points to gets replaced. A file with other hard links can't be replaced without
+    cutting it from them, it is copied over instead, see copy_over. newline is the line ending '\n'
+    gets written as and bom starts the file with a byte order mark. written, if given, is called
+    with the path of the complete file before it replaces the target, or with the target once it
+    was copied over. Returns a hash of the encoded text written.
+    """
+    path = os.path.realpath(path)  # Replacing a symlink would cut it from its target
+    try:
+        links = os.stat(path).st_nlink
+    except FileNotFoundError:
+        links = 1
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    copying = False  # The temporary file is kept if copying it over the target fails
+    try:
+        with open(fd, 'w', encoding=encoding, newline=newline) as f:
+            digest = write_text(f, chunks, encoding, fsync or links > 1, bom)
+        if links > 1:
+            # A new file would only replace this one of its names
+            target = open(path, 'r+b')
+            copying = True
+            copy_over(temp_path, target)
+            copying = False
+            if written is not None:
+                written(path)
+            os.remove(temp_path)
+            return digest
+
+        # Keep the permissions of the file being replaced
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temp_path, 0o666 & ~umask)
+
+        if written is not None:
+            written(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if not copying:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        raise
+
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        directory_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+    return digest
+
+
+def copy_over(temp_path, target):
+    """Copies a complete, synced temporary file into a target file opened for update, syncs and closes it.
+
+    The target keeps its inode, which the hard links to it share. A crash during the copy can leave
+    the target torn, but never loses the text: the temporary file is only removed once the copy is
+    on disk, and an OSError raised during the copy names it.
+    """
+    try:
+        with open(temp_path, 'rb') as source, target:
+            shutil.copyfileobj(source, target, WRITE_CHUNK_CHARS)
+            target.truncate()
+            target.flush()
+            os.fsync(target.fileno())
+    except OSError as e:
+        raise OSError(e.errno, f'{e.strerror or e}, the saved text is in {temp_path}') from e
+
+
+class SaveJob:
+    """Saves a document snapshot on a worker thread.
+
+    If the fingerprint of the last save of the same file is given and the snapshot still hashes to
+    it, nothing is written. When the job is done, skipped, error, duration and fingerprint tell
+    what happened, and stamp is the FileStamp of the file written, taken before it replaced the
+    old one so a change made right after the save is not mistaken for it.
+    """
+
+    def __init__(self, path, snapshot, encoding='utf8', newline=None, fsync=False, previous_fingerprint=None,
+                 bom=False):
+        self.path = path
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.encoding = encoding
+        self.newline = newline
+        self.bom = bom
+        self.fsync = fsync
+        self.previous_fingerprint = previous_fingerprint
+
+        self.fingerprint = None
+        self.stamp = None
+        self.skipped = False
+        self.error = None
+        self.started = None
+        self.duration = None
+        self.done = threading.Event()
+        # Not a daemon: exiting the program waits for a save in progress instead of cutting it short
+        self.thread = threading.Thread(target=self._run, name='save')
+
+    def start(self):
+        """Starts saving in the background."""
+        self.thread.start()
+
+    def _stamp(self, temp_path):
+        """Stamps the written temporary file, which becomes the saved file."""
+        self.stamp = stamp_file(temp_path)
+
+    def _run(self):
+        """Worker thread body."""
+        started = self.started = time.perf_counter()
+        try:
+            if self.previous_fingerprint is not None:
+                self.fingerprint = fingerprint(self.snapshot, self.encoding)
+                self.skipped = self.fingerprint == self.previous_fingerprint
+            if not self.skipped:
+                self.fingerprint = atomic_write(
+                    self.path, text_chunks(self.snapshot), self.encoding, self.newline, self.fsync, self.bom,
+                    written=self._stamp
+                )
+        except (OSError, UnicodeEncodeError) as e:
+            self.error = e
+        finally:
+            self.duration = time.perf_counter() - started
+            self.done.set()
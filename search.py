@@ -0,0 +1,222 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from document import newline_positions
+
+SCAN_WINDOW_CHARS = 1024 * 1024  # Background scans search this many characters per regex call
+SCAN_OVERLAP_CHARS = 64 * 1024  # plus this many after them, so matches crossing into the next window are found whole
+FIND_CONTEXT_CHARS = 256  # Text read around a region searched on its own, for lookarounds and whole words at its edges
+
+
+@lru_cache(maxsize=32)
+def compile_pattern(pattern, regex=False, ignore_case=False, whole_word=False):
+    """Compiles a search pattern, raises re.error for an invalid regular expression."""
+    source = pattern if regex else re.escape(pattern)
+    if whole_word:
+        source = rf'(?<!\w)(?:{source})(?!\w)'
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(source, flags)
+
+
+def scan(pattern, text, pos=0, window=SCAN_WINDOW_CHARS, overlap=SCAN_OVERLAP_CHARS):
+    """Yields the (start, end) spans of the non-empty matches of a compiled pattern in text from pos on,
+    window characters at a time, and None after each window.
+
+    A regex call can't be interrupted and holds the GIL, so a scan of the whole text would freeze the
+    UI thread and ignore cancelling until it ends; callers check and yield at the Nones instead. Each
+    window is searched with overlap more characters after it, and a match reaching past the window is
+    matched again against the whole text, so the matches are the ones finditer gives as long as
+    matches and their lookaheads span less than overlap characters.
+    """
+    length = len(text)
+    while pos < length:
+        limit = min(length, pos + window)
+        endpos = min(length, limit + overlap)
+        restart = None
+        for match in pattern.finditer(text, pos, endpos):
+            start, end = match.span()
+            if start >= limit:
+                break
+            if end > limit and endpos < length:
+                # The end of the searched text may have cut it short or made it match, look again with the rest
+                whole = pattern.match(text, start)
+                if whole is None or whole.end() != end:
+                    if whole is not None and whole.end() > start:
+                        yield start, whole.end()
+                        restart = whole.end()
+                    else:
+                        restart = start + 1
+                    break
+            if end > start:
+                yield start, end
+            pos = max(pos, end)
+        pos = restart if restart is not None else max(pos, limit)
+        yield None
+
+
+class Matches:
+    """Sorted start and end offsets of all the matches of a pattern."""
+
+    def __init__(self, starts, ends):
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        return self.starts[i], self.ends[i]
+
+    def after(self, offset):
+        """Returns the number of the first match starting at or after offset."""
+        return bisect_left(self.starts, offset)
+
+
+class SearchEngine:
+    """Finds matches over a document snapshot with compiled regular expressions.
+
+    The text of the searched document version, its line index and the match lists are cached
+    until the document changes, so Find Next, the occurrence count and highlighting share one scan.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._text = ''
+        self._newlines = None
+        self._matches = {}
+
+    def _prepare(self, document):
+        """Takes a new snapshot of the document when it changed since the last search."""
+        if self._version != document.version:
+            self._version = document.version
+            self._text = document.snapshot().text()
+            self._newlines = None
+            self._matches.clear()
+
+    def text(self, document):
+        """Returns the searched snapshot text of a document."""
+        self._prepare(document)
+        return self._text
+
+    def find_all(self, document, pattern, regex=False, ignore_case=False, whole_word=False):
+        """Returns the Matches of a pattern in a document, empty matches are skipped."""
+        self._prepare(document)
+        key = (pattern, regex, ignore_case, whole_word)
+        matches = self._matches.get(key)
+        if matches is None:
+            starts = array('q')
+            ends = array('q')
+            for match in compile_pattern(*key).finditer(self._text):
+                start, end = match.span()
+                if end > start:
+                    starts.append(start)
+                    ends.append(end)
+            matches = self._matches[key] = Matches(starts, ends)
+        return matches
+
+    def adopt(self, task):
+        """Caches the text and matches of a finished SearchTask, saving Find Next from scanning again."""
+        if not task.finished() or task.cancelled.is_set() or task.error is not None:
+            return
+        if self._version != task.version:
+            self._version = task.version
+            self._text = task.text
+            self._newlines = None
+            self._matches.clear()
+        self._matches[task.key] = task.matches()
+
+    def index(self, offset):
+        """Converts an offset of the searched text to a Tk index."""
+        if self._newlines is None:
+            self._newlines = newline_positions(self._text)
+        line = bisect_left(self._newlines, offset)
+        line_start = self._newlines[line - 1] + 1 if line else 0
+        return f'{line + 1}.{offset - line_start}'
+
+
+class SearchTask:
+    """Finds the matches of a pattern in a document snapshot on a worker thread.
+
+    The matches are appended to starts and ends as they are found, so the UI can show the first one
+    and count the others while the scan goes on. first is the number of the first match starting at
+    or after origin, once found. cancel() stops the scan at the next match or window of scan().
+    """
+
+    def __init__(self, snapshot, pattern, regex=False, ignore_case=False, whole_word=False, origin=0):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.key = (pattern, regex, ignore_case, whole_word)
+        self.origin = origin
+        self.text = None  # Snapshot text, once joined by the worker
+        self.starts = array('q')
+        self.ends = array('q')
+        self.first = None
+        self.error = None
+        self.started = None  # perf_counter time the scan started
+        self.duration = None  # Seconds it took
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='search', daemon=True)
+
+    def start(self):
+        """Starts the scan in the background."""
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def cancel(self):
+        """Stops the scan, the matches found so far are kept."""
+        self.cancelled.set()
+
+    def finished(self):
+        """Returns True once the scan is complete, cancelled or failed."""
+        return self.done.is_set()
+
+    def matches(self):
+        """Returns the Matches found so far."""
+        return Matches(self.starts, self.ends)
+
+    def _run(self):
+        """Worker thread body."""
+        try:
+            pattern = compile_pattern(*self.key)
+            self.text = self.snapshot.text()
+            for span in scan(pattern, self.text):
+                if self.cancelled.is_set():
+                    return
+                if span is None:
+                    time.sleep(0)  # Lets the UI thread run between windows
+                    continue
+                start, end = span
+                self.starts.append(start)
+                self.ends.append(end)
+                if self.first is None and start >= self.origin:
+                    self.first = len(self.starts) - 1
+        except re.error as e:
+            self.error = e
+        finally:
+            self.duration = time.perf_counter() - self.started
+            self.done.set()
+
+
+def find_between(document, start, end, pattern, regex=False, ignore_case=False, whole_word=False, limit=None):
+    """Returns the (start, end) offsets of at most limit matches of a pattern starting between two document offsets.
+
+    The text around the region is searched along, so a word cut by its edges is not taken for a whole
+    word; a match starting in the region may end past it.
+    """
+    base = max(0, start - FIND_CONTEXT_CHARS)
+    text = document.get(base, end + FIND_CONTEXT_CHARS)
+    found = []
+    for match in compile_pattern(pattern, regex, ignore_case, whole_word).finditer(text, start - base):
+        match_start, match_end = match.span()
+        if match_start >= end - base:
+            break
+        if match_end > match_start:
+            found.append((base + match_start, base + match_end))
+            if limit is not None and len(found) >= limit:
+                break
+    return found
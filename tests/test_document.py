@@ -0,0 +1,116 @@
+"""Randomized tests for the piece table: after any sequence of edits it reads and looks up exactly
+like a plain string holding the same text.
+
+Usage: python -m pytest tests
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document  # noqa: E402
+from document import PieceTable, replaced_text  # noqa: E402
+
+WORDS = ['a', 'word ', '\n', 'two\nlines\n', 'é', '日本', 'x' * 50]
+
+
+def check(table, text):
+    """Asserts that a piece table holds text, with the line lookups of a plain string."""
+    assert len(table) == len(text)
+    assert table.text() == text
+    lines = text.split('\n')
+    assert table.line_count == len(lines)
+    offset = 0
+    for number, line in enumerate(lines, 1):
+        assert table.line_start(number) == offset
+        assert table.line_end(number) == offset + len(line)
+        offset += len(line) + 1
+    for offset in range(0, len(text) + 1, max(1, len(text) // 50)):
+        line = text.count('\n', 0, offset) + 1
+        column = offset - (text.rfind('\n', 0, offset) + 1)
+        assert table.offset_to_index(offset) == (line, column)
+        assert table.index_to_offset(line, column) == offset
+
+
+def random_edit(rng, table, text):
+    """Applies one random edit to both the table and the string, returns the new string."""
+    offset = rng.randrange(len(text) + 1)
+    choice = rng.random()
+    if choice < 0.5 or not text:
+        new = rng.choice(WORDS)
+        table.insert(offset, new)
+        return text[:offset] + new + text[offset:]
+    if choice < 0.8:
+        length = rng.randrange(1, 30)
+        table.delete(offset, length)
+        return text[:offset] + text[offset + length:]
+    if choice < 0.95:
+        length = rng.randrange(0, 10)
+        new = rng.choice(WORDS)
+        table.replace(offset, length, new)
+        return text[:offset] + new + text[offset + length:]
+
+    replacements = []
+    position = 0
+    while True:
+        start = position + rng.randrange(0, 40)
+        end = start + rng.randrange(0, 5)
+        if end > len(text):
+            break
+        replacements.append((start, end, rng.choice(['', 'Q', '\n'])))
+        position = end
+    table.replace_many(replacements)
+    return replaced_text(text, replacements)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_edits_match_a_string(seed):
+    rng = random.Random(seed)
+    text = 'first line\nsecond line\n' * 20
+    table = PieceTable(text)
+    for step in range(400):
+        text = random_edit(rng, table, text)
+        if step % 20 == 0:
+            check(table, text)
+    check(table, text)
+
+
+def test_typing_grows_the_last_piece():
+    text = 'start\nend\n'
+    table = PieceTable(text)
+    offset = 6
+    for char in 'typed\nline ':
+        table.insert(offset, char)
+        text = text[:offset] + char + text[offset:]
+        offset += 1
+        check(table, text)
+
+
+def test_snapshot_keeps_its_text():
+    rng = random.Random(7)
+    text = 'some text\n' * 50
+    table = PieceTable(text)
+    for _ in range(50):
+        text = random_edit(rng, table, text)
+    snapshot = table.snapshot()
+    kept = text
+    for _ in range(50):
+        text = random_edit(rng, table, text)
+    check(snapshot, kept)
+    check(table, text)
+
+
+def test_compaction(monkeypatch):
+    monkeypatch.setattr(document, 'MAX_PIECES', 16)
+    monkeypatch.setattr(document, 'SMALL_PIECE_CHARS', 8)
+    rng = random.Random(11)
+    text = 'compacted often\n' * 30
+    table = PieceTable(text)
+    for step in range(300):
+        text = random_edit(rng, table, text)
+        if step % 10 == 0:
+            check(table, text)
+    check(table, text)
@@ -0,0 +1,151 @@
+"""Tests for single-instance mode without a display: launches hand their file to the running editor's
+socket, stale sockets are replaced and a launch can never block or flood the editor.
+
+Usage: python -m pytest tests
+"""
+import os
+import select
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instance  # noqa: E402
+from instance import InstanceServer, hand_off  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not instance.supported(), reason='single-instance mode needs Unix domain sockets')
+
+
+@pytest.fixture
+def socket_file(tmp_path, monkeypatch):
+    """Points the editor's socket at a temporary path."""
+    path = str(tmp_path / 'notepad.sock')
+    monkeypatch.setenv(instance.SOCKET_VARIABLE, path)
+    return path
+
+
+def read_request(server):
+    """Accepts the next launch and reads its hand-off like the editor's file handlers do, returns the path."""
+    assert select.select([server], [], [], 5)[0]
+    request = server.accept()
+    try:
+        while True:
+            assert select.select([request], [], [], 5)[0]
+            path = request.read()
+            if path is not None:
+                return path
+    finally:
+        request.close()
+
+
+def launch(path):
+    """Hands a path off from a thread, like a later launch, returns the thread and where its result goes."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('handed', hand_off(path)))
+    thread.start()
+    return thread, result
+
+
+def test_hand_off(socket_file):
+    server = InstanceServer()
+    try:
+        for path in ['/tmp/some file.txt', '']:
+            thread, result = launch(path)
+            assert read_request(server) == path
+            thread.join()
+            assert result['handed']
+    finally:
+        server.close()
+    assert not os.path.exists(socket_file)
+
+
+def test_no_editor(socket_file):
+    assert not hand_off('/tmp/file.txt')
+
+
+def test_stale_socket_is_replaced(socket_file):
+    crashed = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    crashed.bind(socket_file)
+    crashed.listen(1)
+    crashed.close()  # The socket file stays, like after a crash
+
+    start = time.perf_counter()
+    assert not hand_off('/tmp/file.txt')
+    assert time.perf_counter() - start < instance.HANDOFF_TIMEOUT
+
+    server = InstanceServer()
+    try:
+        thread, result = launch('/tmp/file.txt')
+        assert read_request(server) == '/tmp/file.txt'
+        thread.join()
+        assert result['handed']
+    finally:
+        server.close()
+
+
+def test_second_editor_refused(socket_file):
+    server = InstanceServer()
+    try:
+        with pytest.raises(OSError):
+            InstanceServer()
+        assert os.path.exists(socket_file)  # The running editor's socket is left alone
+    finally:
+        server.close()
+
+
+def test_close_keeps_a_replaced_socket(socket_file):
+    first = InstanceServer()
+    os.unlink(socket_file)
+    second = InstanceServer()  # E.g. started while the first one was shutting down
+    try:
+        first.close()
+        assert os.path.exists(socket_file)
+        assert os.stat(socket_file).st_ino == second.inode
+    finally:
+        second.close()
+    assert not os.path.exists(socket_file)
+
+
+def test_silent_launch_does_not_block(socket_file):
+    server = InstanceServer()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_file)
+        assert select.select([server], [], [], 5)[0]
+        request = server.accept()
+        start = time.perf_counter()
+        assert request.read() is None  # Nothing sent yet, more may come
+        assert time.perf_counter() - start < 0.1
+        request.close()
+    finally:
+        client.close()
+        server.close()
+
+
+def test_message_too_long(socket_file):
+    server = InstanceServer()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def send():
+        try:
+            client.sendall(b'x' * (instance.MAX_MESSAGE_BYTES * 2))
+        except OSError:
+            pass  # The editor hung up on it
+
+    try:
+        client.connect(socket_file)
+        threading.Thread(target=send, daemon=True).start()
+        assert select.select([server], [], [], 5)[0]
+        request = server.accept()
+        with pytest.raises(OSError):
+            while True:
+                assert select.select([request], [], [], 5)[0]
+                request.read()
+        request.close()
+    finally:
+        client.close()
+        server.close()
@@ -0,0 +1,186 @@
+"""Crash simulations for the edit journal: whatever a crash leaves on disk, replaying it gives the edits
+that were completely written, never garbage.
+
+Usage: python -m pytest tests
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal  # noqa: E402
+from document import PieceTable  # noqa: E402
+from journal import HEADER, EditJournal, read_journal, replay  # noqa: E402
+
+BASE_TEXT = 'first line\nsecond line\n'
+
+
+def random_edits(journal_file, count, seed):
+    """Journals count random edits of BASE_TEXT, returns the document text after each of them."""
+    rng = random.Random(seed)
+    document = PieceTable(BASE_TEXT)
+    texts = []
+    for _ in range(count):
+        offset = rng.randrange(len(document) + 1)
+        if rng.random() < 0.6 or not len(document):
+            text = rng.choice(['a', 'word ', '\n', 'é', '日本', '😀', 'x' * 300])
+            document.insert(offset, text)
+            journal_file.insert(offset, text)
+        else:
+            length = rng.randrange(1, min(20, len(document) - offset) + 1) if offset < len(document) else 0
+            if not length:
+                continue
+            document.delete(offset, length)
+            journal_file.delete(offset, length)
+        texts.append(document.text())
+    journal_file.flush()
+    return texts
+
+
+def record_ends(path):
+    """Returns the file offset where each record of a journal ends."""
+    _, records, _ = read_journal(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    ends = []
+    position = HEADER.size
+    for kind, _, length, _ in records:
+        position += journal.RECORD.size + (0 if kind == journal.DELETE else length) + journal.CRC.size
+        ends.append(position)
+    assert position == len(data)
+    return ends
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path, (len(BASE_TEXT), 123))
+    texts = random_edits(log, 500, seed=1)
+    log.close()
+
+    base, records, valid_size = read_journal(path)
+    assert base == (len(BASE_TEXT), 123)
+    assert valid_size == os.path.getsize(path)
+    assert replay(records, BASE_TEXT).text() == texts[-1]
+
+
+def test_torn_last_record(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    texts = random_edits(log, 50, seed=2)
+    log.close()
+    ends = record_ends(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # A crash can stop the last append after any of its bytes
+    for size in range(ends[-2], ends[-1]):
+        with open(path, 'wb') as f:
+            f.write(data[:size])
+        _, records, valid_size = read_journal(path)
+        assert valid_size == ends[-2]
+        assert replay(records, BASE_TEXT).text() == texts[len(records) - 1]
+
+
+def test_corrupt_record(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    texts = random_edits(log, 50, seed=3)
+    log.close()
+    ends = record_ends(path)
+
+    # A flipped byte in the middle of the log drops that record and everything after it
+    with open(path, 'r+b') as f:
+        f.seek(ends[19] + journal.RECORD.size // 2)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xff]))
+    _, records, valid_size = read_journal(path)
+    assert valid_size == ends[19]
+    assert len(records) == 20
+    assert replay(records, BASE_TEXT).text() == texts[19]
+
+
+def test_garbage_after_records(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    texts = random_edits(log, 10, seed=4)
+    log.close()
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(os.urandom(64))
+
+    _, records, valid_size = read_journal(path)
+    assert valid_size == size
+    assert replay(records, BASE_TEXT).text() == texts[-1]
+
+
+@pytest.mark.parametrize('data', [b'', b'NPJ1', b'NPJ1' + b'\0' * (HEADER.size - 5), b'XXXX' + b'\0' * HEADER.size])
+def test_bad_header(tmp_path, data):
+    path = tmp_path / 'doc.journal'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        read_journal(str(path))
+
+
+def test_continue_recovered_journal(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    log.insert(0, 'hello')
+    log.insert(5, ' world')
+    log.close()
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)  # Torn second record
+
+    _, records, valid_size = read_journal(path)
+    log = EditJournal(path, append_at=valid_size)
+    log.insert(5, '!')
+    log.close()
+    _, records, valid_size = read_journal(path)
+    assert valid_size == os.path.getsize(path)
+    assert replay(records).text() == 'hello!'
+
+
+def test_snapshot_replaces_earlier_records(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    log.insert(0, 'lost')
+    log.snapshot('kept')
+    log.insert(4, '!')
+    log.close()
+    _, records, _ = read_journal(path)
+    assert replay(records, 'anything').text() == 'kept!'
+
+
+def test_compaction_keeps_edits_made_meanwhile(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    texts = random_edits(log, 100, seed=5)
+    log.start_compaction(PieceTable(texts[-1]).snapshot())
+    log.compaction[0].join()
+    log.insert(0, 'after ')
+    assert log.finish_compaction()
+    log.close()
+
+    _, records, _ = read_journal(path)
+    assert records[0][0] == journal.SNAPSHOT
+    assert replay(records, BASE_TEXT).text() == 'after ' + texts[-1]
+
+
+@pytest.mark.skipif(journal.fcntl is None, reason='journals are only locked where fcntl exists')
+def test_journal_of_another_editor(tmp_path):
+    path = str(tmp_path / 'doc.journal')
+    log = EditJournal(path)
+    log.insert(0, 'live')
+    log.flush()
+
+    assert journal.journal_in_use(path)
+    with pytest.raises(BlockingIOError):
+        EditJournal(path)
+    _, records, _ = read_journal(path)
+    assert replay(records).text() == 'live'  # Not truncated by the refused editor
+
+    log.close()
+    assert not journal.journal_in_use(path)
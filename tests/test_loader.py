@@ -0,0 +1,93 @@
+"""Tests for the background file loader: the text it hands out is the whole file, decoded once with
+the encoding it ends up using.
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loader import FileLoader  # noqa: E402
+from saving import atomic_write  # noqa: E402
+
+
+def load(path, encoding=None, first_chunk=64, chunk=64):
+    """Runs a FileLoader to the end, returns (formats, text, outcome) like the editor would see them."""
+    loader = FileLoader(path, encoding, first_chunk, chunk)
+    loader.start()
+    formats = []
+    text = []
+    while True:
+        kind, payload, _ = loader.queue.get(timeout=5)
+        if kind == 'text':
+            text.append(payload)
+        elif kind == 'format':
+            formats.append(payload)
+        elif kind == 'restart':
+            formats.append(payload)
+            text = []  # What the editor shows so far is dropped
+        else:
+            return formats, ''.join(text), (kind, payload)
+
+
+def test_utf8(tmp_path):
+    path = tmp_path / 'utf8.txt'
+    path.write_bytes('plain start\r\n'.encode() * 20 + 'café 日本 😀\r\n'.encode() * 20)
+    formats, text, outcome = load(str(path))
+    assert [text_format.encoding for text_format in formats] == ['utf-8']
+    assert text == 'plain start\n' * 20 + 'café 日本 😀\n' * 20
+    assert outcome == ('done', False)
+
+
+@pytest.mark.parametrize('tail, encoding', [('café\n', 'latin-1'), ('“café” €\n', 'cp1252')])
+def test_not_utf8_after_the_first_chunk(tmp_path, tail, encoding):
+    path = tmp_path / 'legacy.txt'
+    path.write_bytes(b'ascii line\n' * 20 + tail.encode(encoding))
+    formats, text, outcome = load(str(path))
+    assert [text_format.encoding for text_format in formats] == ['utf-8', encoding]
+    assert text == 'ascii line\n' * 20 + tail
+    assert outcome == ('done', False)
+
+
+def test_not_cp1252_either(tmp_path):
+    path = tmp_path / 'legacy.txt'
+    path.write_bytes(b'ascii line\n' * 20 + '€\n'.encode('cp1252') + b'x' * 200 + b'\x81\n')
+    formats, text, outcome = load(str(path))
+    assert [text_format.encoding for text_format in formats] == ['utf-8', 'cp1252', 'latin-1']
+    assert text == 'ascii line\n' * 20 + '\x80\n' + 'x' * 200 + '\x81\n'
+    assert outcome == ('done', False)
+
+
+def test_forced_encoding_fails(tmp_path):
+    path = tmp_path / 'legacy.txt'
+    path.write_bytes(b'ascii line\n' * 20 + 'café\n'.encode('latin-1'))
+    formats, _, outcome = load(str(path), 'utf-8')
+    assert len(formats) == 1
+    assert outcome[0] == 'error' and isinstance(outcome[1], UnicodeDecodeError)
+
+
+@pytest.mark.parametrize('newline', ['\r\n', '\r', '\n'])
+def test_line_ending_after_the_first_chunk(tmp_path, newline):
+    path = tmp_path / 'long.txt'
+    path.write_bytes(('a' * 200 + f'{newline}b{newline}c{newline}').encode())
+    formats, text, outcome = load(str(path))
+    assert formats[-1].newline == newline
+    assert text == 'a' * 200 + '\nb\nc\n'
+    assert outcome == ('done', False)
+
+
+@pytest.mark.parametrize('newline', ['\r\n', '\n'])
+def test_long_line_file_saves_back_the_same_bytes(tmp_path, newline):
+    # Like a minified file opened in long-line mode: no line ending in the detection sample
+    data = (' '.join(['minified();'] * 5000) + newline + 'tail' + newline).encode()
+    path = tmp_path / 'min.js'
+    path.write_bytes(data)
+    formats, text, outcome = load(str(path), first_chunk=16 * 1024, chunk=256 * 1024)
+    assert outcome == ('done', False)
+
+    text_format = formats[-1]
+    atomic_write(str(path), [text], text_format.encoding, text_format.newline, bom=text_format.bom)
+    assert path.read_bytes() == data
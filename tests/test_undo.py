@@ -0,0 +1,155 @@
+"""Tests for the undo history: it stays within its memory budget, typing coalesces into word steps and
+undoing and redoing, compressed texts included, gives back exactly the text of each step.
+
+Usage: python -m pytest tests
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import undo  # noqa: E402
+from document import PieceTable  # noqa: E402
+from undo import UndoManager  # noqa: E402
+
+
+class Editor:
+    """A document fed through the undo manager the way the editor's edit hook does."""
+
+    def __init__(self, text='', budget=64 * 1024 * 1024):
+        self.document = PieceTable(text)
+        self.history = UndoManager(budget)
+
+    def edit(self, offset, length, text):
+        """Replaces length characters at offset with text, recording it."""
+        self.history.record(offset, self.document.get(offset, offset + length), text)
+        self.document.replace(offset, length, text)
+
+    def type(self, offset, text):
+        """Types text one character at a time from offset on."""
+        for i, char in enumerate(text):
+            self.edit(offset + i, 0, char)
+
+    def apply(self, edits):
+        """Applies (offset, length, text) edits returned by undo or redo, without recording them."""
+        for offset, length, text in edits or []:
+            self.document.replace(offset, length, text)
+
+    def undo(self):
+        """Undoes the last step."""
+        self.apply(self.history.undo())
+
+    def redo(self):
+        """Redoes the last undone step."""
+        self.apply(self.history.redo())
+
+
+def step_sizes(history):
+    """Returns the bytes taken by the steps of both stacks."""
+    return sum(step.size for step in history.undo_steps) + sum(step.size for step in history.redo_steps)
+
+
+def test_budget_drops_the_oldest_steps():
+    editor = Editor(budget=20 * 1024)
+    for i in range(200):
+        editor.edit(0, 0, f'{i:04d}' * 100)  # Not compressed, 400 characters each
+        assert editor.history.size <= editor.history.budget
+        assert editor.history.size == step_sizes(editor.history)
+    steps = len(editor.history.undo_steps)
+    assert 1 < steps < 200
+
+    # The steps kept are the latest ones
+    for _ in range(steps):
+        editor.undo()
+    assert not editor.history.can_undo()
+    assert editor.document.text() == ''.join(f'{i:04d}' * 100 for i in reversed(range(200 - steps)))
+
+
+def test_latest_step_kept_over_budget():
+    editor = Editor(budget=1024)
+    editor.edit(0, 0, 'small')
+    editor.edit(5, 0, os.urandom(8 * 1024).hex())  # Barely compressible, over budget on its own
+    assert len(editor.history.undo_steps) == 1
+    editor.undo()
+    assert editor.document.text() == 'small'
+
+
+def test_redo_steps_count_against_the_budget():
+    editor = Editor(budget=20 * 1024)
+    for i in range(20):
+        editor.edit(0, 0, f'{i:04d}' * 100)
+    for _ in range(10):
+        editor.undo()
+    for i in range(40):
+        editor.history.separator()
+        editor.type(len(editor.document), f' w{i}')
+        assert editor.history.size == step_sizes(editor.history) <= editor.history.budget
+    assert not editor.history.can_redo()  # Editing after an undo drops the redo steps
+
+
+def test_typing_coalesces_into_words():
+    editor = Editor()
+    editor.type(0, 'hello world')
+    assert len(editor.history.undo_steps) == 2
+    editor.undo()
+    assert editor.document.text() == 'hello '
+    editor.undo()
+    assert editor.document.text() == ''
+    editor.redo()
+    editor.redo()
+    assert editor.document.text() == 'hello world'
+
+
+def test_backspace_and_delete_coalesce():
+    editor = Editor('one two three')
+    for offset in range(12, 7, -1):  # Backspace 'three'
+        editor.edit(offset, 1, '')
+    assert editor.document.text() == 'one two '
+    assert len(editor.history.undo_steps) == 1
+    editor.history.separator()
+    for _ in range(3):  # Delete 'one'
+        editor.edit(0, 1, '')
+    assert editor.document.text() == ' two '
+    assert len(editor.history.undo_steps) == 2
+    editor.undo()
+    assert editor.document.text() == 'one two '
+    editor.undo()
+    assert editor.document.text() == 'one two three'
+
+
+def test_separator_ends_the_typing_step():
+    editor = Editor()
+    editor.type(0, 'ab')
+    editor.history.separator()
+    editor.type(2, 'cd')
+    assert len(editor.history.undo_steps) == 2
+
+
+def test_round_trip_over_compressed_groups():
+    rng = random.Random(3)
+    original = 'base text\n' * 5000
+    editor = Editor(original)
+    texts = [original]
+    for _ in range(20):
+        editor.history.begin_group()
+        for _ in range(rng.randrange(1, 6)):
+            offset = rng.randrange(len(editor.document) + 1)
+            length = rng.choice([0, 10, undo.COMPRESS_CHARS + 100])
+            size = rng.choice([0, 5, undo.COMPRESS_CHARS * 2])
+            editor.edit(offset, min(length, len(editor.document) - offset), 'é日\n' * (size // 3))
+        editor.history.end_group()
+        if len(editor.history.undo_steps) == len(texts):  # A group of empty edits makes no step
+            texts.append(editor.document.text())
+
+    packed = [data for step in editor.history.undo_steps for _, removed, inserted in step.edits
+              for data in (removed, inserted) if isinstance(data, bytes)]
+    assert packed  # Large texts are kept compressed
+    assert editor.history.size < sum(len(text) for text in texts)
+
+    for text in reversed(texts[:-1]):
+        editor.undo()
+        assert editor.document.text() == text
+    for text in texts[1:]:
+        editor.redo()
+        assert editor.document.text() == text
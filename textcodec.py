@@ -0,0 +1,137 @@
+import codecs
+import io
+import os
+from collections import namedtuple
+
+DETECT_BYTES = 16 * 1024  # Bytes looked at to guess the encoding and line endings
+
+# encoding is a Python codec name, bom tells whether the file starts with a byte order mark and
+# newline is the line ending written back on save
+TextFormat = namedtuple('TextFormat', 'encoding bom newline')
+
+DEFAULT_FORMAT = TextFormat('utf-8', False, os.linesep)
+
+BOMS = [  # UTF-32 first, its little endian BOM starts like the UTF-16 one
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+
+ENCODING_NAMES = {
+    'utf-8': 'UTF-8',
+    'utf-16-le': 'UTF-16 LE',
+    'utf-16-be': 'UTF-16 BE',
+    'utf-32-le': 'UTF-32 LE',
+    'utf-32-be': 'UTF-32 BE',
+    'cp1252': 'Windows-1252',
+    'latin-1': 'Latin-1',
+}
+
+NEWLINE_NAMES = {'\n': 'LF', '\r\n': 'CRLF', '\r': 'CR'}
+
+
+def is_ascii_compatible(encoding):
+    """Returns True if newlines and ASCII text are single bytes in encoding."""
+    return not encoding.startswith(('utf-16', 'utf-32'))
+
+
+def detect_encoding(sample):
+    """Guesses the encoding of a file from its first bytes, returns (encoding, bom)."""
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, True
+
+    # UTF-16 without BOM: ASCII characters have a zero byte on one side
+    if len(sample) >= 2:
+        even_zeros = sample[0::2].count(0)
+        odd_zeros = sample[1::2].count(0)
+        half = len(sample) // 2
+        if odd_zeros > half * 0.3 and even_zeros < half * 0.05:
+            return 'utf-16-le', False
+        if even_zeros > half * 0.3 and odd_zeros < half * 0.05:
+            return 'utf-16-be', False
+
+    try:
+        # Not final: the sample may end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8', False
+    except UnicodeDecodeError:
+        return legacy_encoding(sample), False
+
+
+def legacy_encoding(sample):
+    """Picks Windows-1252 or Latin-1 for bytes that aren't UTF-8."""
+    # Both legacy codecs agree outside 0x80-0x9F, where Latin-1 never fails on the rest of the file
+    if not any(0x80 <= byte <= 0x9f for byte in sample):
+        return 'latin-1'
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def detect_newline(text):
+    """Returns the most common line ending of a text, the platform default if it has none."""
+    crlf = text.count('\r\n')
+    found = {'\r\n': crlf, '\n': text.count('\n') - crlf, '\r': text.count('\r') - crlf}
+    newline = max(found, key=found.get)
+    return newline if found[newline] else os.linesep
+
+
+def detect_format(sample, encoding=None):
+    """Detects the TextFormat of a file from its first bytes, encoding forces the codec."""
+    bom = False
+    if encoding is None:
+        encoding, bom = detect_encoding(sample)
+    else:
+        bom = any(sample.startswith(mark) and encoding == name for mark, name in BOMS)
+    newline = detect_newline(sample.decode(encoding, errors='replace'))
+    return TextFormat(encoding, bom, newline)
+
+
+def fallback_format(text_format, sample):
+    """Returns the TextFormat to decode a file with once the detected one failed on sample, None if there is none.
+
+    Only the first bytes are looked at to detect the format, so a file starting with plain ASCII
+    can turn out not to be UTF-8 further on; Latin-1 decodes anything and is the last resort.
+    """
+    if text_format.bom:
+        return None  # The byte order mark says what the file is
+    if text_format.encoding == 'utf-8':
+        return text_format._replace(encoding=legacy_encoding(sample))
+    if text_format.encoding == 'cp1252':
+        return text_format._replace(encoding='latin-1')
+    return None
+
+
+def decoded_newline(newlines):
+    """Returns the line ending to save with from the newlines a decoder saw, None if it saw none.
+
+    Where several were seen CRLF wins, then LF: their order in the file is not known.
+    """
+    if newlines is None or isinstance(newlines, str):
+        return newlines
+    return next(newline for newline in ('\r\n', '\n', '\r') if newline in newlines)
+
+
+def make_decoder(text_format):
+    """Returns an incremental decoder turning a file's bytes into text with '\\n' line endings.
+
+    Its newlines attribute tells which line endings were seen, a tuple when they were mixed.
+    """
+    decoder = codecs.getincrementaldecoder(text_format.encoding)()
+    return io.IncrementalNewlineDecoder(decoder, translate=True)
+
+
+def format_label(text_format, mixed=False):
+    """Returns the status bar text describing a TextFormat."""
+    name = ENCODING_NAMES.get(text_format.encoding, text_format.encoding.upper())
+    if text_format.bom:
+        name += ' BOM'
+    newline = NEWLINE_NAMES[text_format.newline]
+    if mixed:
+        newline = f'Mixed ({newline})'
+    return f'{name} | {newline}'
@@ -0,0 +1,99 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ROLLING_SAMPLES = 512  # Durations kept per name for the percentiles
+MAX_EVENTS = 200000  # Spans kept for the trace export, the oldest are dropped first
+
+
+class RollingStats:
+    """Count and the last ROLLING_SAMPLES durations of one traced name."""
+
+    def __init__(self):
+        self.count = 0
+        self.samples = deque(maxlen=ROLLING_SAMPLES)
+
+    def add(self, duration):
+        """Records one duration."""
+        self.count += 1
+        self.samples.append(duration)
+
+    def percentiles(self, *fractions):
+        """Returns the durations below which the given fractions of the recent samples fall."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0] * len(fractions)
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] for fraction in fractions]
+
+
+class Tracer:
+    """Times spans of the editor's handlers while enabled, doing nothing otherwise.
+
+    Each span feeds the rolling statistics of its name and is kept as a complete event for the
+    Chrome trace export (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.stats = {}
+        self.events = deque(maxlen=MAX_EVENTS)
+
+    def enable(self, enabled=True):
+        """Switches recording on or off."""
+        self.enabled = enabled
+
+    def clear(self):
+        """Drops the statistics and events recorded so far."""
+        self.stats = {}
+        self.events.clear()
+
+    def add(self, name, start, duration, thread=None):
+        """Records a span given its perf_counter start and duration in seconds, by default on the calling thread."""
+        if not self.enabled:
+            return
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = RollingStats()
+        stats.add(duration)
+        self.events.append((name, start, duration, thread if thread is not None else threading.get_ident()))
+
+    def summary(self):
+        """Returns (name, count, p50, p95, p99, max) tuples with durations in seconds, slowest p95 first."""
+        rows = []
+        for name, stats in self.stats.items():
+            p50, p95, p99 = stats.percentiles(0.5, 0.95, 0.99)
+            rows.append((name, stats.count, p50, p95, p99, max(stats.samples)))
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def export(self, path):
+        """Writes the recorded spans as a Chrome trace JSON file."""
+        pid = os.getpid()
+        events = [{'name': name, 'cat': 'notepad', 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': round((start - self.origin) * 1e6, 1), 'dur': round(duration * 1e6, 1)}
+                  for name, start, duration, tid in list(self.events)]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorates a function to be timed as name while tracing is enabled, at the cost of one check when not."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.add(name, start, time.perf_counter() - start)
+        return wrapper
+    return decorate
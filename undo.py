@@ -0,0 +1,208 @@
+import sys
+import zlib
+from collections import deque
+
+COMPRESS_CHARS = 16 * 1024  # Texts from this size on are kept zlib-compressed
+COMPRESS_LEVEL = 1  # Fast, big deletions are mostly text and shrink well anyway
+EDIT_OVERHEAD = 120  # Approximate bytes an edit takes besides its texts
+
+
+def pack(text):
+    """Returns a text as kept in the history, compressed when large."""
+    if len(text) < COMPRESS_CHARS:
+        return text
+    return zlib.compress(text.encode('utf-8', 'surrogatepass'), COMPRESS_LEVEL)
+
+
+def unpack(data):
+    """Returns the text of a packed text."""
+    if isinstance(data, str):
+        return data
+    return zlib.decompress(data).decode('utf-8', 'surrogatepass')
+
+
+def edit_size(removed, inserted):
+    """Returns the approximate memory taken by an edit with packed texts."""
+    return EDIT_OVERHEAD + sys.getsizeof(removed) + sys.getsizeof(inserted)
+
+
+def format_size(size):
+    """Returns a byte count as a short human readable text."""
+    if size < 1024 * 1024:
+        return f'{size / 1024:.0f} KB'
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+def as_replacements(edits):
+    """Returns (offset, length, text) edits applied one after the other as sorted (start, end, text)
+    ranges of the text before the first one, or None if they overlap.
+
+    Edits going back to front already are, edits going front to back are shifted back by the length
+    the ones before them added or removed.
+    """
+    if all(offset + length <= previous for (previous, _, _), (offset, length, _) in zip(edits, edits[1:])):
+        return [(offset, offset + length, text) for offset, length, text in reversed(edits)]
+
+    replacements = []
+    shift = 0
+    end = 0  # End of the previous edit's text
+    for offset, length, text in edits:
+        if offset < end:
+            return None
+        replacements.append((offset - shift, offset - shift + length, text))
+        shift += len(text) - length
+        end = offset + len(text)
+    return replacements
+
+
+class UndoStep:
+    """Edits undone and redone together, as (offset, removed, inserted) with packed texts."""
+
+    def __init__(self, typing=False):
+        self.edits = []
+        self.size = 0
+        self.typing = typing  # Typing or deleting character by character, later keys may join it
+
+
+class UndoManager:
+    """Undo and redo history of a document, kept within a memory budget.
+
+    Edits are recorded as the offset they happened at, the text they removed and the text they
+    inserted. Characters typed or deleted one by one join the previous step until a new word starts.
+    Edits between begin_group() and end_group() make a single step. Texts of COMPRESS_CHARS and more
+    are compressed, and once the history takes more than budget bytes its oldest steps are dropped,
+    the latest one is always kept.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.undo_steps = deque()
+        self.redo_steps = []
+        self.size = 0  # Bytes taken by the steps of both stacks
+        self.enabled = True  # Edits are not recorded while False, e.g. while loading a file
+        self.group = None  # Step collecting the edits of the open group
+        self.group_depth = 0
+
+    def clear(self):
+        """Forgets the whole history."""
+        self.undo_steps.clear()
+        self.redo_steps = []
+        self.size = 0
+
+    def separator(self):
+        """Ends the typing step, the next key starts a new one."""
+        if self.undo_steps:
+            self.undo_steps[-1].typing = False
+
+    def begin_group(self):
+        """Starts collecting edits into one step, groups nest."""
+        if self.group_depth == 0:
+            self.separator()
+            self.group = UndoStep()
+        self.group_depth += 1
+
+    def end_group(self):
+        """Ends a group, making its edits one step."""
+        self.group_depth -= 1
+        if self.group_depth == 0:
+            if self.group.edits:
+                self._push(self.group)
+            self.group = None
+
+    def record(self, offset, removed, inserted):
+        """Records an edit that replaced the text removed at offset by inserted."""
+        if not self.enabled or (not removed and not inserted):
+            return
+        for step in self.redo_steps:
+            self.size -= step.size
+        self.redo_steps = []
+
+        if self.group is not None:
+            self._add(self.group, offset, removed, inserted)  # Counted once the group ends
+            return
+        if self._join(offset, removed, inserted):
+            return
+        step = UndoStep(typing=len(removed) + len(inserted) == 1)
+        self._add(step, offset, removed, inserted)
+        self._push(step)
+
+    def _add(self, step, offset, removed, inserted):
+        """Adds an edit to a step."""
+        removed, inserted = pack(removed), pack(inserted)
+        step.edits.append((offset, removed, inserted))
+        step.size += edit_size(removed, inserted)
+
+    def _join(self, offset, removed, inserted):
+        """Merges a key typed or deleted next to the last one into its step, returns False if it starts a new one."""
+        if len(removed) + len(inserted) != 1 or not self.undo_steps or not self.undo_steps[-1].typing:
+            return False
+        step = self.undo_steps[-1]
+        last_offset, last_removed, last_inserted = step.edits[-1]
+
+        if inserted and not last_removed and offset == last_offset + len(last_inserted):
+            # Typing on: a new word starts after whitespace
+            if last_inserted[-1].isspace() and not inserted.isspace():
+                return False
+            merged = (last_offset, '', last_inserted + inserted)
+        elif removed and not last_inserted and offset + 1 == last_offset:
+            # Backspace
+            if last_removed[0].isspace() and not removed.isspace():
+                return False
+            merged = (offset, removed + last_removed, '')
+        elif removed and not last_inserted and offset == last_offset:
+            # Delete
+            if last_removed[-1].isspace() and not removed.isspace():
+                return False
+            merged = (offset, last_removed + removed, '')
+        else:
+            return False
+
+        old_size = edit_size(last_removed, last_inserted)
+        new_size = edit_size(merged[1], merged[2])
+        step.edits[-1] = merged
+        step.size += new_size - old_size
+        self.size += new_size - old_size
+        self._evict()
+        return True
+
+    def _push(self, step):
+        """Adds a finished step to the undo stack and keeps the history within the budget."""
+        self.undo_steps.append(step)
+        self.size += step.size
+        self._evict()
+
+    def _evict(self):
+        """Drops the oldest steps while the history is over budget, keeping the latest one."""
+        while self.size > self.budget:
+            if len(self.undo_steps) > 1:
+                self.size -= self.undo_steps.popleft().size
+            elif self.redo_steps:
+                self.size -= self.redo_steps.pop(0).size  # The step furthest away from the present
+            else:
+                break
+
+    def can_undo(self):
+        """Returns True if there is a step to undo."""
+        return bool(self.undo_steps)
+
+    def can_redo(self):
+        """Returns True if there is a step to redo."""
+        return bool(self.redo_steps)
+
+    def undo(self):
+        """Moves the last step to the redo stack, returns the (offset, length, text) edits reverting it or None."""
+        if not self.undo_steps or self.group is not None:
+            return None
+        step = self.undo_steps.pop()
+        step.typing = False
+        self.redo_steps.append(step)
+        return [(offset, len(unpack(inserted)), unpack(removed)) for offset, removed, inserted in reversed(step.edits)]
+
+    def redo(self):
+        """Moves the last undone step back, returns the (offset, length, text) edits replaying it or None."""
+        if not self.redo_steps or self.group is not None:
+            return None
+        self.separator()
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        return [(offset, len(unpack(removed)), unpack(inserted)) for offset, removed, inserted in step.edits]
@@ -0,0 +1,118 @@
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+BLOCK_BYTES = 64 * 1024  # Granularity of the line index, one entry per block of the file
+
+
+class MappedFile:
+    """Read-only view of a file through mmap, with a line index built in the background.
+
+    Instead of the offset of every line, the index stores how many newlines come before each
+    block of BLOCK_BYTES, so it stays small (8 bytes per 64 KB) whatever the number of lines.
+    Lines are located by jumping to their block and scanning the mapped bytes from there.
+    """
+
+    def __init__(self, path, encoding='utf8'):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        # mmap can't map an empty file, an empty bytes object behaves the same for reading
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+
+        self.block_newlines = array('Q', [0])  # Newlines before the start of each block
+        self.indexed_bytes = 0
+        self.line_count = None  # Known once indexing is done
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._build_index, name='line-index', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stops indexing and releases the mapping."""
+        self.stopped.set()
+        self.thread.join()
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    @property
+    def indexed(self):
+        """True once the whole file has been indexed."""
+        return self.line_count is not None
+
+    def _build_index(self):
+        """Worker thread body: counts newlines block by block."""
+        newlines = 0
+        for start in range(0, self.size, BLOCK_BYTES):
+            if self.stopped.is_set():
+                return
+            newlines += self.map[start:start + BLOCK_BYTES].count(b'\n')
+            self.block_newlines.append(newlines)
+            self.indexed_bytes = min(start + BLOCK_BYTES, self.size)
+        self.indexed_bytes = self.size
+        self.line_count = newlines + 1
+
+    def estimated_line_count(self):
+        """Returns the line count, extrapolated from the indexed part while indexing is running."""
+        if self.line_count is not None:
+            return self.line_count
+        newlines = self.block_newlines[-1]
+        if not self.indexed_bytes:
+            return 1
+        return max(newlines + 1, newlines * self.size // self.indexed_bytes + 1)
+
+    def known_line_count(self):
+        """Returns the number of lines whose start offset can be resolved right now."""
+        if self.line_count is not None:
+            return self.line_count
+        return self.block_newlines[-1] + 1
+
+    def line_offset(self, line):
+        """Returns the byte offset where a 0-based line starts."""
+        if line <= 0:
+            return 0
+        # Block holding the line-th newline, then scan forward inside it
+        block = bisect_left(self.block_newlines, line) - 1
+        position = block * BLOCK_BYTES
+        for _ in range(line - self.block_newlines[block]):
+            position = self.map.find(b'\n', position) + 1
+            if position == 0:
+                return self.size
+        return position
+
+    def offset_line(self, offset):
+        """Returns the 0-based line containing a byte offset."""
+        block = min(offset // BLOCK_BYTES, len(self.block_newlines) - 1)
+        start = block * BLOCK_BYTES
+        return self.block_newlines[block] + self.map[start:offset].count(b'\n')
+
+    def decode(self, data):
+        """Decodes mapped bytes for display."""
+        return data.decode(self.encoding, errors='replace').replace('\r\n', '\n')
+
+    def read_lines(self, first, count):
+        """Returns the text of count lines starting at the 0-based line first."""
+        start = self.line_offset(first)
+        end = self.line_offset(first + count)
+        text = self.decode(self.map[start:end])
+        return text[:-1] if text.endswith('\n') else text
+
+    def column(self, line, offset):
+        """Returns the character column of a byte offset on a 0-based line."""
+        return len(self.decode(self.map[self.line_offset(line):offset]))
+
+    def find(self, needle, start=0):
+        """Returns the byte offset of the next occurrence of a string, wrapping around, or -1."""
+        try:
+            pattern = needle.encode(self.encoding)
+        except UnicodeEncodeError:
+            return -1  # A character the file's encoding can't hold never occurs in it
+        if not pattern:
+            return -1
+        position = self.map.find(pattern, start)
+        if position < 0 and start:
+            position = self.map.find(pattern, 0, start + len(pattern) - 1)
+        return position
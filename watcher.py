@@ -0,0 +1,277 @@
+import difflib
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from textcodec import make_decoder
+
+TAIL_BYTES = 4096  # Bytes kept from the end of a file, to tell an append from a rewrite
+COMPARE_CHARS = 64 * 1024  # Texts are compared this many characters at a time to find what changed
+DIFF_MAX_LINES = 20000  # Changed parts with more lines than this are replaced whole instead of diffed line by line
+
+# inotify(7) constants
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct('iIII')  # wd, mask, cookie and length of the name that follows
+
+# State of a file on disk: an edit by another program changes mtime_ns or size, an atomic replace
+# the inode; tail is the last TAIL_BYTES of the content, to check the start of a grown file is unchanged
+FileStamp = namedtuple('FileStamp', 'mtime_ns size inode tail')
+
+
+def read_stamp(f, size=None):
+    """Returns the FileStamp of an open file, for its first size bytes if given."""
+    stat = os.fstat(f.fileno())
+    size = stat.st_size if size is None else size
+    f.seek(max(0, size - TAIL_BYTES))
+    return FileStamp(stat.st_mtime_ns, size, stat.st_ino, f.read(min(size, TAIL_BYTES)))
+
+
+def stamp_file(path):
+    """Returns the FileStamp of a file, None if it doesn't exist or can't be read."""
+    try:
+        with open(path, 'rb') as f:
+            return read_stamp(f)
+    except OSError:
+        return None
+
+
+def common_prefix(a, b):
+    """Returns the length of the longest common prefix of two strings."""
+    limit = min(len(a), len(b))
+    start = 0
+    while start < limit and a[start:start + COMPARE_CHARS] == b[start:start + COMPARE_CHARS]:
+        start += COMPARE_CHARS
+    if start >= limit:
+        return limit
+    end = min(limit, start + COMPARE_CHARS)
+    # The first difference is in this block, halve it until found
+    while start < end:
+        middle = (start + end + 1) // 2
+        if a[start:middle] == b[start:middle]:
+            start = middle
+        else:
+            end = middle - 1
+    return start
+
+
+def common_suffix(a, b, limit):
+    """Returns the length of the longest common suffix of two strings, at most limit."""
+    limit = min(limit, len(a), len(b))
+    length = 0
+    while length < limit:
+        step = min(COMPARE_CHARS, limit - length)
+        if a[len(a) - length - step:len(a) - length] != b[len(b) - length - step:len(b) - length]:
+            break
+        length += step
+    else:
+        return length
+    low, high = length, length + step - 1  # The suffix ends in this block
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def diff_regions(old, new):
+    """Returns the sorted (start, end, text) replacements of old's ranges that turn it into new.
+
+    The common start and end are skipped, and the part in between is diffed line by line unless it
+    has more than DIFF_MAX_LINES lines, then it is a single replacement.
+    """
+    prefix = common_prefix(old, new)
+    suffix = common_suffix(old, new, min(len(old), len(new)) - prefix)
+    old_end, new_end = len(old) - suffix, len(new) - suffix
+    if prefix == old_end and prefix == new_end:
+        return []
+
+    # Whole lines diff better, move the start back to the start of its line
+    prefix = old.rfind('\n', 0, prefix) + 1
+    old_lines = old[prefix:old_end].splitlines(keepends=True)
+    new_lines = new[prefix:new_end].splitlines(keepends=True)
+    if len(old_lines) > DIFF_MAX_LINES or len(new_lines) > DIFF_MAX_LINES:
+        return [(prefix, old_end, new[prefix:new_end])]
+
+    old_offsets = [prefix]
+    for line in old_lines:
+        old_offsets.append(old_offsets[-1] + len(line))
+    replacements = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            replacements.append((old_offsets[i1], old_offsets[i2], ''.join(new_lines[j1:j2])))
+    return replacements
+
+
+class Inotify:
+    """An inotify instance watching a directory, through libc with ctypes."""
+
+    def __init__(self, directory):
+        # Imported here, ctypes.util takes 20 ms to import and the loader and saving only need the stamps
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f'inotify_add_watch failed on {directory}')
+
+    def names(self):
+        """Returns the names of the directory entries with events since the last call."""
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            position = 0
+            while position < len(data):
+                _, _, _, length = EVENT.unpack_from(data, position)
+                position += EVENT.size
+                names.add(os.fsdecode(data[position:position + length].rstrip(b'\0')))
+                position += length
+
+    def close(self):
+        """Stops watching."""
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Notices changes made to a file by other programs.
+
+    On Linux the file's directory is watched with inotify, so atomic replaces are seen too, and
+    fileno() can be waited on; events() tells whether any was about the file. Elsewhere fileno() is
+    None and the file has to be polled. Either way current() stats the file, and differs() compares
+    that to stamp, the state the editor last knew.
+    """
+
+    def __init__(self, path, stamp):
+        self.path = path
+        self.stamp = stamp  # FileStamp the document matches or the user accepted, None if the file is gone
+        self.pending = b''  # Bytes at the end of the file, through stamp, not making a whole character yet
+        self.failed = None  # FileStamp of the file when reloading it failed, not tried again until it changes
+        self.inotify = None
+        if sys.platform.startswith('linux'):
+            try:
+                self.inotify = Inotify(os.path.dirname(os.path.abspath(path)))
+            except (OSError, AttributeError):  # AttributeError: a libc without inotify
+                self.inotify = None
+
+    def fileno(self):
+        """Returns the inotify descriptor to wait on, None when the file must be polled."""
+        return self.inotify.fd if self.inotify is not None else None
+
+    def events(self):
+        """Returns True if inotify reported events about the file since the last call."""
+        return os.path.basename(self.path) in self.inotify.names()
+
+    def current(self):
+        """Returns the FileStamp of the file now, None if it is gone."""
+        return stamp_file(self.path)
+
+    def differs(self, stamp):
+        """Returns True if a stamp doesn't match the known state of the file."""
+        if stamp is None or self.stamp is None:
+            return stamp is not self.stamp
+        return stamp[:3] != self.stamp[:3]
+
+    def close(self):
+        """Stops watching."""
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+class ReloadJob:
+    """Reads a file changed on disk on a worker thread and works out the edits bringing the document up to date.
+
+    When the file kept its inode, grew, and still has the known tail where it used to end, only the
+    appended bytes are read and kind is 'append' with text the appended text. Otherwise, or without
+    a known stamp, the whole file is read and diffed with the snapshot: kind is 'patch' with the
+    replacements, or 'same' if the text did not change. stamp is the state of the file read.
+
+    A writer may have flushed only part of a character: those bytes at the end are left out of the
+    text and kept in pending, and the next append starts with them, given back as pending.
+    """
+
+    def __init__(self, path, text_format, snapshot, known=None, pending=b''):
+        self.path = path
+        self.text_format = text_format
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.known = known  # FileStamp the snapshot matches, None to always diff the whole file
+        self.pending = pending  # Bytes before the known end left out of the snapshot, then the ones after the read end
+
+        self.kind = None
+        self.text = ''
+        self.replacements = []
+        self.stamp = None
+        self.error = None
+        self.started = None
+        self.duration = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='reload', daemon=True)
+
+    def start(self):
+        """Starts reading in the background."""
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def appended(self, f, stamp):
+        """Returns True if an open file only grew since the known stamp."""
+        known = self.known
+        if known is None or stamp.inode != known.inode or stamp.size <= known.size:
+            return False
+        if known.tail.endswith(b'\r'):
+            return False  # The appended text may start with the '\n' of a '\r\n', which is one newline
+        f.seek(known.size - len(known.tail))
+        return f.read(len(known.tail)) == known.tail
+
+    def decode(self, data, first):
+        """Decodes bytes of the file the way the loader does, first if they start it, except for the bytes
+        of an unfinished character at the end; returns the text and those bytes."""
+        decoder = make_decoder(self.text_format)
+        text = decoder.decode(data, final=False)
+        unfinished, flags = decoder.getstate()
+        if flags & 1:
+            text += '\n'  # A '\r' held back in case a '\n' follows, the loader ends the same way
+        return (text.removeprefix('\ufeff') if first and self.text_format.bom else text), unfinished
+
+    def _run(self):
+        """Worker thread body."""
+        try:
+            with open(self.path, 'rb') as f:
+                stamp = self.stamp = read_stamp(f)
+                if self.appended(f, stamp):
+                    f.seek(self.known.size)
+                    data = self.pending + f.read(stamp.size - self.known.size)
+                    self.text, self.pending = self.decode(data, first=self.known.size == len(self.pending))
+                    self.kind = 'append'
+                else:
+                    f.seek(0)
+                    new, self.pending = self.decode(f.read(stamp.size), first=True)
+                    self.replacements = diff_regions(self.snapshot.text(), new)
+                    self.kind = 'patch' if self.replacements else 'same'
+        except (OSError, UnicodeDecodeError, LookupError) as e:
+            self.error = e
+        finally:
+            self.duration = time.perf_counter() - self.started
+            self.done.set()